@@ -0,0 +1,104 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import PlainTextResponse
+from app.models.user import User
+from app.core.loop_monitor import loop_monitor
+from app.core.middleware import require_admin
+from app.core.profiling import profiling_service
+
+router = APIRouter(prefix="/api/v1/admin/profiling", tags=["admin"])
+
+
+@router.post("/cpu/start")
+async def start_cpu_profile(
+    user: User = Depends(require_admin),
+    seconds: float = Query(default=10.0, gt=0, description="Stop automatically after this many seconds"),
+    interval_ms: float = Query(default=5.0, ge=1.0, le=1000.0, description="Sampling interval")
+):
+    """
+    Start a sampling CPU profile of every thread in this worker.
+
+    The profile stops itself after ``seconds`` (capped by PROFILING_MAX_SECONDS).
+    """
+    try:
+        profiler = profiling_service.start_cpu(seconds, interval_ms)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return profiler.summary()
+
+
+@router.post("/cpu/stop", response_class=PlainTextResponse)
+async def stop_cpu_profile(user: User = Depends(require_admin)):
+    """Stop the CPU profile and return its collapsed stacks."""
+    profiler = profiling_service.stop_cpu()
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="No CPU profile has been started")
+    return profiler.collapsed()
+
+
+@router.get("/cpu", response_class=PlainTextResponse)
+async def get_cpu_profile(user: User = Depends(require_admin)):
+    """
+    Collapsed stacks of the current or most recent CPU profile.
+
+    The output feeds straight into flamegraph.pl or speedscope.
+    """
+    profiler = profiling_service.cpu_profiler
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="No CPU profile has been started")
+    return profiler.collapsed()
+
+
+@router.get("/requests/{profile_id}", response_class=PlainTextResponse)
+async def get_request_profile(profile_id: str, user: User = Depends(require_admin)):
+    """
+    Collapsed stacks for a request sent with the X-Profile-Request header.
+
+    The samples cover the event loop thread while that request was in flight,
+    so work for any other request served at the same time is included.
+    """
+    profiler = profiling_service.get_request_profile(profile_id)
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="Unknown profile id")
+    return profiler.collapsed()
+
+
+@router.post("/memory/snapshots")
+async def take_memory_snapshot(
+    user: User = Depends(require_admin),
+    frames: int = Query(default=25, ge=1, le=100, description="Stack depth recorded when tracemalloc starts")
+):
+    """Take a tracemalloc snapshot (starting tracemalloc on first use)."""
+    # Snapshots walk every traced block; keep that off the event loop
+    return await asyncio.get_running_loop().run_in_executor(None, profiling_service.take_snapshot, frames)
+
+
+@router.get("/memory/snapshots/{snapshot_id}/diff")
+async def diff_memory_snapshots(
+    snapshot_id: int,
+    user: User = Depends(require_admin),
+    base: int = Query(description="Snapshot id to compare against"),
+    limit: int = Query(default=25, ge=1, le=500)
+):
+    """Allocation growth between snapshot ``base`` and ``snapshot_id``."""
+    try:
+        # Like snapshots, comparing walks every trace; keep it off the event loop
+        changes = await asyncio.get_running_loop().run_in_executor(
+            None, profiling_service.diff_snapshots, base, snapshot_id, limit
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"base": base, "target": snapshot_id, "changes": changes}
+
+
+@router.delete("/memory")
+async def stop_memory_tracing(user: User = Depends(require_admin)):
+    """Stop tracemalloc and discard stored snapshots."""
+    profiling_service.stop_memory()
+    return {"tracing": False}
+
+
+@router.get("/loop")
+async def get_loop_report(user: User = Depends(require_admin)):
+    """Event loop lag and the most recent stall reports."""
+    return loop_monitor.report()
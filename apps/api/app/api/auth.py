@@ -1,10 +1,12 @@
+import asyncio
 from fastapi import APIRouter, Request, HTTPException, status
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, Response
 from typing import Optional
-import secrets
-import time
 
-from app.core.auth import auth_service, session_store, get_current_user
+from app.core.auth import (
+    auth_service, session_store, get_current_user, get_current_principal,
+    OAUTH_STATE_COOKIE, OAUTH_STATE_COOKIE_PATH
+)
 
 router = APIRouter()
 
@@ -12,18 +14,25 @@ router = APIRouter()
 @router.get("/auth/google")
 async def auth_google():
     """Initiate Google OAuth flow"""
-    # Generate state parameter for CSRF protection
-    state = secrets.token_urlsafe(32)
-    
-    # Store state in session (in a real app, you'd use a proper session store)
-    # For demo purposes, we'll use a simple approach
-    oauth_state_storage = {}
-    oauth_state_storage[state] = time.time()
+    # Generate state parameter for CSRF protection; the callback must present it within the TTL
+    state = await auth_service.create_oauth_state()
     
     # Generate OAuth URL
     auth_url = auth_service.generate_oauth_url(state)
     
-    return RedirectResponse(url=auth_url)
+    # Bind the state to this browser: the callback only accepts it alongside this cookie
+    response = RedirectResponse(url=auth_url)
+    response.set_cookie(
+        key=OAUTH_STATE_COOKIE,
+        value=state,
+        httponly=True,
+        secure=False,  # Set to True in production
+        samesite="lax",
+        max_age=int(auth_service.oauth_state_ttl),
+        path=OAUTH_STATE_COOKIE_PATH
+    )
+    
+    return response
 
 @router.get("/auth/google/callback")
 async def auth_google_callback(
@@ -45,19 +54,26 @@ async def auth_google_callback(
             detail="Missing required parameters"
         )
     
-    # Verify state (in a real app, you'd check against stored state)
-    # For demo purposes, we'll skip this check
+    # Verify state against this browser's cookie (each one is single-use, so a replayed callback is rejected too)
+    if not await auth_service.consume_oauth_state(state, request.cookies.get(OAUTH_STATE_COOKIE)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid or expired OAuth state"
+        )
     
-    # Exchange code for tokens
-    tokens = auth_service.exchange_code_for_tokens(code)
+    # Exchange code for tokens (Google calls run in the executor to keep the event loop free)
+    loop = asyncio.get_running_loop()
+    tokens = await loop.run_in_executor(None, auth_service.exchange_code_for_tokens, code)
     if not tokens:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Failed to exchange code for tokens"
         )
     
-    # Get user information
-    user_info = auth_service.get_user_info(tokens.access_token)
+    # Get user information from the ID token; only ask the userinfo endpoint if it cannot be verified
+    user_info = await auth_service.user_info_from_id_token(tokens.id_token)
+    if not user_info:
+        user_info = await loop.run_in_executor(None, auth_service.get_user_info, tokens.access_token)
     if not user_info:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -65,24 +81,25 @@ async def auth_google_callback(
         )
     
     # Store refresh token securely
-    auth_service.store_refresh_token_securely(user_info.id, tokens.refresh_token)
+    await auth_service.store_refresh_token_securely(user_info.id, tokens.refresh_token)
     
     # Create user session
     session = auth_service.create_user_session(user_info, tokens.access_token)
     
-    # Store session
+    # Store session (holds the access token; authentication itself only needs the cookie)
     session_store[session.session_id] = session
     
-    # Create response with session cookie
+    # Create response with a signed session cookie carrying the user's profile
     response = RedirectResponse(url="http://localhost:3000")
     response.set_cookie(
         key="session_id",
-        value=auth_service.create_session_cookie(session.session_id),
+        value=auth_service.create_session_cookie(session.session_id, session),
         httponly=True,
         secure=False,  # Set to True in production
         samesite="lax",
         max_age=3600 * auth_service.session_expire_hours
     )
+    response.delete_cookie(OAUTH_STATE_COOKIE, path=OAUTH_STATE_COOKIE_PATH)
     
     return response
 
@@ -93,12 +110,13 @@ async def auth_logout(request: Request):
     user = get_current_user(request)
     if user:
         # Delete refresh token
-        auth_service.delete_refresh_token_securely(user.id)
+        await auth_service.delete_refresh_token_securely(user.id)
         
-        # Remove session
+        # Remove session; signed cookies stay valid until they expire, so revoke them too
         session_cookie = request.cookies.get("session_id")
         if session_cookie:
             session_id = auth_service.validate_session_cookie(session_cookie)
+            auth_service.revoke_session_cookie(session_cookie)
             if session_id and session_id in session_store:
                 del session_store[session_id]
     
@@ -130,8 +148,11 @@ async def get_current_user_info(request: Request):
 @router.get("/auth/status")
 async def auth_status(request: Request):
     """Check authentication status"""
-    user = get_current_user(request)
-    return {
-        "authenticated": user is not None,
-        "user": user.dict() if user else None
-    }
\ No newline at end of file
+    principal = get_current_principal(request)
+    if principal is None:
+        return {"authenticated": False, "user": None}
+    # The principal's JSON is serialized once per session, so this is just a concatenation
+    return Response(
+        content=b'{"authenticated":true,"user":' + principal.json + b"}",
+        media_type="application/json"
+    )
\ No newline at end of file
@@ -20,7 +20,7 @@ async def get_calendar_events(
     Requires an active user session and valid Google OAuth credentials.
     """
     try:
-        events = calendar_service.fetch_calendar_events(user.id, days_ahead)
+        events = await calendar_service.fetch_calendar_events(user.id, days_ahead)
         
         if events is None:
             raise HTTPException(
@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Request, HTTPException, Depends
+import uuid
+from typing import Optional
+from fastapi import APIRouter, Request, HTTPException, Depends, Header, WebSocket, status
 from fastapi.responses import StreamingResponse
 from app.models.chat import ChatRequest, ChatResponse
 from app.models.user import User
+from app.core.config import settings
 from app.services.chat_service import chat_service
+from app.core.auth import get_current_user
 from app.core.middleware import require_auth
-from app.utils.streaming import streaming_utils
+from app.services.chat_socket import serve_chat_socket
+from app.services.response_streams import response_stream_store, parse_last_event_id
+from app.utils.streaming import streaming_utils, coalesce_chunks, SSEFrameEncoder
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
@@ -45,25 +51,31 @@ async def test_chat_message_streaming(
     Test endpoint for streaming chat responses without authentication.
     """
     try:
-        async def test_stream():
+        async def test_characters():
             import asyncio
-            import json
             
             # Send a simple test response
             test_response = "This is a test streaming response. The streaming functionality is working correctly!"
             
-            # Stream the response character by character
-            for i, char in enumerate(test_response):
-                chunk = {
-                    "id": f"test-{i}",
-                    "content": char,
-                    "isComplete": False
-                }
-                yield f"data: {json.dumps(chunk)}\n\n"
+            # Produce the response character by character
+            for char in test_response:
+                yield char
                 await asyncio.sleep(0.05)  # Small delay for streaming effect
+        
+        async def test_stream():
+            # Batch characters into frames according to the request's coalescing settings
+            chunks = coalesce_chunks(
+                test_characters(),
+                window_ms=chat_request.stream_coalesce_ms,
+                max_bytes=chat_request.stream_coalesce_bytes
+            )
+            i = 0
+            async for chunk in chunks:
+                yield SSEFrameEncoder.content_frame(f"test-{i}", chunk)
+                i += 1
             
             # Send completion signal
-            yield f"data: {json.dumps({'id': 'test-complete', 'content': '', 'isComplete': True})}\n\n"
+            yield SSEFrameEncoder("test-complete").complete()
         
         return StreamingResponse(
             test_stream(),
@@ -88,7 +100,6 @@ async def test_chat_message_streaming_real(
     """
     try:
         from app.models.user import User
-        from fastapi.responses import StreamingResponse
         
         # Create a mock user for testing
         mock_user = User(
@@ -101,16 +112,7 @@ async def test_chat_message_streaming_real(
         # Create streaming response
         response_generator = chat_service.process_message_streaming(chat_request, mock_user)
         
-        return StreamingResponse(
-            response_generator,
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "*",
-            }
-        )
+        return streaming_utils.sse_response(response_generator)
         
     except Exception as e:
         raise HTTPException(
@@ -130,6 +132,10 @@ async def send_chat_message_streaming(
     
     This endpoint processes user messages and returns streaming responses from the AI agent.
     Integrates with Google Gemini LLM and calendar services for real-time responses.
+    
+    Each event carries an ``id: <response_id>:<seq>`` field and the response id is
+    returned in ``X-Response-Id``; a dropped connection can resume through
+    ``GET /api/chat/stream/{response_id}`` with a ``Last-Event-ID`` header.
     """
     try:
         # Get calendar events to determine if context was included
@@ -140,11 +146,17 @@ async def send_chat_message_streaming(
         # Create streaming response
         response_generator = chat_service.process_message_streaming_plain(chat_request, user)
         
-        return streaming_utils.create_streaming_response(
-            response_generator=response_generator,
+        # Generation runs independently of this connection so it can be resumed
+        response_id = str(uuid.uuid4())
+        frames = streaming_utils.create_stream_generator(
+            response_generator,
+            response_id,
             calendar_context_included=bool(calendar_events),
             event_count=len(calendar_events)
         )
+        stream = response_stream_store.create(response_id, user.id, frames)
+        
+        return streaming_utils.sse_response(stream.subscribe(), headers={"X-Response-Id": response_id})
         
     except HTTPException:
         raise
@@ -152,4 +164,56 @@ async def send_chat_message_streaming(
         raise HTTPException(
             status_code=500,
             detail=f"An error occurred while processing your message: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.get("/stream/{response_id}")
+async def resume_chat_message_streaming(
+    response_id: str,
+    user: User = Depends(require_auth),
+    last_event_id: Optional[str] = Header(default=None)
+):
+    """
+    Resume a streaming response after a dropped connection.
+    
+    Replays the events after ``Last-Event-ID`` from the response's buffer and then
+    follows generation live if it is still running.
+    """
+    stream = response_stream_store.get(response_id, user.id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Response stream not found or expired")
+    
+    try:
+        after_seq = parse_last_event_id(last_event_id, response_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid Last-Event-ID: {str(e)}")
+    
+    if not stream.can_resume_after(after_seq):
+        raise HTTPException(status_code=410, detail="Requested events are no longer buffered")
+    
+    return streaming_utils.sse_response(stream.subscribe(after_seq), headers={"X-Response-Id": response_id})
+
+
+@router.websocket("/ws")
+async def chat_websocket(websocket: WebSocket):
+    """
+    Chat over a single WebSocket instead of one POST and SSE stream per message.
+    
+    The session cookie is checked once, when the socket opens. Several responses can
+    stream at once, each tagged with the client's message id, and any of them can be
+    cancelled; see ``ChatSocketSession`` for the message format.
+    """
+    # Browsers send cookies on cross-site WebSocket handshakes and CORS does not apply,
+    # so refuse pages from other origins before the cookie is honoured
+    origin = websocket.headers.get("origin")
+    if origin is not None and origin not in settings.cors_origins:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Origin not allowed")
+        return
+    
+    # HTTP middleware does not run for WebSockets, so authenticate here
+    user = get_current_user(websocket)
+    if not user:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Authentication required")
+        return
+    
+    await serve_chat_socket(websocket, user, chat_service)
@@ -1,17 +1,40 @@
 from fastapi import Request, HTTPException, status
 from fastapi.security import HTTPBearer
-from typing import Optional, Dict
+from starlette.requests import HTTPConnection
+from collections import OrderedDict
+from typing import Optional, Dict, NamedTuple
+import hmac
 import requests
 import secrets
+import time
 from datetime import datetime, timedelta, timezone
 from urllib.parse import urlencode
 
 from app.core.config import settings
+from app.core.metrics import upstream_errors_total
+from app.core.session_tokens import SessionTokenSigner, RevocationList, RedisRevocationSync
+from app.core.expiring_store import create_expiring_store
+from app.core.session_store import SessionStore
+from app.core.id_tokens import id_token_verifier, id_token_verifications_total
 from app.models.user import User, GoogleTokens, GoogleUserInfo, UserSession
-from app.services.secret_manager import secret_manager
+from app.services.secret_manager import async_secret_manager
 
 security = HTTPBearer()
 
+# Holds the OAuth state in the browser that started the login, only sent back to the callback
+OAUTH_STATE_COOKIE = "oauth_state"
+OAUTH_STATE_COOKIE_PATH = "/api/v1/auth/google"
+
+
+class Principal(NamedTuple):
+    """An authenticated user plus its serialized JSON, built once and reused across requests"""
+    user: User
+    json: bytes
+    
+    @classmethod
+    def for_user(cls, user: User) -> "Principal":
+        return cls(user, user.model_dump_json().encode("utf-8"))
+
 
 class AuthService:
     def __init__(self):
@@ -21,6 +44,40 @@ class AuthService:
         self.scopes = settings.oauth_scopes
         self.session_secret = settings.session_secret_key
         self.session_expire_hours = settings.session_expire_hours
+        self.authorize_url = settings.google_oauth_authorize_url
+        self.token_url = settings.google_oauth_token_url
+        self.user_info_url = settings.google_userinfo_url
+        self.session_tokens = SessionTokenSigner(self.session_secret, settings.session_cookie_encrypt)
+        # Unsigned cookies bypass the signature and revocation checks, so they are refused unless migrating
+        self.accept_unsigned_session_ids = settings.session_accept_unsigned_ids
+        self.revoked_sessions = RevocationList(
+            RedisRevocationSync(settings.session_backend_url, "revoked_session", 3600 * self.session_expire_hours)
+            if settings.session_backend_url else None,
+            settings.revocation_sync_interval_s
+        )
+        self.oauth_states = create_expiring_store("oauth_state")
+        self.oauth_state_ttl = settings.oauth_state_ttl_s
+        # Principals for self-contained session cookies, keyed by cookie value: token -> (principal, sid, exp)
+        self.token_principals: "OrderedDict[str, tuple]" = OrderedDict()
+        self.max_token_principals = 4096
+    
+    async def create_oauth_state(self) -> str:
+        """Generate a single-use OAuth state value, valid for ``oauth_state_ttl``"""
+        state = secrets.token_urlsafe(32)
+        await self.oauth_states.put_async(state, True, self.oauth_state_ttl)
+        return state
+    
+    async def consume_oauth_state(self, state: str, browser_state: Optional[str]) -> bool:
+        """
+        Check an OAuth state issued by this service and invalidate it.
+        
+        ``browser_state`` is the state cookie set when the login started; the state
+        must match it, so a state obtained by someone else cannot complete a login
+        in this browser (login CSRF).
+        """
+        if not browser_state or not hmac.compare_digest(state.encode("utf-8"), browser_state.encode("utf-8")):
+            return False
+        return await self.oauth_states.pop_async(state) is not None
     
     def generate_oauth_url(self, state: str) -> str:
         """Generate Google OAuth URL"""
@@ -34,12 +91,10 @@ class AuthService:
             "prompt": "consent"
         }
         
-        return f"https://accounts.google.com/o/oauth2/v2/auth?{urlencode(params)}"
+        return f"{self.authorize_url}?{urlencode(params)}"
     
     def exchange_code_for_tokens(self, code: str) -> Optional[GoogleTokens]:
         """Exchange authorization code for access and refresh tokens"""
-        token_url = "https://oauth2.googleapis.com/token"
-        
         data = {
             "client_id": self.client_id,
             "client_secret": self.client_secret,
@@ -49,7 +104,7 @@ class AuthService:
         }
         
         try:
-            response = requests.post(token_url, data=data)
+            response = requests.post(self.token_url, data=data)
             response.raise_for_status()
             
             token_data = response.json()
@@ -58,23 +113,39 @@ class AuthService:
                 access_token=token_data["access_token"],
                 refresh_token=token_data["refresh_token"],
                 expires_in=token_data["expires_in"],
-                token_type=token_data["token_type"]
+                token_type=token_data["token_type"],
+                id_token=token_data.get("id_token")
             )
             
         except Exception as e:
             print(f"Error exchanging code for tokens: {e}")
+            upstream_errors_total.labels("google_oauth", type(e).__name__).inc()
             return None
     
+    async def user_info_from_id_token(self, id_token: Optional[str]) -> Optional[GoogleUserInfo]:
+        """Get user information from a locally verified ID token (None if it is missing or invalid)"""
+        claims = await id_token_verifier.verify(id_token) if id_token else None
+        if not claims or not (claims.get("sub") and claims.get("email") and claims.get("name")):
+            id_token_verifications_total.labels("fallback").inc()
+            return None
+        
+        id_token_verifications_total.labels("verified").inc()
+        return GoogleUserInfo(
+            id=claims["sub"],
+            email=claims["email"],
+            name=claims["name"],
+            picture=claims.get("picture", ""),
+            verified_email=claims.get("email_verified", False)
+        )
+    
     def get_user_info(self, access_token: str) -> Optional[GoogleUserInfo]:
         """Get user information from Google using access token"""
-        user_info_url = "https://www.googleapis.com/oauth2/v2/userinfo"
-        
         headers = {
             "Authorization": f"Bearer {access_token}"
         }
         
         try:
-            response = requests.get(user_info_url, headers=headers)
+            response = requests.get(self.user_info_url, headers=headers)
             response.raise_for_status()
             
             user_data = response.json()
@@ -89,33 +160,95 @@ class AuthService:
             
         except Exception as e:
             print(f"Error getting user info: {e}")
+            upstream_errors_total.labels("google_oauth", type(e).__name__).inc()
             return None
     
     def create_session_id(self) -> str:
         """Create a secure session ID"""
         return secrets.token_urlsafe(32)
     
-    def create_session_cookie(self, session_id: str) -> str:
-        """Create a session cookie value"""
-        return session_id
+    def create_session_cookie(self, session_id: str, session: Optional[UserSession] = None) -> str:
+        """
+        Create a signed session cookie value.
+        
+        With ``session`` the cookie also carries the user's profile and the session
+        expiry, so any worker can authenticate it without a session store lookup.
+        """
+        if session is not None:
+            expires_at = session.expires_at.timestamp()
+        else:
+            expires_at = (datetime.now(timezone.utc) + timedelta(hours=self.session_expire_hours)).timestamp()
+        claims = {"sid": session_id, "exp": int(expires_at)}
+        
+        if session is not None and session.user_info is not None:
+            claims.update({
+                "uid": session.user_info.id,
+                "email": session.user_info.email,
+                "name": session.user_info.name,
+                "picture": session.user_info.picture,
+                "ve": session.user_info.verified_email,
+            })
+        
+        return self.session_tokens.encode(claims)
+    
+    def decode_session_cookie(self, cookie_value: str) -> Optional[Dict]:
+        """Verify a signed session cookie and return its claims (None if invalid, expired or revoked)"""
+        claims = self.session_tokens.decode(cookie_value)
+        if claims is None or self.revoked_sessions.is_revoked(claims.get("sid", "")):
+            return None
+        return claims
     
     def validate_session_cookie(self, cookie_value: str) -> Optional[str]:
         """Validate session cookie and return session ID"""
-        # In a real implementation, you'd want to validate the signature
-        # and expiration. For now, just return the value.
-        return cookie_value
+        if not self.session_tokens.is_token(cookie_value):
+            # Bare server-side session id from before cookies were signed; only valid if it is in the session store
+            return cookie_value if self.accept_unsigned_session_ids else None
+        claims = self.decode_session_cookie(cookie_value)
+        return claims["sid"] if claims else None
+    
+    def revoke_session_cookie(self, cookie_value: str):
+        """Reject a signed session cookie from now until it would have expired"""
+        claims = self.session_tokens.decode(cookie_value)
+        if claims is not None:
+            self.revoked_sessions.revoke(claims["sid"], claims["exp"])
+    
+    def principal_for_token(self, cookie_value: str) -> Optional[Principal]:
+        """Resolve a self-contained session cookie, reusing the principal built for it last time"""
+        entry = self.token_principals.get(cookie_value)
+        if entry is not None:
+            principal, session_id, expires_at = entry
+            if expires_at > time.time() and not self.revoked_sessions.is_revoked(session_id):
+                self.token_principals.move_to_end(cookie_value)
+                return principal
+            del self.token_principals[cookie_value]
+            return None
+        
+        claims = self.decode_session_cookie(cookie_value)
+        if not claims or "uid" not in claims:
+            return None
+        principal = Principal.for_user(User(
+            id=claims["uid"],
+            email=claims["email"],
+            name=claims["name"],
+            picture=claims.get("picture"),
+            verified_email=claims.get("ve", True)
+        ))
+        self.token_principals[cookie_value] = (principal, claims["sid"], claims["exp"])
+        if len(self.token_principals) > self.max_token_principals:
+            self.token_principals.popitem(last=False)
+        return principal
     
-    def store_refresh_token_securely(self, user_id: str, refresh_token: str) -> bool:
-        """Store refresh token using secret manager"""
-        return secret_manager.store_refresh_token(user_id, refresh_token)
+    async def store_refresh_token_securely(self, user_id: str, refresh_token: str) -> bool:
+        """Store refresh token using secret manager (batched off the event loop)"""
+        return await async_secret_manager.store_refresh_token(user_id, refresh_token)
     
-    def get_refresh_token_securely(self, user_id: str) -> Optional[str]:
-        """Retrieve refresh token using secret manager"""
-        return secret_manager.get_refresh_token(user_id)
+    async def get_refresh_token_securely(self, user_id: str) -> Optional[str]:
+        """Retrieve refresh token using secret manager (cached, or fetched off the event loop)"""
+        return await async_secret_manager.get_refresh_token(user_id)
     
-    def delete_refresh_token_securely(self, user_id: str) -> bool:
-        """Delete refresh token using secret manager"""
-        return secret_manager.delete_refresh_token(user_id)
+    async def delete_refresh_token_securely(self, user_id: str) -> bool:
+        """Delete refresh token using secret manager (batched off the event loop)"""
+        return await async_secret_manager.delete_refresh_token(user_id)
     
     def create_user_session(self, user: GoogleUserInfo, access_token: str) -> UserSession:
         """Create a user session"""
@@ -135,18 +268,56 @@ class AuthService:
 auth_service = AuthService()
 
 
-# Session storage (in-memory for demo, use Redis in production)
-session_store: Dict[str, UserSession] = {}
+# Session storage (in-memory, bounded and swept; signed cookies keep working across workers without it)
+session_store = SessionStore(settings.session_max_count, settings.session_sweep_interval_s)
 
 
-def get_current_user(request: Request) -> Optional[User]:
-    """Get current user from session"""
+def session_principal(session: UserSession) -> Principal:
+    """The principal for a stored session; rebuilt only when the session's user info changes"""
+    cached = session._principal
+    if cached is not None and cached[0] is session.user_info:
+        return cached[1]
+    
+    # Use the stored user info from Google
+    if session.user_info:
+        user = User(
+            id=session.user_info.id,
+            email=session.user_info.email,
+            name=session.user_info.name,
+            picture=session.user_info.picture,
+            verified_email=session.user_info.verified_email
+        )
+    else:
+        # Fallback to minimal user object if user_info is not stored
+        user = User(
+            id=session.user_id,
+            email="user@example.com",
+            name="User Name",
+            picture="https://example.com/avatar.jpg"
+        )
+    principal = Principal.for_user(user)
+    session._principal = (session.user_info, principal)
+    return principal
+
+
+def get_current_principal(request: HTTPConnection) -> Optional[Principal]:
+    """Resolve the request's session cookie to a principal (works for both HTTP requests and WebSockets)"""
     session_cookie = request.cookies.get("session_id")
     if not session_cookie:
         return None
     
-    session_id = auth_service.validate_session_cookie(session_cookie)
-    if not session_id:
+    if auth_service.session_tokens.is_token(session_cookie):
+        # Self-contained cookie: verified by its signature alone, no store lookup
+        principal = auth_service.principal_for_token(session_cookie)
+        if principal is not None:
+            return principal
+        claims = auth_service.decode_session_cookie(session_cookie)
+        if not claims or "uid" in claims:
+            return None
+        session_id = claims["sid"]
+    elif auth_service.accept_unsigned_session_ids:
+        session_id = session_cookie
+    else:
         return None
     
     session = session_store.get(session_id)
@@ -157,23 +328,13 @@ def get_current_user(request: Request) -> Optional[User]:
         del session_store[session_id]
         return None
     
-    # Use the stored user info from Google
-    if session.user_info:
-        return User(
-            id=session.user_info.id,
-            email=session.user_info.email,
-            name=session.user_info.name,
-            picture=session.user_info.picture,
-            verified_email=session.user_info.verified_email
-        )
-    
-    # Fallback to minimal user object if user_info is not stored
-    return User(
-        id=session.user_id,
-        email="user@example.com",
-        name="User Name",
-        picture="https://example.com/avatar.jpg"
-    )
+    return session_principal(session)
+
+
+def get_current_user(request: HTTPConnection) -> Optional[User]:
+    """Get current user from session (works for both HTTP requests and WebSockets)"""
+    principal = get_current_principal(request)
+    return principal.user if principal else None
 
 
 async def get_current_active_user(request: Request) -> User:
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -12,21 +12,108 @@ class Settings(BaseSettings):
     google_oauth_client_secret: str = "test_client_secret"
     google_oauth_redirect_uri: str = "http://localhost:8000/api/v1/auth/google/callback"
     
+    # Google Endpoints (point these at app.fakes.google_api for offline benchmarks)
+    google_oauth_authorize_url: str = "https://accounts.google.com/o/oauth2/v2/auth"
+    google_oauth_token_url: str = "https://oauth2.googleapis.com/token"
+    google_userinfo_url: str = "https://www.googleapis.com/oauth2/v2/userinfo"
+    google_oauth_certs_url: str = "https://www.googleapis.com/oauth2/v3/certs"  # ID token signing keys (JWKS)
+    google_calendar_api_base_url: str = "https://www.googleapis.com/calendar/v3"
+    
     # Google Cloud Configuration
     google_cloud_project_id: str = "test_project_id"
     google_cloud_credentials_path: str = "test_credentials_path"
     
+    # Refresh Token Storage ("memory", "file" for an encrypted local log, or "gcp" for Cloud Secret Manager)
+    secret_backend: str = "memory"
+    secret_file_path: str = "refresh_tokens.log"
+    secret_encryption_key: Optional[str] = None  # Required for the "file" backend: at least 32 random characters
+    secret_manager_api_base_url: str = "https://secretmanager.googleapis.com/v1"
+    secret_manager_access_token: Optional[str] = None  # Uses the GCE metadata server's service account token when unset
+    secret_cache_ttl_s: float = 300.0  # Serve refresh tokens from memory for this long
+    
     # Google Gemini API Configuration
     google_gemini_api_key: str = "test_gemini_api_key"
     
+    # LLM Backend Configuration ("gemini" or "fake")
+    llm_backend: str = "gemini"
+    
+    # Fake LLM Backend Configuration (used when llm_backend is "fake")
+    fake_llm_ttft_ms: float = 350.0
+    fake_llm_inter_token_ms: float = 25.0
+    fake_llm_latency_sigma: float = 0.35
+    fake_llm_response_tokens: int = 80
+    fake_llm_chunk_tokens: int = 1
+    fake_llm_response_text: Optional[str] = None
+    fake_llm_error_rate: float = 0.0
+    fake_llm_timeout_rate: float = 0.0
+    fake_llm_timeout_after_s: float = 30.0
+    fake_llm_seed: int = 0
+    
     # Application Configuration
     app_name: str = "Tenex Take Home API"
+    cors_origins: List[str] = ["http://localhost:3000"]  # Browser origins allowed by CORS and on the chat WebSocket
     app_version: str = "0.1.0"
     debug: bool = False
     
+    # Tracing Configuration ("none", "otlp_json" or "opentelemetry")
+    tracing_export: str = "none"
+    
+    # Metrics Configuration
+    loop_lag_interval_s: float = 0.5  # How often the event-loop lag probe runs
+    loop_stall_threshold_s: float = 0.25  # Log the loop thread's stack when blocked longer than this
+    blocking_io_debug: bool = False  # Log synchronous I/O performed on the event loop thread
+    
+    # Streaming Configuration (defaults; chat requests can override per stream)
+    sse_coalesce_window_ms: float = 16.0  # Batch LLM chunks for up to this long (0 disables)
+    sse_coalesce_max_bytes: int = 256  # Flush a batch early once it reaches this size
+    sse_replay_ttl_s: float = 300.0  # Keep finished responses resumable via Last-Event-ID this long
+    sse_replay_max_bytes: int = 256 * 1024  # Per-response replay buffer size
+    sse_abandon_grace_s: float = 10.0  # Cancel generation if no reader reconnects within this long
+    sse_max_stream_lifetime_s: float = 600.0  # Cancel generation still running after this long (0 disables)
+    sse_replay_max_streams: int = 10_000  # Response streams kept per worker; the oldest is evicted beyond this
+    sse_replay_max_streams_per_user: int = 16  # Response streams kept per user; their oldest is evicted beyond this
+    sse_heartbeat_interval_s: float = 15.0  # Send a keep-alive comment after this long without a frame (0 disables)
+    sse_idle_timeout_s: float = 120.0  # Abort generation after this long without a chunk from the LLM (0 disables)
+    sse_write_buffer_max_bytes: int = 64 * 1024  # Drop a reader that falls this far behind the live stream
+    ws_max_in_flight: int = 8  # Concurrent responses allowed on one chat WebSocket
+    
+    # Conversation Configuration
+    conversation_ttl_s: float = 3600.0  # Forget server-side conversations idle for this long
+    conversation_max_messages: int = 5  # Recent messages kept verbatim; older ones are folded into a summary
+    conversation_max_count: int = 100_000  # Conversations kept per worker; the least recently updated is evicted beyond this
+    conversation_max_per_user: int = 50  # Conversations kept per user; their least recently updated is evicted beyond this
+    conversation_summary_max_chars: int = 1500  # Upper bound on a conversation's running summary
+    
+    # Rate Limiting Configuration (per user token buckets; limits are per minute, bursts in requests)
+    rate_limit_enabled: bool = True
+    rate_limit_chat_per_minute: float = 30.0
+    rate_limit_chat_burst: int = 10
+    rate_limit_calendar_per_minute: float = 60.0
+    rate_limit_calendar_burst: int = 20
+    rate_limit_auth_per_minute: float = 30.0
+    rate_limit_auth_burst: int = 10
+    rate_limit_sync_interval_s: float = 1.0  # How often workers share spent tokens (with SESSION_BACKEND_URL)
+    
+    # Load Shedding Configuration (load 1.0 = any signal at its limit; low priority work is refused first)
+    load_shed_enabled: bool = True
+    load_shed_lag_limit_s: float = 0.2  # Smoothed event loop lag
+    load_shed_max_streams: int = 200  # Open SSE streams on this worker
+    load_shed_max_llm_requests: int = 64  # LLM requests queued or in progress
+    
+    # Admin Configuration
+    admin_emails: List[str] = []  # Users allowed to reach /api/v1/admin routes
+    profiling_max_seconds: float = 60.0  # Upper bound for on-demand CPU profiles
+    
     # Session Configuration
-    session_secret_key: str = "test_secret_key"
+    session_secret_key: str = ""  # Required: signs session cookies; at least 32 random characters
     session_expire_hours: int = 24
+    session_cookie_encrypt: bool = False  # Encrypt session cookie claims (needs the cryptography package)
+    session_accept_unsigned_ids: bool = False  # Migration only: also accept bare session ids from cookies issued before signing
+    session_max_count: int = 100_000  # Evict least recently used server-side sessions beyond this many
+    session_sweep_interval_s: float = 60.0  # How often expired server-side sessions are removed
+    session_backend_url: Optional[str] = None  # e.g. redis://host:6379/0 to share auth state across workers; in-process when unset
+    oauth_state_ttl_s: float = 600.0  # How long a login may take between /auth/google and the callback
+    revocation_sync_interval_s: float = 1.0  # How often logouts are exchanged with other workers (with SESSION_BACKEND_URL)
     
     # OAuth Scopes
     oauth_scopes: List[str] = [
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import math
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is optional; without it state stays in-process
+    redis = None
+
+
+class ExpiringStore(ABC):
+    """
+    Key-value store whose entries expire after a TTL.
+
+    This is the storage backend for short-lived auth state (OAuth ``state``
+    values; revocation lists keep theirs in memory). The in-memory
+    implementation serves a single process; the Redis one lets every worker on
+    every node see the same state. Its calls wait on the network
+    (``blocking``), so async code uses the ``*_async`` methods, which then run
+    them in an executor.
+    """
+
+    blocking = False
+
+    @abstractmethod
+    def put(self, key: str, value: Any, ttl: float):
+        """Store ``value`` under ``key`` for ``ttl`` seconds."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """Return the value for ``key``, or None if absent or expired."""
+
+    @abstractmethod
+    def pop(self, key: str) -> Optional[Any]:
+        """Remove and return ``key`` (None if absent or expired); each entry can be consumed once."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of live entries."""
+
+    async def put_async(self, key: str, value: Any, ttl: float):
+        await self._off_loop(self.put, key, value, ttl)
+
+    async def pop_async(self, key: str) -> Optional[Any]:
+        return await self._off_loop(self.pop, key)
+
+    async def _off_loop(self, call: Callable, *args):
+        if not self.blocking:
+            return call(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, call, *args)
+
+
+class MemoryExpiringStore(ExpiringStore):
+    """
+    In-process expiring store with O(1) put, get and pop.
+
+    Expiry is tracked in a timing wheel: one bucket of keys per ``resolution``
+    seconds. Each ``put`` advances the wheel to the current tick and removes
+    what has expired, at most ``sweep_batch`` entries per call, so memory stays
+    flat under sustained traffic without any single request paying for a big
+    backlog. Entries that are consumed early leave a stale key in their bucket,
+    which the sweep skips.
+    """
+
+    def __init__(self, resolution: float = 1.0, sweep_batch: int = 1000, clock: Callable[[], float] = time.monotonic):
+        self.resolution = resolution
+        self.sweep_batch = sweep_batch
+        self.clock = clock
+        self._items: Dict[str, Tuple[Any, float]] = {}
+        self._wheel: Dict[int, List[str]] = {}
+        self._next_tick = self._tick(clock())
+
+    def _tick(self, at: float) -> int:
+        return int(at // self.resolution)
+
+    def put(self, key: str, value: Any, ttl: float):
+        now = self.clock()
+        expires_at = now + ttl
+        self._items[key] = (value, expires_at)
+        # The bucket is swept once its whole tick has passed, so nothing is removed early
+        self._wheel.setdefault(self._tick(expires_at) + 1, []).append(key)
+        self.sweep(now)
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        if item[1] <= self.clock():
+            del self._items[key]
+            return None
+        return item[0]
+
+    def pop(self, key: str) -> Optional[Any]:
+        item = self._items.pop(key, None)
+        if item is None or item[1] <= self.clock():
+            return None
+        return item[0]
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Remove up to ``sweep_batch`` expired entries; returns how many were removed."""
+        now = self.clock() if now is None else now
+        current = self._tick(now)
+        removed = 0
+        while self._next_tick <= current:
+            if not self._wheel:
+                self._next_tick = current + 1
+                break
+            keys = self._wheel.pop(self._next_tick, None)
+            if keys:
+                for index, key in enumerate(keys):
+                    if removed >= self.sweep_batch:
+                        # Leave the rest of this bucket for the next sweep
+                        self._wheel[self._next_tick] = keys[index:]
+                        return removed
+                    item = self._items.get(key)
+                    if item is not None and item[1] <= now:
+                        del self._items[key]
+                        removed += 1
+            self._next_tick += 1
+        return removed
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class RedisExpiringStore(ExpiringStore):
+    """Expiring store in Redis, shared by all workers; Redis expires the keys itself."""
+
+    blocking = True
+
+    def __init__(self, url: str, namespace: str):
+        if redis is None:
+            raise RuntimeError("SESSION_BACKEND_URL points at Redis but the 'redis' package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = f"{namespace}:"
+
+    def put(self, key: str, value: Any, ttl: float):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, math.ceil(ttl)))
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.client.get(self.prefix + key)
+        return None if value is None else json.loads(value)
+
+    def pop(self, key: str) -> Optional[Any]:
+        # GETDEL makes consumption atomic, so a value can only be used once across workers
+        value = self.client.getdel(self.prefix + key)
+        return None if value is None else json.loads(value)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + "*", count=1000))
+
+
+def create_expiring_store(namespace: str) -> ExpiringStore:
+    """The configured backend for ``namespace``: Redis when SESSION_BACKEND_URL is set, else in-process."""
+    if settings.session_backend_url:
+        return RedisExpiringStore(settings.session_backend_url, namespace)
+    return MemoryExpiringStore()
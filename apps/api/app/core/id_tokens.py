@@ -0,0 +1,182 @@
+import asyncio
+import base64
+import json
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence
+
+import requests
+
+from app.core.config import settings
+from app.core.metrics import registry, upstream_errors_total
+
+try:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
+    from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicNumbers
+except ImportError:  # pragma: no cover - cryptography is optional; logins then fall back to userinfo
+    RSAPublicNumbers = None
+
+logger = logging.getLogger(__name__)
+
+id_token_verifications_total = registry.counter(
+    "id_token_verifications_total", "Login ID token checks by result", ("result",)
+)
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def _b64_int(value: str) -> int:
+    return int.from_bytes(_b64decode(value), "big")
+
+
+class GoogleIdTokenVerifier:
+    """
+    Verifies Google OpenID Connect ID tokens locally.
+
+    The RS256 signing keys come from Google's JWKS endpoint and are cached for
+    as long as its ``Cache-Control: max-age`` allows. A background task
+    refreshes them before they expire, so a login normally only costs a local
+    signature check. A token signed with a key that is not cached yet (Google
+    rotated keys) triggers one refetch, rate limited to ``min_refetch_interval``.
+    The refetch runs in the executor and concurrent logins wait for the same
+    one, so a key rotation never blocks the event loop.
+    """
+
+    def __init__(
+        self,
+        certs_url: str,
+        client_id: str,
+        issuers: Sequence[str] = ("https://accounts.google.com", "accounts.google.com"),
+        default_max_age: float = 3600.0,
+        min_refetch_interval: float = 60.0,
+        leeway: float = 60.0
+    ):
+        self.certs_url = certs_url
+        self.client_id = client_id
+        self.issuers = tuple(issuers)
+        self.default_max_age = default_max_age
+        self.min_refetch_interval = min_refetch_interval
+        self.leeway = leeway
+        self.keys: Dict[str, Any] = {}
+        self.expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._refetch: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def available(self) -> bool:
+        return RSAPublicNumbers is not None
+
+    def refresh_keys(self) -> bool:
+        """Fetch the current signing keys (blocking). Returns whether it succeeded."""
+        with self._lock:
+            self._fetched_at = time.monotonic()
+            try:
+                response = requests.get(self.certs_url, timeout=5)
+                response.raise_for_status()
+                keys = {}
+                for jwk in response.json().get("keys", []):
+                    if jwk.get("kty") == "RSA" and jwk.get("kid"):
+                        keys[jwk["kid"]] = RSAPublicNumbers(_b64_int(jwk["e"]), _b64_int(jwk["n"])).public_key()
+            except Exception as e:
+                logger.error(f"Error fetching ID token signing keys: {str(e)}")
+                upstream_errors_total.labels("google_oauth", type(e).__name__).inc()
+                return False
+
+            match = _MAX_AGE.search(response.headers.get("cache-control", ""))
+            max_age = float(match.group(1)) if match else self.default_max_age
+            self.keys = keys
+            self.expires_at = time.monotonic() + max_age
+            return True
+
+    async def verify(self, id_token: str) -> Optional[Dict[str, Any]]:
+        """Return the token's claims if its signature, issuer, audience and expiry check out, else None."""
+        if not self.available or not id_token:
+            return None
+        try:
+            header_b64, payload_b64, signature_b64 = id_token.split(".")
+            header = json.loads(_b64decode(header_b64))
+            if not isinstance(header, dict) or header.get("alg") != "RS256":
+                return None
+
+            key = await self._key_for(header.get("kid"))
+            if key is None:
+                return None
+            key.verify(
+                _b64decode(signature_b64),
+                f"{header_b64}.{payload_b64}".encode("ascii"),
+                padding.PKCS1v15(),
+                hashes.SHA256()
+            )
+            claims = json.loads(_b64decode(payload_b64))
+        except (InvalidSignature, ValueError, TypeError):
+            return None
+
+        now = time.time()
+        if not isinstance(claims, dict) or claims.get("iss") not in self.issuers:
+            return None
+        audience = claims.get("aud")
+        if audience != self.client_id and not (isinstance(audience, list) and self.client_id in audience):
+            return None
+        expires, issued = claims.get("exp", 0), claims.get("iat", 0)
+        if not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in (expires, issued)):
+            return None
+        if expires + self.leeway < now or issued - self.leeway > now:
+            return None
+        return claims
+
+    async def _key_for(self, kid: Optional[str]):
+        key = self.keys.get(kid)
+        if key is not None and time.monotonic() < self.expires_at:
+            return key
+        # Unknown key (rotation) or stale cache: refetch, but not on every bad token
+        if self._refetch is None and time.monotonic() - self._fetched_at >= self.min_refetch_interval:
+            self._fetched_at = time.monotonic()
+            self._refetch = asyncio.get_running_loop().run_in_executor(None, self.refresh_keys)
+            self._refetch.add_done_callback(self._refetch_done)
+        if self._refetch is not None:
+            # Shielded so one login being cancelled does not cancel the refetch for the others
+            await asyncio.shield(self._refetch)
+        return self.keys.get(kid)
+
+    def _refetch_done(self, refetch: asyncio.Future):
+        if self._refetch is refetch:
+            self._refetch = None
+
+    def start(self):
+        """Refresh keys in the background ahead of their expiry."""
+        if self.available and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            ok = await loop.run_in_executor(None, self.refresh_keys)
+            if ok:
+                # Refresh at 80% of the cache lifetime so keys never lapse between refreshes
+                delay = max(self.min_refetch_interval, (self.expires_at - time.monotonic()) * 0.8)
+            else:
+                delay = self.min_refetch_interval
+            await asyncio.sleep(delay)
+
+
+# Global instance
+id_token_verifier = GoogleIdTokenVerifier(settings.google_oauth_certs_url, settings.google_oauth_client_id)
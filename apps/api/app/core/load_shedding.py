@@ -0,0 +1,99 @@
+import logging
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.loop_monitor import loop_monitor
+from app.core.metrics import registry, sse_streams_in_flight, llm_requests_in_flight
+
+logger = logging.getLogger(__name__)
+
+requests_shed_total = registry.counter(
+    "requests_shed_total", "Requests rejected by load shedding, by priority", ("priority",)
+)
+
+# Path prefix -> priority; the first match wins, anything else is "normal"
+ROUTE_PRIORITIES: Tuple[Tuple[str, str], ...] = (
+    ("/health", "exempt"),
+    ("/metrics", "exempt"),
+    ("/api/v1/admin", "exempt"),  # Profiling has to keep working when the worker is overloaded
+    ("/api/chat/stream", "high"),
+    ("/api/chat/test-stream", "low"),
+    ("/api/v1/calendar", "low"),
+)
+
+
+class LoadShedder:
+    """
+    Rejects work early when this worker is saturated, lowest priority first.
+
+    Load is the highest of three pressure ratios: smoothed event-loop lag,
+    open SSE streams and in-flight LLM requests, each divided by its limit.
+    Every priority has a threshold on that load (low-priority routes and
+    background summaries go first, new chat streams last), so under overload
+    the cheap-to-refuse work is turned away while ``/api/chat/stream`` keeps
+    getting served at a bounded latency. Once shedding starts for a priority
+    it continues until load drops ``hysteresis`` below the threshold, so the
+    decision does not flap around the line.
+    """
+
+    def __init__(
+        self,
+        lag_limit: float = 0.2,
+        max_streams: int = 200,
+        max_llm_requests: int = 64,
+        thresholds: Optional[Dict[str, float]] = None,
+        hysteresis: float = 0.1
+    ):
+        self.lag_limit = lag_limit
+        self.max_streams = max_streams
+        self.max_llm_requests = max_llm_requests
+        self.thresholds = thresholds or {"low": 0.6, "normal": 0.85, "high": 1.0}
+        self.hysteresis = hysteresis
+        self.enabled = True
+        self._shedding: Dict[str, bool] = {}
+
+    @staticmethod
+    def priority(path: str) -> str:
+        for prefix, priority in ROUTE_PRIORITIES:
+            if path.startswith(prefix):
+                return priority
+        return "normal"
+
+    def load(self) -> float:
+        """Current load; 1.0 means one of the signals is at its limit."""
+        return max(
+            loop_monitor.smoothed_lag / self.lag_limit,
+            sse_streams_in_flight.value / self.max_streams,
+            llm_requests_in_flight.value / self.max_llm_requests
+        )
+
+    def should_shed(self, priority: str) -> bool:
+        """Whether work of ``priority`` should be refused right now."""
+        threshold = self.thresholds.get(priority)
+        if threshold is None or not self.enabled:
+            return False
+        load = self.load()
+        if self._shedding.get(priority):
+            shedding = load >= threshold - self.hysteresis
+        else:
+            shedding = load >= threshold
+            if shedding:
+                logger.warning(f"Load {load:.2f} reached the {priority} priority threshold, shedding")
+        self._shedding[priority] = shedding
+        if shedding:
+            requests_shed_total.labels(priority).inc()
+        return shedding
+
+
+def create_load_shedder() -> LoadShedder:
+    shedder = LoadShedder(
+        lag_limit=settings.load_shed_lag_limit_s,
+        max_streams=settings.load_shed_max_streams,
+        max_llm_requests=settings.load_shed_max_llm_requests
+    )
+    shedder.enabled = settings.load_shed_enabled
+    return shedder
+
+
+# Global instance
+load_shedder = create_load_shedder()
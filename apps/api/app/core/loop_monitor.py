@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import socket
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+from typing import Optional, Dict, Any
+
+from app.core.config import settings
+from app.core.metrics import event_loop_lag_seconds, registry
+from app.core.tracing import _current_trace
+
+logger = logging.getLogger(__name__)
+
+event_loop_stalls_total = registry.counter(
+    "event_loop_stalls_total", "Event loop stalls longer than the watchdog threshold"
+)
+blocking_io_calls_total = registry.counter(
+    "blocking_io_calls_total", "Synchronous I/O calls made on the event loop thread", ("event",)
+)
+
+# Audit events that mean the loop thread is about to wait on the OS
+_BLOCKING_EVENTS = {"open", "socket.connect", "socket.getaddrinfo", "socket.gethostbyname", "subprocess.Popen", "time.sleep"}
+
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag and reports what was running when the loop stalls.
+
+    A probe task sleeps for ``interval`` and records how late it woke up; each
+    wake-up is also a heartbeat. A watchdog thread checks the heartbeat, and when
+    it is overdue by more than ``stall_threshold`` it captures the loop thread's
+    stack and the task that is running, and logs them.
+
+    Before Python 3.12 the request route of that task can only be known by
+    wrapping the loop's task factory, which costs something on every task
+    created, so it is only done with ``track_task_routes`` (BLOCKING_IO_DEBUG).
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.5,
+        stall_threshold: float = 0.25,
+        max_reports: int = 20,
+        track_task_routes: bool = False
+    ):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.track_task_routes = track_task_routes
+        self.last_lag = 0.0
+        self.smoothed_lag = 0.0  # Exponentially weighted, so one slow tick does not read as overload
+        self.max_lag = 0.0
+        self.stalls = deque(maxlen=max_reports)
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._reported_call_sites = set()
+        self._auditing = False
+        self._task_traces = weakref.WeakKeyDictionary()
+        self._previous_task_factory = None
+        self._task_factory_installed = False
+
+    def start(self):
+        """Start probing on the running event loop, plus the watchdog thread."""
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        if self.track_task_routes:
+            self._install_task_factory()
+        self._task = self._loop.create_task(self._run())
+
+        self._stop_event.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stop_event.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._task_factory_installed:
+            self._loop.set_task_factory(self._previous_task_factory)
+            self._task_factory_installed = False
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1.0)
+            self._watchdog = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started_at = loop.time()
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.observe(loop.time() - started_at - self.interval)
+
+    def observe(self, lag: float):
+        lag = max(0.0, lag)
+        self.last_lag = lag
+        self.smoothed_lag += 0.3 * (lag - self.smoothed_lag)
+        self.max_lag = max(self.max_lag, lag)
+        event_loop_lag_seconds.observe(lag)
+
+    def _watch(self):
+        reported_beat = None
+        check_every = max(self.stall_threshold / 4, 0.005)
+        while not self._stop_event.wait(check_every):
+            beat = self._last_beat
+            overdue = time.monotonic() - beat - self.interval
+            # Report each stall once, while it is still in progress
+            if overdue > self.stall_threshold and beat != reported_beat:
+                reported_beat = beat
+                self._report_stall(overdue)
+
+    def _report_stall(self, overdue: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+        task = asyncio.current_task(self._loop) if self._loop is not None else None
+        route = self._running_route(task)
+        task_name = _task_name(task)
+        report = {
+            "blocked_for_s": round(overdue, 3), "route": route, "task": task_name, "stack": stack, "at": time.time()
+        }
+        self.stalls.append(report)
+        event_loop_stalls_total.inc()
+        logger.warning(f"Event loop blocked for at least {overdue:.3f}s (route: {route}, task: {task_name})\n{stack}")
+
+    def _install_task_factory(self):
+        # Before Python 3.12 a task's context is not readable from another thread, so
+        # remember the request trace each task inherits when it is created
+        if self._task_factory_installed or hasattr(asyncio.Task, "get_context"):
+            return
+        previous_factory = self._previous_task_factory = self._loop.get_task_factory()
+        task_traces = self._task_traces
+
+        def task_factory(loop, coro, **kwargs):
+            if previous_factory is not None:
+                task = previous_factory(loop, coro, **kwargs)
+            else:
+                task = asyncio.Task(coro, loop=loop, **kwargs)
+            trace = _current_trace.get()
+            if trace is not None:
+                task_traces[task] = trace
+            return task
+
+        self._loop.set_task_factory(task_factory)
+        self._task_factory_installed = True
+
+    def _running_route(self, task: Optional[asyncio.Task]) -> Optional[str]:
+        """Name of the trace owned by ``task`` (the one running on the loop), if known."""
+        if task is None:
+            return None
+        if hasattr(task, "get_context"):
+            trace = task.get_context().get(_current_trace)
+        else:
+            trace = self._task_traces.get(task)
+        return trace.name if trace is not None else None
+
+    def enable_blocking_io_debug(self):
+        """Log synchronous I/O performed on the loop thread (debug aid, adds overhead)."""
+        _install_audit_hook()
+        _debug_monitors.add(self)
+        self.track_task_routes = True
+        if self._task is not None and not self._task.done():
+            self._install_task_factory()
+
+    def disable_blocking_io_debug(self):
+        _debug_monitors.discard(self)
+
+    def _audit(self, event: str, args, caller):
+        # Formatting the stack reads source files, which is itself audited
+        if self._auditing or threading.get_ident() != self._loop_thread_id or asyncio._get_running_loop() is None:
+            return
+        # asyncio's own sockets are non-blocking and are fine on the loop
+        if event == "socket.connect" and isinstance(args[0], socket.socket) and not args[0].getblocking():
+            return
+
+        call_site = (event, caller.f_code.co_filename, caller.f_lineno)
+        if call_site in self._reported_call_sites:
+            return
+        self._reported_call_sites.add(call_site)
+
+        blocking_io_calls_total.labels(event).inc()
+        self._auditing = True
+        try:
+            stack = "".join(traceback.format_stack(caller))
+            route = self._running_route(asyncio.current_task(self._loop))
+            logger.warning(f"Blocking call '{event}' on the event loop thread (route: {route})\n{stack}")
+        finally:
+            self._auditing = False
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "last_lag_s": self.last_lag,
+            "max_lag_s": self.max_lag,
+            "stall_threshold_s": self.stall_threshold,
+            "stalls": list(self.stalls),
+        }
+
+
+def _task_name(task: Optional[asyncio.Task]) -> Optional[str]:
+    """Qualified name of the coroutine a task is running; readable from any thread."""
+    if task is None:
+        return None
+    coro = task.get_coro()
+    return getattr(coro, "__qualname__", None) or task.get_name()
+
+
+_debug_monitors = set()
+_audit_hook_installed = False
+
+
+def _audit_hook(event: str, args):
+    if not _debug_monitors or event not in _BLOCKING_EVENTS:
+        return
+    # Frame 1 is the Python code that triggered the audited C call
+    caller = sys._getframe(1)
+    for monitor in list(_debug_monitors):
+        monitor._audit(event, args, caller)
+
+
+def _install_audit_hook():
+    # Audit hooks cannot be removed, so install once and gate on _debug_monitors
+    global _audit_hook_installed
+    if not _audit_hook_installed:
+        sys.addaudithook(_audit_hook)
+        _audit_hook_installed = True
+
+
+# Global instance
+loop_monitor = LoopLagMonitor(
+    settings.loop_lag_interval_s, settings.loop_stall_threshold_s, track_task_routes=settings.blocking_io_debug
+)
+if settings.blocking_io_debug:
+    loop_monitor.enable_blocking_io_debug()
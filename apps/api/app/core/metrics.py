@@ -0,0 +1,317 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Dict, Tuple, Sequence, Optional, Callable, List
+
+# Latency buckets in seconds, from sub-millisecond stages up to long LLM calls
+DEFAULT_LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+# Event-loop lag is interesting from a millisecond up to multi-second stalls
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Counter:
+    """Monotonic counter. Increments are plain attribute updates, with no locks."""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Gauge:
+    """Value that can go up and down."""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with preallocated counters.
+
+    ``observe`` is a bisect plus three integer/float increments, with no locks:
+    updates come from the event loop thread, and an occasional lost increment
+    from a worker thread is acceptable for monitoring data.
+    """
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        # One extra slot for the +Inf bucket
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        """Yield (upper_bound, cumulative_count) pairs, ending with +Inf."""
+        running = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            running += count
+            yield bound, running
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside the matching bucket."""
+        if not self.count:
+            return None
+        target = q * self.count
+        lower = 0.0
+        previous = 0
+        for bound, cumulative in self.cumulative_counts():
+            if cumulative >= target:
+                if bound == float("inf"):
+                    return self.bounds[-1]
+                in_bucket = cumulative - previous
+                fraction = (target - previous) / in_bucket if in_bucket else 1.0
+                return lower + (bound - lower) * fraction
+            lower, previous = bound, cumulative
+        return self.bounds[-1]
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+        }
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class MetricFamily(ABC):
+    """
+    A named metric with zero or more labels; one child per label combination.
+
+    Children are created on first use and then reused, so the hot path is a
+    dict lookup plus the child's update. Families without labels forward
+    ``inc``/``dec``/``set``/``observe`` to their single child.
+    """
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, description: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.children: Dict[Tuple[str, ...], object] = {}
+        self._default = None if label_names else self.labels()
+
+    @abstractmethod
+    def _new_child(self):
+        """Create the metric for one label combination."""
+
+    def labels(self, *values: str):
+        child = self.children.get(values)
+        if child is None:
+            child = self.children.setdefault(values, self._new_child())
+        return child
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default.dec(amount)
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    @property
+    def value(self) -> float:
+        return self._default.value
+
+    def total(self) -> float:
+        """Sum of all children's values (counters and gauges)."""
+        return sum(child.value for child in list(self.children.values()))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.metric_type}"]
+        for values, child in list(self.children.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, values)} {_format_value(child.value)}")
+        return lines
+
+
+class CounterFamily(MetricFamily):
+    metric_type = "counter"
+
+    def _new_child(self):
+        return Counter()
+
+
+class GaugeFamily(MetricFamily):
+    metric_type = "gauge"
+
+    def _new_child(self):
+        return Gauge()
+
+
+class LabeledHistogram(MetricFamily):
+    """A family of histograms keyed by label values (e.g. one per stage)."""
+
+    metric_type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label_names: Tuple[str, ...] = (),
+        bounds: Sequence[float] = DEFAULT_LATENCY_BUCKETS
+    ):
+        self.bounds = tuple(bounds)
+        super().__init__(name, description, label_names)
+
+    def _new_child(self):
+        return Histogram(self.bounds)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {"/".join(key): child.snapshot() for key, child in list(self.children.items())}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for values, child in list(self.children.items()):
+            for bound, cumulative in child.cumulative_counts():
+                labels = _format_labels(self.label_names, values, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class CallbackGauge:
+    """Gauge whose value is computed when metrics are scraped."""
+
+    def __init__(self, name: str, description: str, callback: Callable[[], float]):
+        self.name = name
+        self.description = description
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {_format_value(self.callback())}",
+        ]
+
+
+class MetricsRegistry:
+    """Collection of metric families rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.families: Dict[str, object] = {}
+
+    def register(self, family):
+        """Register a family, returning the existing one if the name is taken."""
+        return self.families.setdefault(family.name, family)
+
+    def counter(self, name: str, description: str, label_names: Tuple[str, ...] = ()) -> CounterFamily:
+        return self.register(CounterFamily(name, description, label_names))
+
+    def gauge(self, name: str, description: str, label_names: Tuple[str, ...] = ()) -> GaugeFamily:
+        return self.register(GaugeFamily(name, description, label_names))
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        label_names: Tuple[str, ...] = (),
+        bounds: Sequence[float] = DEFAULT_LATENCY_BUCKETS
+    ) -> LabeledHistogram:
+        return self.register(LabeledHistogram(name, description, label_names, bounds))
+
+    def gauge_callback(self, name: str, description: str, callback: Callable[[], float]) -> CallbackGauge:
+        return self.register(CallbackGauge(name, description, callback))
+
+    def render(self) -> str:
+        lines = []
+        for family in list(self.families.values()):
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+# Global registry and application metrics
+registry = MetricsRegistry()
+
+http_requests_total = registry.counter(
+    "http_requests_total", "HTTP requests by method, route and status", ("method", "route", "status")
+)
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency (full body for streams)", ("method", "route")
+)
+sse_streams_in_flight = registry.gauge(
+    "sse_streams_in_flight", "Server-sent event streams currently open"
+)
+sse_heartbeats_total = registry.counter(
+    "sse_heartbeats_total", "Keep-alive comments sent on idle server-sent event streams"
+)
+sse_idle_timeouts_total = registry.counter(
+    "sse_idle_timeouts_total", "Streams aborted because the LLM sent nothing within the idle timeout"
+)
+sse_slow_readers_dropped_total = registry.counter(
+    "sse_slow_readers_dropped_total", "Stream readers disconnected for falling too far behind"
+)
+llm_prompt_tokens_total = registry.counter(
+    "llm_prompt_tokens_total", "LLM prompt tokens sent (estimated at 4 characters per token)"
+)
+llm_completion_tokens_total = registry.counter(
+    "llm_completion_tokens_total", "LLM completion tokens received (estimated at 4 characters per token)"
+)
+llm_requests_in_flight = registry.gauge(
+    "llm_requests_in_flight", "LLM requests queued for or waiting on the model"
+)
+llm_streams_cancelled_total = registry.counter(
+    "llm_streams_cancelled_total", "LLM streams cancelled because the client went away"
+)
+llm_cancelled_tokens_saved_total = registry.counter(
+    "llm_cancelled_tokens_saved_total",
+    "Estimated completion tokens not generated thanks to cancellation (from the average response size)"
+)
+calendar_cache_requests_total = registry.counter(
+    "calendar_cache_requests_total", "Chat calendar context cache lookups by result", ("result",)
+)
+upstream_errors_total = registry.counter(
+    "upstream_errors_total", "Errors from upstream services", ("upstream", "kind")
+)
+event_loop_lag_seconds = registry.histogram(
+    "event_loop_lag_seconds", "Event loop scheduling lag", bounds=LOOP_LAG_BUCKETS
+)
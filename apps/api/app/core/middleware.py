@@ -1,7 +1,14 @@
 from fastapi import Request, HTTPException, status
 from fastapi.responses import JSONResponse
 from typing import Callable
+import math
 from app.core.auth import get_current_user
+from app.core.config import settings
+from app.core.profiling import profiling_service, PROFILE_HEADER
+from app.core.rate_limit import rate_limiter
+from app.core.load_shedding import load_shedder
+from app.core.tracing import tracer
+from app.core.metrics import http_requests_total, http_request_duration_seconds, sse_streams_in_flight
 
 
 async def auth_middleware(request: Request, call_next: Callable):
@@ -15,6 +22,7 @@ async def auth_middleware(request: Request, call_next: Callable):
         "/api/chat/test-stream",
         "/api/chat/test-stream-real",
         "/health",
+        "/metrics",
         "/",
         "/docs",
         "/openapi.json",
@@ -25,7 +33,8 @@ async def auth_middleware(request: Request, call_next: Callable):
         return await call_next(request)
     
     # Check if user is authenticated
-    user = get_current_user(request)
+    with tracer.span("auth"):
+        user = get_current_user(request)
     if not user:
         return JSONResponse(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -35,9 +44,125 @@ async def auth_middleware(request: Request, call_next: Callable):
     # Add user to request state for use in route handlers
     request.state.user = user
     
+    if PROFILE_HEADER in request.headers and is_admin(user):
+        return await _profile_request(request, call_next)
+    
+    return await call_next(request)
+
+
+async def load_shed_middleware(request: Request, call_next: Callable):
+    """Refuse requests early, lowest priority first, while the worker is overloaded"""
+    if load_shedder.should_shed(load_shedder.priority(request.url.path)):
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": "Server is overloaded, please retry shortly"},
+            headers={"Retry-After": "1"}
+        )
+    
+    return await call_next(request)
+
+
+async def rate_limit_middleware(request: Request, call_next: Callable):
+    """Per-user token bucket limits for the chat, calendar and auth routes"""
+    route_class = rate_limiter.route_class(request.url.path)
+    if route_class is None:
+        return await call_next(request)
+    
+    # Authenticated routes are limited per user; the login routes per client address
+    user = getattr(request.state, "user", None)
+    key = user.id if user is not None else (request.client.host if request.client else "unknown")
+    retry_after = rate_limiter.acquire(route_class, key)
+    if retry_after:
+        return JSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content={"detail": "Rate limit exceeded"},
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+    
     return await call_next(request)
 
 
+async def _profile_request(request: Request, call_next: Callable):
+    """Sample the event loop thread while this request is served (concurrent requests included)"""
+    profile_id = profiling_service.start_request_profile()
+    try:
+        response = await call_next(request)
+    except Exception:
+        profiling_service.finish_request_profile(profile_id)
+        raise
+    
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
+        response.body_iterator = _finish_profile_after(response.body_iterator, profile_id)
+    else:
+        profiling_service.finish_request_profile(profile_id)
+    response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
+async def _finish_profile_after(body_iterator, profile_id: str):
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        profiling_service.finish_request_profile(profile_id)
+
+
+async def tracing_middleware(request: Request, call_next: Callable):
+    """Trace each request, reporting per-stage timings via Server-Timing"""
+    trace = tracer.start_trace(f"{request.method} {request.url.path}")
+    try:
+        response = await call_next(request)
+    except Exception:
+        tracer.end_trace(trace)
+        _observe_request(request.method, _route_label(request), 500, trace.duration)
+        raise
+    
+    # Prefer the route template so traces and metrics group by endpoint rather than by URL
+    route_label = _route_label(request)
+    if route_label != "unmatched":
+        trace.name = f"{request.method} {route_label}"
+    trace.attributes["http.status_code"] = response.status_code
+    
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
+        # Streaming stages run after the headers are sent; finish the trace when the body ends
+        response.body_iterator = _end_trace_after(
+            response.body_iterator, trace, request.method, route_label, response.status_code
+        )
+    else:
+        tracer.end_trace(trace)
+        _observe_request(request.method, route_label, response.status_code, trace.duration)
+        response.headers["Server-Timing"] = trace.server_timing()
+    
+    return response
+
+
+def _route_label(request: Request) -> str:
+    # Raw paths of unmatched requests would give the metrics unbounded cardinality
+    route = request.scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+
+def _observe_request(method: str, route: str, status_code: int, duration: float):
+    http_requests_total.labels(method, route, str(status_code)).inc()
+    http_request_duration_seconds.labels(method, route).observe(duration)
+
+
+async def _end_trace_after(body_iterator, trace, method: str, route: str, status_code: int):
+    sse_streams_in_flight.inc()
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        sse_streams_in_flight.dec()
+        tracer.end_trace(trace)
+        _observe_request(method, route, status_code, trace.duration)
+
+
+def is_admin(user) -> bool:
+    """Whether the user is listed in ADMIN_EMAILS"""
+    return user.email.lower() in {email.lower() for email in settings.admin_emails}
+
+
 def require_auth(request: Request):
     """Dependency function to require authentication"""
     user = get_current_user(request)
@@ -46,4 +171,15 @@ def require_auth(request: Request):
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Authentication required"
         )
-    return user
\ No newline at end of file
+    return user
+
+
+def require_admin(request: Request):
+    """Dependency function to require an authenticated admin"""
+    user = require_auth(request)
+    if not is_admin(user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return user
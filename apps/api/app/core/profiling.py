@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import os
+import secrets
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+from typing import Optional, Dict, Any, Iterable, List
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Request header that asks for a single request to be profiled (admins only)
+PROFILE_HEADER = "X-Profile-Request"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler built on ``sys._current_frames``.
+
+    A background thread samples every thread's stack each ``interval`` seconds,
+    so the profiled code needs no instrumentation and pays almost nothing.
+    Results are rendered as collapsed stacks (``root;child;leaf count``), the
+    input format of flamegraph.pl, speedscope and similar tools.
+    """
+
+    def __init__(self, interval: float = 0.005, thread_ids: Optional[Iterable[int]] = None):
+        self.interval = interval
+        self.thread_ids = set(thread_ids) if thread_ids is not None else None
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> "SamplingProfiler":
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._sample_loop, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        if self.stopped_at is None:
+            self.stopped_at = time.time()
+        return self
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(thread_names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Collapsed stacks, one ``frame;frame;frame count`` line per unique stack."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+            "unique_stacks": len(self.stacks),
+        }
+
+
+class ProfilingService:
+    """Holds the on-demand CPU profile, tracemalloc snapshots and per-request profiles."""
+
+    def __init__(self, max_seconds: float = 60.0, max_request_profiles: int = 20, max_snapshots: int = 10):
+        self.max_seconds = max_seconds
+        self.cpu_profiler: Optional[SamplingProfiler] = None
+        self._cpu_stop_handle: Optional[asyncio.TimerHandle] = None
+        self.request_profiles: "OrderedDict[str, SamplingProfiler]" = OrderedDict()
+        self.max_request_profiles = max_request_profiles
+        self.snapshots: "OrderedDict[int, tracemalloc.Snapshot]" = OrderedDict()
+        self.max_snapshots = max_snapshots
+        self._next_snapshot_id = 1
+
+    # CPU
+
+    def start_cpu(self, seconds: float, interval_ms: float = 5.0) -> SamplingProfiler:
+        """Start a process-wide sampling profile that stops itself after ``seconds``."""
+        if self.cpu_profiler is not None and self.cpu_profiler.running:
+            raise RuntimeError("A CPU profile is already running")
+
+        seconds = min(seconds, self.max_seconds)
+        self.cpu_profiler = SamplingProfiler(interval_ms / 1000).start()
+        self._cpu_stop_handle = asyncio.get_running_loop().call_later(seconds, self.cpu_profiler.stop)
+        logger.info(f"CPU profiling started for {seconds}s at {interval_ms}ms intervals")
+        return self.cpu_profiler
+
+    def stop_cpu(self) -> Optional[SamplingProfiler]:
+        if self._cpu_stop_handle is not None:
+            self._cpu_stop_handle.cancel()
+            self._cpu_stop_handle = None
+        if self.cpu_profiler is not None:
+            self.cpu_profiler.stop()
+        return self.cpu_profiler
+
+    # Per-request
+
+    def start_request_profile(self) -> str:
+        """
+        Sample the event loop thread for as long as one request is served.
+
+        The loop thread is shared, so the profile is of that time window rather
+        than of the request alone: frames from other requests handled
+        concurrently show up too. Profile on an otherwise idle worker to
+        isolate a single request.
+        """
+        profile_id = secrets.token_hex(8)
+        profiler = SamplingProfiler(thread_ids=[threading.get_ident()]).start()
+        self.request_profiles[profile_id] = profiler
+        while len(self.request_profiles) > self.max_request_profiles:
+            _, oldest = self.request_profiles.popitem(last=False)
+            oldest.stop()
+        return profile_id
+
+    def finish_request_profile(self, profile_id: str):
+        profiler = self.request_profiles.get(profile_id)
+        if profiler is not None:
+            profiler.stop()
+
+    def get_request_profile(self, profile_id: str) -> Optional[SamplingProfiler]:
+        return self.request_profiles.get(profile_id)
+
+    # Memory
+
+    def take_snapshot(self, frames: int = 25) -> Dict[str, Any]:
+        """Take a tracemalloc snapshot, starting tracing on first use."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            logger.info(f"tracemalloc started with {frames} frames")
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        snapshot_id = self._next_snapshot_id
+        self._next_snapshot_id += 1
+        self.snapshots[snapshot_id] = snapshot
+        while len(self.snapshots) > self.max_snapshots:
+            self.snapshots.popitem(last=False)
+
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "id": snapshot_id,
+            "traced_bytes": current,
+            "peak_traced_bytes": peak,
+            "top": [str(stat) for stat in snapshot.statistics("lineno")[:25]],
+        }
+
+    def diff_snapshots(self, base_id: int, target_id: int, limit: int = 25) -> List[str]:
+        """
+        Top allocation changes between two snapshots, largest growth first.
+
+        Comparing walks every trace in both snapshots; call it off the event loop.
+        """
+        base = self.snapshots.get(base_id)
+        target = self.snapshots.get(target_id)
+        if base is None or target is None:
+            raise KeyError("Unknown snapshot id")
+        return [str(stat) for stat in target.compare_to(base, "lineno")[:limit]]
+
+    def stop_memory(self):
+        """Stop tracemalloc and drop stored snapshots."""
+        self.snapshots.clear()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+# Global instance
+profiling_service = ProfilingService(settings.profiling_max_seconds)
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import registry, upstream_errors_total
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is optional; without it limits are per worker
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+rate_limited_total = registry.counter(
+    "rate_limited_total", "Requests rejected by the per-user rate limiter", ("route_class",)
+)
+
+# Path prefix -> route class; the first match wins
+ROUTE_CLASSES: Tuple[Tuple[str, str], ...] = (
+    ("/api/chat", "chat"),
+    ("/api/v1/calendar", "calendar"),
+    ("/api/v1/auth", "auth"),
+)
+
+
+class RateLimiter:
+    """
+    Per-user token buckets, one set per route class.
+
+    ``limits`` maps a route class to ``(tokens per second, burst)``. A bucket
+    is a two-item list ``[tokens, last refill]`` refilled lazily on access, so
+    admitting a request is a dict lookup and some arithmetic. Buckets are kept
+    in least recently used order and capped at ``max_buckets``: past the cap the
+    least recently used one is evicted in O(1), so a flood of new keys costs the
+    same per request as steady traffic.
+
+    With a ``sync`` attached, each worker still decides locally and the tokens
+    it spent are exchanged with the other workers every ``sync_interval``
+    seconds, so the combined rate converges on the configured one.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, Tuple[float, float]],
+        max_buckets: int = 100_000,
+        sync: Optional["RedisRateLimitSync"] = None,
+        sync_interval: float = 1.0
+    ):
+        self.limits = limits
+        self.max_buckets = max_buckets
+        self.sync = sync
+        self.sync_interval = sync_interval
+        self.enabled = True
+        self._buckets: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        # Tokens spent locally since the last sync, per bucket
+        self._spent: Dict[Tuple[str, str], float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def route_class(path: str) -> Optional[str]:
+        for prefix, route_class in ROUTE_CLASSES:
+            if path.startswith(prefix):
+                return route_class
+        return None
+
+    def acquire(self, route_class: str, key: str, now: Optional[float] = None) -> float:
+        """Take one token; returns 0.0 if the request may proceed, else seconds until it could."""
+        limit = self.limits.get(route_class)
+        if limit is None or not self.enabled:
+            return 0.0
+        rate, burst = limit
+        now = time.monotonic() if now is None else now
+        bucket_key = (route_class, key)
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            bucket = self._add_bucket(bucket_key, burst, now)
+        else:
+            self._buckets.move_to_end(bucket_key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+        if bucket[0] < 1.0:
+            rate_limited_total.labels(route_class).inc()
+            return (1.0 - bucket[0]) / rate
+        bucket[0] -= 1.0
+        if self.sync is not None:
+            self._spent[bucket_key] = self._spent.get(bucket_key, 0.0) + 1.0
+        return 0.0
+
+    def charge(self, bucket_key: Tuple[str, str], tokens: float, now: Optional[float] = None):
+        """Deduct tokens spent elsewhere (other workers) from a bucket; it may go into debt up to one burst."""
+        limit = self.limits.get(bucket_key[0])
+        if limit is None:
+            return
+        rate, burst = limit
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            bucket = self._add_bucket(bucket_key, burst, now)
+        bucket[0] = max(-burst, min(burst, bucket[0] + (now - bucket[1]) * rate) - tokens)
+        bucket[1] = now
+
+    def reset(self):
+        self._buckets.clear()
+        self._spent.clear()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _add_bucket(self, bucket_key: Tuple[str, str], burst: float, now: float) -> List[float]:
+        while len(self._buckets) >= self.max_buckets:
+            self._buckets.popitem(last=False)
+        bucket = self._buckets[bucket_key] = [burst, now]
+        return bucket
+
+    def start(self):
+        """Exchange spent tokens with the other workers in the background (only with a sync backend)."""
+        if self.sync is not None and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._sync_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _sync_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            spent, self._spent = self._spent, {}
+            try:
+                remote = await loop.run_in_executor(None, self.sync.exchange, spent)
+            except Exception as e:
+                logger.warning(f"Rate limit sync failed: {str(e)}")
+                upstream_errors_total.labels("rate_limit_sync", type(e).__name__).inc()
+                continue
+            for bucket_key, tokens in remote.items():
+                self.charge(bucket_key, tokens)
+
+
+class RedisRateLimitSync:
+    """
+    Shares token consumption between workers through Redis.
+
+    Every bucket has a counter of tokens spent by all workers. A worker adds
+    its own spending with INCRBYFLOAT and learns from the new total how much
+    the others spent since it last looked. Counters expire after ``ttl``
+    seconds without use, and a counter that went backwards (expired and was
+    recreated) is treated as a fresh start.
+    """
+
+    def __init__(self, url: str, ttl: float = 300.0, prefix: str = "ratelimit:"):
+        if redis is None:
+            raise RuntimeError("SESSION_BACKEND_URL points at Redis but the 'redis' package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self._seen: Dict[Tuple[str, str], float] = {}
+
+    def exchange(self, spent: Dict[Tuple[str, str], float]) -> Dict[Tuple[str, str], float]:
+        """Publish this worker's spending; returns tokens spent by other workers, per bucket."""
+        keys = set(spent) | set(self._seen)
+        if not keys:
+            return {}
+        keys = list(keys)
+        pipeline = self.client.pipeline(transaction=False)
+        for bucket_key in keys:
+            name = f"{self.prefix}{bucket_key[0]}:{bucket_key[1]}"
+            pipeline.incrbyfloat(name, spent.get(bucket_key, 0.0))
+            pipeline.expire(name, int(self.ttl))
+        results = pipeline.execute()
+
+        remote = {}
+        for index, bucket_key in enumerate(keys):
+            total = float(results[2 * index])
+            own = spent.get(bucket_key, 0.0)
+            previous = self._seen.get(bucket_key)
+            others = total - own - previous if previous is not None and total - own >= previous else 0.0
+            if others > 0:
+                remote[bucket_key] = others
+            if own or others:
+                self._seen[bucket_key] = total
+            else:
+                # Idle bucket: stop tracking it; its counter expires in Redis on its own
+                self._seen.pop(bucket_key, None)
+        return remote
+
+
+def create_rate_limiter() -> RateLimiter:
+    limits = {
+        "chat": (settings.rate_limit_chat_per_minute / 60.0, settings.rate_limit_chat_burst),
+        "calendar": (settings.rate_limit_calendar_per_minute / 60.0, settings.rate_limit_calendar_burst),
+        "auth": (settings.rate_limit_auth_per_minute / 60.0, settings.rate_limit_auth_burst),
+    }
+    sync = RedisRateLimitSync(settings.session_backend_url) if settings.session_backend_url else None
+    limiter = RateLimiter(limits, sync=sync, sync_interval=settings.rate_limit_sync_interval_s)
+    limiter.enabled = settings.rate_limit_enabled
+    return limiter
+
+
+# Global instance
+rate_limiter = create_rate_limiter()
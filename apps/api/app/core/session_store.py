@@ -0,0 +1,151 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import sys
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from datetime import datetime, timezone
+from typing import Any, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.core.metrics import registry
+from app.models.user import UserSession
+
+logger = logging.getLogger(__name__)
+
+sessions_removed_total = registry.counter(
+    "sessions_removed_total", "Sessions dropped from the session store by the server", ("reason",)
+)
+
+
+def approximate_size(value: Any, _seen: Optional[set] = None) -> int:
+    """Rough deep size in bytes of a session and everything it references."""
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, BaseModel):
+        size += approximate_size(value.__dict__, seen)
+    elif isinstance(value, dict):
+        size += sum(approximate_size(k, seen) + approximate_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(approximate_size(item, seen) for item in value)
+    return size
+
+
+class SessionStore(MutableMapping):
+    """
+    Dict-like store of server-side sessions with bounded size and expiry.
+
+    Sessions are kept in least-recently-used order (``get`` counts as a use)
+    and the oldest one is evicted once ``max_sessions`` is exceeded. A min-heap
+    ordered by ``expires_at`` lets ``sweep`` drop expired sessions in
+    O(k log n) without scanning the store; a background task runs it every
+    ``sweep_interval`` seconds so abandoned sessions do not pile up.
+    """
+
+    def __init__(self, max_sessions: int = 100_000, sweep_interval: float = 60.0):
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval
+        self._sessions: "OrderedDict[str, UserSession]" = OrderedDict()
+        self._expiry: List[Tuple[datetime, int, str]] = []
+        self._counter = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+    def __getitem__(self, session_id: str) -> UserSession:
+        return self._sessions[session_id]
+
+    def __setitem__(self, session_id: str, session: UserSession):
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        heapq.heappush(self._expiry, (session.expires_at, next(self._counter), session_id))
+        while len(self._sessions) > self.max_sessions:
+            evicted, _ = self._sessions.popitem(last=False)
+            sessions_removed_total.labels("capacity").inc()
+            logger.info(f"Session store full, evicted least recently used session {evicted[:8]}")
+        # Overwrites leave stale heap entries behind; rebuild before they outnumber live sessions
+        if len(self._expiry) > 2 * len(self._sessions) + 1024:
+            self._rebuild_expiry()
+
+    def __delitem__(self, session_id: str):
+        del self._sessions[session_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._sessions)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: object) -> bool:
+        return session_id in self._sessions
+
+    def get(self, session_id: str, default: Optional[UserSession] = None) -> Optional[UserSession]:
+        """Look up a session and mark it as recently used."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return default
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def items(self):
+        # Snapshot, so callers may update sessions while iterating
+        return list(self._sessions.items())
+
+    def clear(self):
+        self._sessions.clear()
+        self._expiry.clear()
+
+    def sweep(self, now: Optional[datetime] = None) -> int:
+        """Remove every expired session; returns how many were removed."""
+        now = now or datetime.now(timezone.utc)
+        removed = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            _, _, session_id = heapq.heappop(self._expiry)
+            session = self._sessions.get(session_id)
+            if session is None:
+                continue
+            if session.expires_at > now:
+                # Extended in place (e.g. an access token refresh); track the new expiry
+                heapq.heappush(self._expiry, (session.expires_at, next(self._counter), session_id))
+                continue
+            del self._sessions[session_id]
+            removed += 1
+        if removed:
+            sessions_removed_total.labels("expired").inc(removed)
+            logger.info(f"Swept {removed} expired sessions")
+        return removed
+
+    def memory_per_session(self, sample: int = 64) -> float:
+        """Average approximate size in bytes of the most recently used sessions."""
+        sessions = list(itertools.islice(reversed(self._sessions.values()), sample))
+        if not sessions:
+            return 0.0
+        return sum(approximate_size(session) for session in sessions) / len(sessions)
+
+    def _rebuild_expiry(self):
+        self._expiry = [
+            (session.expires_at, next(self._counter), session_id) for session_id, session in self._sessions.items()
+        ]
+        heapq.heapify(self._expiry)
+
+    def start(self):
+        """Sweep expired sessions in the background."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._sweep_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
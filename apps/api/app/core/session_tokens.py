@@ -0,0 +1,231 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.expiring_store import MemoryExpiringStore
+from app.core.metrics import upstream_errors_total
+
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:  # pragma: no cover - cryptography is optional
+    AESGCM = None
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is optional; without it revocations are per worker
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+SIGNED_PREFIX = "v1."
+ENCRYPTED_PREFIX = "v1e."
+
+MIN_SECRET_LENGTH = 32
+# Former defaults and documentation placeholders; anyone can sign cookies with these
+KNOWN_WEAK_SECRETS = frozenset({
+    "test_secret_key", "a-very-secret-key", "a-very-secret-key-for-local-dev",
+    "your-secret-key", "your-production-secret-key",
+})
+
+
+def check_secret(secret: Optional[str], name: str = "SESSION_SECRET_KEY"):
+    """Raise ValueError unless ``secret`` is usable as a signing or encryption key."""
+    if not secret or secret in KNOWN_WEAK_SECRETS or len(secret) < MIN_SECRET_LENGTH:
+        raise ValueError(
+            f"{name} must be set to a random value of at least {MIN_SECRET_LENGTH} characters "
+            "(e.g. the output of `openssl rand -hex 32`)"
+        )
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class SessionTokenSigner:
+    """
+    Encodes session claims into self-contained cookie values.
+
+    Signed tokens are ``v1.<payload>.<HMAC-SHA256>``, so verifying one costs a
+    single HMAC and needs no session lookup. With ``encrypt`` the claims are
+    sealed with AES-GCM instead (``v1e.<nonce + ciphertext>``), which also
+    authenticates them. Both forms are accepted when decoding, so encryption
+    can be switched on without logging everyone out.
+
+    The secret is the only thing standing between a client and a cookie that
+    names any user, so an unset, placeholder or short secret is refused.
+    """
+
+    def __init__(self, secret: str, encrypt: bool = False):
+        check_secret(secret)
+        if encrypt and AESGCM is None:
+            raise RuntimeError("Encrypted session cookies need the 'cryptography' package")
+        secret_bytes = secret.encode("utf-8")
+        # Separate keys for signing and encryption, both derived from the one configured secret
+        self._mac_key = hmac.new(secret_bytes, b"session-cookie-mac", hashlib.sha256).digest()
+        self._aead = AESGCM(hmac.new(secret_bytes, b"session-cookie-enc", hashlib.sha256).digest()) if AESGCM else None
+        self.encrypt = encrypt
+
+    def encode(self, claims: Dict[str, Any]) -> str:
+        """Serialize ``claims`` (which must include ``exp``, a Unix timestamp) into a token."""
+        payload = json.dumps(claims, separators=(",", ":")).encode("utf-8")
+        if self.encrypt:
+            nonce = os.urandom(12)
+            return ENCRYPTED_PREFIX + _b64encode(nonce + self._aead.encrypt(nonce, payload, None))
+        body = SIGNED_PREFIX + _b64encode(payload)
+        return body + "." + _b64encode(hmac.new(self._mac_key, body.encode("ascii"), hashlib.sha256).digest())
+
+    def decode(self, token: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Verify ``token`` and return its claims, or None if it is forged, malformed or expired."""
+        try:
+            if token.startswith(ENCRYPTED_PREFIX):
+                if self._aead is None:
+                    return None
+                sealed = _b64decode(token[len(ENCRYPTED_PREFIX):])
+                payload = self._aead.decrypt(sealed[:12], sealed[12:], None)
+            elif token.startswith(SIGNED_PREFIX):
+                body, _, signature = token.rpartition(".")
+                expected = hmac.new(self._mac_key, body.encode("ascii"), hashlib.sha256).digest()
+                if not hmac.compare_digest(expected, _b64decode(signature)):
+                    return None
+                payload = _b64decode(body[len(SIGNED_PREFIX):])
+            else:
+                return None
+            claims = json.loads(payload)
+        except Exception:
+            return None
+
+        if not isinstance(claims, dict) or claims.get("exp", 0) <= (time.time() if now is None else now):
+            return None
+        return claims
+
+    @staticmethod
+    def is_token(value: str) -> bool:
+        """Whether ``value`` looks like a token (as opposed to a bare server-side session id)."""
+        return value.startswith(SIGNED_PREFIX) or value.startswith(ENCRYPTED_PREFIX)
+
+
+class RevocationList:
+    """
+    Keys (session ids, secret names) revoked before they would have expired.
+
+    An entry is only needed until the revoked item would have expired anyway,
+    so each one is stored with that as its TTL and the list stays as small as
+    the number of recent revocations. It is checked on every authenticated
+    request, so lookups only ever touch an in-process ``MemoryExpiringStore``.
+
+    With a ``sync`` attached, revocations made here are published and those
+    made by other workers are pulled in every ``sync_interval`` seconds by a
+    background task, the way the rate limiter shares spent tokens; a logout
+    reaches the other workers within that interval.
+    """
+
+    def __init__(self, sync: Optional["RedisRevocationSync"] = None, sync_interval: float = 1.0):
+        self.sync = sync
+        self.sync_interval = sync_interval
+        self._store = MemoryExpiringStore()
+        # Revocations made here and not yet published: (key, expires_at, revoked_at)
+        self._pending: List[Tuple[str, float, float]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def revoke(self, key: str, expires_at: float):
+        now = time.time()
+        if self._add(key, expires_at, now) and self.sync is not None:
+            self._pending.append((key, expires_at, now))
+
+    def is_revoked(self, key: str) -> bool:
+        return self._store.get(key) is not None
+
+    def revoked_at(self, key: str) -> Optional[float]:
+        """When ``key`` was revoked (Unix time), or None if it is not."""
+        return self._store.get(key)
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def _add(self, key: str, expires_at: float, revoked_at: float) -> bool:
+        ttl = expires_at - time.time()
+        if ttl <= 0:
+            return False
+        previous = self._store.get(key)
+        self._store.put(key, revoked_at if previous is None else max(previous, revoked_at), ttl)
+        return True
+
+    def start(self):
+        """Exchange revocations with the other workers in the background (only with a sync backend)."""
+        if self.sync is not None and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._sync_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _sync_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending, self._pending = self._pending, []
+            try:
+                remote = await loop.run_in_executor(None, self.sync.exchange, pending)
+            except Exception as e:
+                logger.warning(f"Revocation sync failed: {str(e)}")
+                upstream_errors_total.labels("revocation_sync", type(e).__name__).inc()
+                # Publish them with the next exchange instead
+                self._pending = pending + self._pending
+            else:
+                for key, expires_at, revoked_at in remote:
+                    self._add(key, expires_at, revoked_at)
+            await asyncio.sleep(self.sync_interval)
+
+
+class RedisRevocationSync:
+    """
+    Shares revocations between workers through a Redis sorted set.
+
+    Each revocation is a member ``<expires_at>:<key>`` scored by the time it
+    was made. A worker adds its own and reads everything scored since its last
+    read (less ``overlap`` seconds, for clock skew between workers and writes
+    that were in flight), so each exchange only returns what is new. Entries
+    older than ``retention`` (the longest an item can stay valid) are trimmed.
+    """
+
+    def __init__(self, url: str, namespace: str, retention: float, overlap: float = 5.0):
+        if redis is None:
+            raise RuntimeError("SESSION_BACKEND_URL points at Redis but the 'redis' package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self.log_key = f"{namespace}:revocations"
+        self.retention = retention
+        self.overlap = overlap
+        self._since = 0.0
+
+    def exchange(self, revoked: List[Tuple[str, float, float]]) -> List[Tuple[str, float, float]]:
+        """Publish this worker's revocations; returns ``(key, expires_at, revoked_at)`` for recent ones."""
+        now = time.time()
+        pipeline = self.client.pipeline(transaction=False)
+        if revoked:
+            pipeline.zadd(self.log_key, {f"{expires_at!r}:{key}": revoked_at for key, expires_at, revoked_at in revoked})
+        pipeline.zrangebyscore(self.log_key, max(0.0, self._since - self.overlap), "+inf", withscores=True)
+        pipeline.zremrangebyscore(self.log_key, "-inf", now - self.retention)
+        entries = pipeline.execute()[-2]
+
+        recent = []
+        for member, revoked_at in entries:
+            if isinstance(member, bytes):
+                member = member.decode("utf-8")
+            expires_at, _, key = member.partition(":")
+            recent.append((key, float(expires_at), revoked_at))
+            self._since = max(self._since, revoked_at)
+        return recent
@@ -0,0 +1,185 @@
+import json
+import logging
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, List, Any, Tuple
+
+from app.core.config import settings
+from app.core.metrics import LabeledHistogram, registry
+
+logger = logging.getLogger(__name__)
+export_logger = logging.getLogger("app.tracing.export")
+
+
+class Span:
+    """A single timed stage within a request trace."""
+
+    __slots__ = ("name", "start", "duration", "attributes")
+
+    def __init__(self, name: str, start: float, duration: float, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.attributes = attributes
+
+
+class RequestTrace:
+    """Spans recorded while serving one request."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = secrets.token_hex(16)
+        self.start = time.perf_counter()
+        self.start_unix_ns = time.time_ns()
+        self.duration: Optional[float] = None
+        self.attributes: Dict[str, Any] = {}
+        self.spans: List[Span] = []
+
+    def add_span(self, name: str, start: float, duration: float, attributes: Optional[Dict[str, Any]] = None):
+        self.spans.append(Span(name, start, duration, attributes))
+
+    def finish(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self.start
+
+    def stage_totals(self) -> List[Tuple[str, float]]:
+        """Total time per stage name, in first-seen order."""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration
+        return list(totals.items())
+
+    def server_timing(self) -> str:
+        """Render the trace as a ``Server-Timing`` header value (milliseconds)."""
+        entries = [f"{name};dur={duration * 1000:.2f}" for name, duration in self.stage_totals()]
+        if self.duration is not None:
+            entries.append(f"total;dur={self.duration * 1000:.2f}")
+        return ", ".join(entries)
+
+    def _unix_ns(self, perf_time: float) -> int:
+        return self.start_unix_ns + int((perf_time - self.start) * 1e9)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Render the trace in OTLP/JSON ``resourceSpans`` form."""
+        root_span_id = secrets.token_hex(8)
+        end = self.start + (self.duration or 0.0)
+
+        def attributes(values: Optional[Dict[str, Any]]):
+            return [{"key": key, "value": {"stringValue": str(value)}} for key, value in (values or {}).items()]
+
+        spans = [{
+            "traceId": self.trace_id,
+            "spanId": root_span_id,
+            "name": self.name,
+            "kind": 2,  # SPAN_KIND_SERVER
+            "startTimeUnixNano": str(self.start_unix_ns),
+            "endTimeUnixNano": str(self._unix_ns(end)),
+            "attributes": attributes(self.attributes),
+        }]
+        for span in self.spans:
+            spans.append({
+                "traceId": self.trace_id,
+                "spanId": secrets.token_hex(8),
+                "parentSpanId": root_span_id,
+                "name": span.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(self._unix_ns(span.start)),
+                "endTimeUnixNano": str(self._unix_ns(span.start + span.duration)),
+                "attributes": attributes(span.attributes),
+            })
+
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": settings.app_name}}]},
+                "scopeSpans": [{"scope": {"name": "app.core.tracing"}, "spans": spans}],
+            }]
+        }
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("current_trace", default=None)
+
+
+class Tracer:
+    """
+    Records stage timings into histograms and, when a request trace is active, into that trace.
+
+    Chat requests are broken into the stages auth, calendar_cache, google_fetch,
+    prompt_build, llm_queue, llm_ttft, llm_generate and client_write.
+    """
+
+    def __init__(self, export: str = "none"):
+        self.export = export
+        self.stage_durations = LabeledHistogram(
+            "chat_stage_duration_seconds",
+            "Time spent in each request pipeline stage",
+            ("stage",)
+        )
+        self._otel_tracer = None
+        if export == "opentelemetry":
+            try:
+                from opentelemetry import trace as otel_trace
+                self._otel_tracer = otel_trace.get_tracer("app.core.tracing")
+            except ImportError:
+                logger.warning("tracing_export is 'opentelemetry' but opentelemetry-api is not installed")
+
+    def current_trace(self) -> Optional[RequestTrace]:
+        return _current_trace.get()
+
+    def start_trace(self, name: str) -> RequestTrace:
+        """Start a trace and make it current for this context."""
+        trace = RequestTrace(name)
+        _current_trace.set(trace)
+        return trace
+
+    def end_trace(self, trace: RequestTrace):
+        """Finish a trace and hand it to the configured exporter."""
+        trace.finish()
+        if self.export == "otlp_json":
+            export_logger.info(json.dumps(trace.to_otlp()))
+        elif self._otel_tracer is not None:
+            self._export_opentelemetry(trace)
+
+    def record(self, name: str, duration: float, start: Optional[float] = None, **attributes):
+        """Record an already-measured stage duration (seconds)."""
+        self.stage_durations.labels(name).observe(duration)
+        trace = _current_trace.get()
+        if trace is not None:
+            if start is None:
+                start = time.perf_counter() - duration
+            trace.add_span(name, start, duration, attributes or None)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time the enclosed block as stage ``name``."""
+        start = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            self.record(name, time.perf_counter() - start, start, **attributes)
+
+    def _export_opentelemetry(self, trace: RequestTrace):
+        from opentelemetry import trace as otel_trace
+
+        root = self._otel_tracer.start_span(
+            trace.name,
+            kind=otel_trace.SpanKind.SERVER,
+            start_time=trace.start_unix_ns,
+            attributes={key: str(value) for key, value in trace.attributes.items()}
+        )
+        context = otel_trace.set_span_in_context(root)
+        for span in trace.spans:
+            child = self._otel_tracer.start_span(
+                span.name,
+                context=context,
+                start_time=trace._unix_ns(span.start),
+                attributes={key: str(value) for key, value in (span.attributes or {}).items()}
+            )
+            child.end(end_time=trace._unix_ns(span.start + span.duration))
+        root.end(end_time=trace._unix_ns(trace.start + trace.duration))
+
+
+# Global instance
+tracer = Tracer(settings.tracing_export)
+registry.register(tracer.stage_durations)
@@ -0,0 +1 @@
+# Local fakes of external services for benchmarks and integration tests
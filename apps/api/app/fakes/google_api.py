@@ -0,0 +1,601 @@
+"""
+Local ASGI fake of the Google OAuth, userinfo, Calendar v3 and Secret Manager v1 endpoints.
+
+Run it next to the API and point the ``google_*`` settings at it so the real
+``requests`` client path is exercised end to end:
+
+    uvicorn app.fakes.google_api:app --port 8081
+
+    GOOGLE_OAUTH_AUTHORIZE_URL=http://localhost:8081/o/oauth2/v2/auth
+    GOOGLE_OAUTH_TOKEN_URL=http://localhost:8081/token
+    GOOGLE_USERINFO_URL=http://localhost:8081/oauth2/v2/userinfo
+    GOOGLE_OAUTH_CERTS_URL=http://localhost:8081/oauth2/v3/certs
+    GOOGLE_CALENDAR_API_BASE_URL=http://localhost:8081/calendar/v3
+    SECRET_MANAGER_API_BASE_URL=http://localhost:8081/secretmanager/v1
+
+The fake is configured through ``FAKE_GOOGLE_*`` environment variables (see
+``FakeGoogleConfig``) and can be reconfigured at runtime via ``/_fake/config``.
+When the ``cryptography`` package is installed, code exchanges also return an
+RS256 ``id_token`` signed with a per-server key published at ``/oauth2/v3/certs``.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import random
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, List, Tuple, Any
+from urllib.parse import urlencode
+
+from fastapi import FastAPI, Request, Query
+from fastapi.responses import JSONResponse, RedirectResponse, Response
+from pydantic_settings import BaseSettings
+
+try:
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding, rsa
+except ImportError:  # pragma: no cover - without it the fake issues no ID tokens
+    rsa = None
+
+logger = logging.getLogger(__name__)
+
+
+class FakeGoogleConfig(BaseSettings):
+    # Synthetic calendar shape
+    events_per_calendar: int = 2000
+    days_span: int = 60
+    seed: int = 0
+
+    # Paging limits (mirrors the real API defaults)
+    default_page_size: int = 250
+    max_page_size: int = 2500
+
+    # Injected latency and failures
+    latency_ms: float = 0.0
+    latency_jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+
+    # OAuth
+    token_expires_in: int = 3600
+    issue_id_tokens: bool = True
+    certs_max_age: int = 3600
+
+    class Config:
+        env_prefix = "FAKE_GOOGLE_"
+
+
+def _b64encode(value: str) -> str:
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip("=")
+
+
+def _b64encode_bytes(value: bytes) -> str:
+    return base64.urlsafe_b64encode(value).decode().rstrip("=")
+
+
+def _b64decode(value: str) -> str:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+
+
+def _rfc3339(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _parse_rfc3339(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00").replace(" ", "+"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def google_error(code: int, message: str, reason: str = "backendError") -> Dict[str, Any]:
+    """Build an error body in the shape returned by Google APIs."""
+    return {
+        "error": {
+            "code": code,
+            "message": message,
+            "errors": [{"domain": "global", "reason": reason, "message": message}]
+        }
+    }
+
+
+class FakeCalendar:
+    """A synthetic calendar with versioned events for sync-token support."""
+
+    def __init__(self, calendar_key: str, event_count: int, days_span: int, seed: int):
+        self.calendar_key = calendar_key
+        self.version = 0
+        # Sync tokens issued before this version are rejected with 410 Gone
+        self.min_sync_version = 0
+        self.events: Dict[str, Dict[str, Any]] = {}
+        # event_id -> (start_ts, end_ts, version)
+        self._index: Dict[str, Tuple[float, float, int]] = {}
+        self._by_start: Optional[List[str]] = None
+        self._rng = random.Random(f"{seed}:{calendar_key}")
+        self._generate(event_count, days_span)
+
+    def _generate(self, event_count: int, days_span: int):
+        anchor = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        created = _rfc3339(anchor - timedelta(days=30))
+        first_slot = -(days_span // 4) * 96
+        last_slot = days_span * 96
+
+        for number in range(event_count):
+            event_id = f"evt{number:06d}"
+            if self._rng.random() < 0.05:
+                day = anchor + timedelta(days=self._rng.randrange(-(days_span // 4), days_span))
+                start = {"date": day.date().isoformat()}
+                end = {"date": (day + timedelta(days=1)).date().isoformat()}
+                start_ts, end_ts = day.timestamp(), (day + timedelta(days=1)).timestamp()
+            else:
+                start_at = anchor + timedelta(minutes=15 * self._rng.randrange(first_slot, last_slot))
+                end_at = start_at + timedelta(minutes=15 * self._rng.randint(1, 8))
+                start = {"dateTime": _rfc3339(start_at), "timeZone": "UTC"}
+                end = {"dateTime": _rfc3339(end_at), "timeZone": "UTC"}
+                start_ts, end_ts = start_at.timestamp(), end_at.timestamp()
+
+            attendees = [
+                {"email": f"attendee{self._rng.randrange(500)}@example.com", "responseStatus": "accepted"}
+                for _ in range(self._rng.randrange(0, 6))
+            ]
+            event = {
+                "kind": "calendar#event",
+                "etag": '"0"',
+                "id": event_id,
+                "status": "confirmed",
+                "summary": f"Synthetic event {number}",
+                "created": created,
+                "updated": created,
+                "start": start,
+                "end": end,
+            }
+            if number % 3 == 0:
+                event["description"] = f"Agenda for synthetic event {number}"
+            if number % 4 == 0:
+                event["location"] = f"Room {number % 40}"
+            if attendees:
+                event["attendees"] = attendees
+
+            self.events[event_id] = event
+            self._index[event_id] = (start_ts, end_ts, 0)
+
+    def mutate(self, count: int = 1, cancel: int = 0) -> List[str]:
+        """Update ``count`` and cancel ``cancel`` random events, bumping the calendar version."""
+        changed = []
+        candidates = [eid for eid, event in self.events.items() if event["status"] != "cancelled"]
+        picks = self._rng.sample(candidates, min(len(candidates), count + cancel))
+        now = _rfc3339(datetime.now(timezone.utc))
+
+        for position, event_id in enumerate(picks):
+            self.version += 1
+            event = self.events[event_id]
+            if position < count:
+                event["summary"] = f"{event['summary'].split(' (rev')[0]} (rev {self.version})"
+            else:
+                event["status"] = "cancelled"
+            event["updated"] = now
+            event["etag"] = f'"{self.version}"'
+            start_ts, end_ts, _ = self._index[event_id]
+            self._index[event_id] = (start_ts, end_ts, self.version)
+            changed.append(event_id)
+
+        return changed
+
+    def invalidate_sync_tokens(self):
+        """Force clients holding older sync tokens to do a full sync."""
+        self.min_sync_version = self.version
+
+    def sorted_by_start(self) -> List[str]:
+        if self._by_start is None:
+            self._by_start = sorted(self._index, key=lambda eid: (self._index[eid][0], eid))
+        return self._by_start
+
+    def window(self, time_min: Optional[datetime], time_max: Optional[datetime], show_deleted: bool) -> List[str]:
+        """Event ids overlapping [time_min, time_max), ordered by start time."""
+        min_ts = time_min.timestamp() if time_min else float("-inf")
+        max_ts = time_max.timestamp() if time_max else float("inf")
+        return [
+            eid for eid in self.sorted_by_start()
+            if self._index[eid][1] > min_ts and self._index[eid][0] < max_ts
+            and (show_deleted or self.events[eid]["status"] != "cancelled")
+        ]
+
+    def changed_since(self, version: int) -> List[str]:
+        """Event ids changed after ``version``, including cancellations."""
+        changed = [eid for eid, (_, _, v) in self._index.items() if v > version]
+        return sorted(changed, key=lambda eid: self._index[eid][2])
+
+
+class FakeGoogleServer:
+    """State shared by the fake endpoints: config, calendars and request stats."""
+
+    def __init__(self, config: Optional[FakeGoogleConfig] = None):
+        self.config = config or FakeGoogleConfig()
+        self.calendars: Dict[str, FakeCalendar] = {}
+        self.secrets: Dict[str, List[str]] = {}  # "projects/<p>/secrets/<id>" -> payload versions (base64)
+        self.stats: Dict[str, int] = {}
+        self._rng = random.Random(self.config.seed)
+        self.signing_key = rsa.generate_private_key(public_exponent=65537, key_size=2048) if rsa else None
+        self.signing_kid = secrets.token_hex(8)
+
+    # Identity helpers
+
+    @staticmethod
+    def user_info_for(user_key: str) -> Dict[str, Any]:
+        digest = hashlib.sha256(user_key.encode()).hexdigest()
+        return {
+            "id": str(int(digest[:15], 16)),
+            "email": f"{user_key}@fake.example.com",
+            "name": f"Fake User {user_key}",
+            "picture": f"https://fake.example.com/avatars/{digest[:8]}.png",
+            "verified_email": True
+        }
+
+    @staticmethod
+    def issue_code(user_key: str) -> str:
+        return f"fake-code.{_b64encode(user_key)}"
+
+    @staticmethod
+    def user_key_from_code(code: str) -> str:
+        if code.startswith("fake-code."):
+            return _b64decode(code.split(".", 1)[1])
+        return code
+
+    @staticmethod
+    def issue_access_token(user_key: str) -> str:
+        return f"fake-access.{_b64encode(user_key)}.{secrets.token_hex(8)}"
+
+    @staticmethod
+    def issue_refresh_token(user_key: str) -> str:
+        return f"fake-refresh.{_b64encode(user_key)}"
+
+    @staticmethod
+    def user_key_from_token(token: str, prefix: str) -> Optional[str]:
+        parts = token.split(".")
+        if len(parts) < 2 or parts[0] != prefix:
+            return None
+        try:
+            return _b64decode(parts[1])
+        except Exception:
+            return None
+
+    def issue_id_token(self, user_key: str, audience: str) -> Optional[str]:
+        """RS256 OpenID Connect ID token for ``user_key``, like Google's (None without cryptography)."""
+        if self.signing_key is None or not self.config.issue_id_tokens:
+            return None
+        info = self.user_info_for(user_key)
+        now = int(datetime.now(timezone.utc).timestamp())
+        header = {"alg": "RS256", "kid": self.signing_kid, "typ": "JWT"}
+        claims = {
+            "iss": "https://accounts.google.com",
+            "aud": audience,
+            "sub": info["id"],
+            "email": info["email"],
+            "email_verified": info["verified_email"],
+            "name": info["name"],
+            "picture": info["picture"],
+            "iat": now,
+            "exp": now + self.config.token_expires_in
+        }
+        signing_input = f"{_b64encode(json.dumps(header))}.{_b64encode(json.dumps(claims))}"
+        signature = self.signing_key.sign(signing_input.encode(), padding.PKCS1v15(), hashes.SHA256())
+        return f"{signing_input}.{_b64encode_bytes(signature)}"
+
+    def jwks(self) -> Dict[str, Any]:
+        if self.signing_key is None:
+            return {"keys": []}
+        numbers = self.signing_key.public_key().public_numbers()
+        return {"keys": [{
+            "kty": "RSA",
+            "alg": "RS256",
+            "use": "sig",
+            "kid": self.signing_kid,
+            "n": _b64encode_bytes(numbers.n.to_bytes((numbers.n.bit_length() + 7) // 8, "big")),
+            "e": _b64encode_bytes(numbers.e.to_bytes((numbers.e.bit_length() + 7) // 8, "big"))
+        }]}
+
+    def user_key_from_request(self, request: Request) -> Optional[str]:
+        header = request.headers.get("authorization", "")
+        if not header.startswith("Bearer "):
+            return None
+        return self.user_key_from_token(header[7:], "fake-access")
+
+    # Calendars
+
+    def calendar_for(self, user_key: str, calendar_id: str) -> FakeCalendar:
+        calendar_key = f"{user_key}/{calendar_id}"
+        calendar = self.calendars.get(calendar_key)
+        if calendar is None:
+            calendar = FakeCalendar(
+                calendar_key,
+                self.config.events_per_calendar,
+                self.config.days_span,
+                self.config.seed
+            )
+            self.calendars[calendar_key] = calendar
+        return calendar
+
+    # Fault injection
+
+    def sample_latency(self) -> float:
+        latency = self.config.latency_ms
+        if self.config.latency_jitter_ms:
+            latency += self._rng.uniform(-self.config.latency_jitter_ms, self.config.latency_jitter_ms)
+        return max(0.0, latency) / 1000.0
+
+    def should_fail(self) -> bool:
+        return self.config.error_rate > 0 and self._rng.random() < self.config.error_rate
+
+    def count(self, name: str):
+        self.stats[name] = self.stats.get(name, 0) + 1
+
+
+def create_app(config: Optional[FakeGoogleConfig] = None) -> FastAPI:
+    """Create a fake Google API application with its own isolated state."""
+    server = FakeGoogleServer(config)
+    fake_app = FastAPI(title="Fake Google APIs")
+    fake_app.state.server = server
+
+    @fake_app.middleware("http")
+    async def inject_faults(request: Request, call_next):
+        if request.url.path.startswith("/_fake"):
+            return await call_next(request)
+
+        delay = server.sample_latency()
+        if delay:
+            await asyncio.sleep(delay)
+
+        if server.should_fail():
+            server.count("injected_errors")
+            status_code = server.config.error_status
+            headers = {"Retry-After": "1"} if status_code in (429, 503) else None
+            return JSONResponse(
+                status_code=status_code,
+                content=google_error(status_code, "Injected fake error"),
+                headers=headers
+            )
+
+        return await call_next(request)
+
+    @fake_app.get("/o/oauth2/v2/auth")
+    async def authorize(
+        redirect_uri: str,
+        state: Optional[str] = None,
+        login_hint: Optional[str] = None
+    ):
+        """Consent screen stand-in: immediately redirects back with a code."""
+        server.count("authorize")
+        params = {"code": server.issue_code(login_hint or "fake-user")}
+        if state is not None:
+            params["state"] = state
+        return RedirectResponse(url=f"{redirect_uri}?{urlencode(params)}", status_code=302)
+
+    @fake_app.post("/token")
+    async def token(request: Request):
+        server.count("token")
+        form = await request.form()
+        grant_type = form.get("grant_type")
+
+        if grant_type == "authorization_code" and form.get("code"):
+            user_key = server.user_key_from_code(form["code"])
+            body = {
+                "access_token": server.issue_access_token(user_key),
+                "refresh_token": server.issue_refresh_token(user_key),
+                "expires_in": server.config.token_expires_in,
+                "token_type": "Bearer",
+                "scope": "openid email profile https://www.googleapis.com/auth/calendar.readonly"
+            }
+            id_token = server.issue_id_token(user_key, form.get("client_id", ""))
+            if id_token:
+                body["id_token"] = id_token
+            return body
+
+        if grant_type == "refresh_token":
+            user_key = server.user_key_from_token(form.get("refresh_token", ""), "fake-refresh")
+            if user_key is not None:
+                return {
+                    "access_token": server.issue_access_token(user_key),
+                    "expires_in": server.config.token_expires_in,
+                    "token_type": "Bearer"
+                }
+
+        return JSONResponse(
+            status_code=400,
+            content={"error": "invalid_grant", "error_description": "Bad Request"}
+        )
+
+    @fake_app.get("/oauth2/v3/certs")
+    async def certs():
+        server.count("certs")
+        return JSONResponse(server.jwks(), headers={"Cache-Control": f"public, max-age={server.config.certs_max_age}"})
+
+    @fake_app.get("/oauth2/v2/userinfo")
+    async def userinfo(request: Request):
+        server.count("userinfo")
+        user_key = server.user_key_from_request(request)
+        if user_key is None:
+            return JSONResponse(status_code=401, content=google_error(401, "Invalid Credentials", "authError"))
+        return server.user_info_for(user_key)
+
+    @fake_app.get("/calendar/v3/calendars/{calendar_id}/events")
+    async def list_events(
+        request: Request,
+        calendar_id: str,
+        timeMin: Optional[str] = None,
+        timeMax: Optional[str] = None,
+        maxResults: Optional[int] = Query(default=None, ge=1),
+        pageToken: Optional[str] = None,
+        syncToken: Optional[str] = None,
+        singleEvents: bool = False,
+        orderBy: Optional[str] = None,
+        showDeleted: bool = False
+    ):
+        server.count("events")
+        user_key = server.user_key_from_request(request)
+        if user_key is None:
+            return JSONResponse(status_code=401, content=google_error(401, "Invalid Credentials", "authError"))
+
+        if orderBy == "startTime" and not singleEvents:
+            return JSONResponse(
+                status_code=400,
+                content=google_error(400, "The requested ordering is not available for the particular query.", "badRequest")
+            )
+        if syncToken and (timeMin or timeMax or orderBy):
+            return JSONResponse(
+                status_code=400,
+                content=google_error(400, "Sync token cannot be used with timeMin, timeMax or orderBy.", "badRequest")
+            )
+
+        calendar = server.calendar_for(user_key, calendar_id)
+
+        page_size = min(maxResults or server.config.default_page_size, server.config.max_page_size)
+        offset, since = 0, None
+        try:
+            if pageToken:
+                page = json.loads(_b64decode(pageToken))
+                offset, since = page["o"], page.get("s")
+            elif syncToken:
+                since = int(_b64decode(syncToken))
+        except Exception:
+            return JSONResponse(status_code=400, content=google_error(400, "Invalid token", "invalid"))
+
+        if since is not None and since < calendar.min_sync_version:
+            return JSONResponse(
+                status_code=410,
+                content=google_error(410, "Sync token is no longer valid, a full sync is required.", "fullSyncRequired")
+            )
+
+        # ETags change whenever the calendar or the query changes
+        query_key = str(sorted(request.query_params.multi_items()))
+        etag = '"' + hashlib.md5(f"{calendar.version}:{query_key}".encode()).hexdigest() + '"'
+        if request.headers.get("if-none-match") == etag:
+            server.count("not_modified")
+            return Response(status_code=304, headers={"ETag": etag})
+
+        if since is not None:
+            event_ids = calendar.changed_since(since)
+        else:
+            event_ids = calendar.window(
+                _parse_rfc3339(timeMin) if timeMin else None,
+                _parse_rfc3339(timeMax) if timeMax else None,
+                showDeleted
+            )
+
+        page_ids = event_ids[offset:offset + page_size]
+        body = {
+            "kind": "calendar#events",
+            "etag": etag,
+            "summary": calendar_id,
+            "updated": _rfc3339(datetime.now(timezone.utc)),
+            "timeZone": "UTC",
+            "accessRole": "owner",
+            "defaultReminders": [],
+            "items": [calendar.events[eid] for eid in page_ids],
+        }
+        if offset + page_size < len(event_ids):
+            body["nextPageToken"] = _b64encode(json.dumps({"o": offset + page_size, "s": since}))
+        else:
+            body["nextSyncToken"] = _b64encode(str(calendar.version))
+
+        return JSONResponse(content=body, headers={"ETag": etag})
+
+    # Secret Manager v1 (secrets live in memory; only the latest version is ever read, destroyed ones are None)
+
+    def has_bearer(request: Request) -> bool:
+        return request.headers.get("authorization", "").startswith("Bearer ")
+
+    @fake_app.post("/secretmanager/v1/projects/{project}/secrets")
+    async def create_secret(project: str, secretId: str, request: Request):
+        server.count("secrets.create")
+        if not has_bearer(request):
+            return JSONResponse(status_code=401, content=google_error(401, "Missing credentials", "authError"))
+        name = f"projects/{project}/secrets/{secretId}"
+        if name in server.secrets:
+            return JSONResponse(status_code=409, content=google_error(409, f"Secret [{name}] already exists", "alreadyExists"))
+        server.secrets[name] = []
+        return {"name": name, "replication": {"automatic": {}}}
+
+    @fake_app.post("/secretmanager/v1/projects/{project}/secrets/{secret_id}:addVersion")
+    async def add_secret_version(project: str, secret_id: str, request: Request):
+        server.count("secrets.addVersion")
+        if not has_bearer(request):
+            return JSONResponse(status_code=401, content=google_error(401, "Missing credentials", "authError"))
+        name = f"projects/{project}/secrets/{secret_id}"
+        if name not in server.secrets:
+            return JSONResponse(status_code=404, content=google_error(404, f"Secret [{name}] not found", "notFound"))
+        body = await request.json()
+        server.secrets[name].append(body["payload"]["data"])
+        return {"name": f"{name}/versions/{len(server.secrets[name])}", "state": "ENABLED"}
+
+    @fake_app.get("/secretmanager/v1/projects/{project}/secrets/{secret_id}/versions/latest:access")
+    async def access_secret_version(project: str, secret_id: str, request: Request):
+        server.count("secrets.access")
+        if not has_bearer(request):
+            return JSONResponse(status_code=401, content=google_error(401, "Missing credentials", "authError"))
+        name = f"projects/{project}/secrets/{secret_id}"
+        versions = server.secrets.get(name)
+        if not versions:
+            return JSONResponse(status_code=404, content=google_error(404, f"Secret [{name}] not found", "notFound"))
+        return {"name": f"{name}/versions/{len(versions)}", "payload": {"data": versions[-1]}}
+
+    @fake_app.post("/secretmanager/v1/projects/{project}/secrets/{secret_id}/versions/{version}:destroy")
+    async def destroy_secret_version(project: str, secret_id: str, version: int, request: Request):
+        server.count("secrets.destroy")
+        if not has_bearer(request):
+            return JSONResponse(status_code=401, content=google_error(401, "Missing credentials", "authError"))
+        name = f"projects/{project}/secrets/{secret_id}"
+        versions = server.secrets.get(name)
+        if not versions or not 1 <= version <= len(versions):
+            return JSONResponse(
+                status_code=404, content=google_error(404, f"Secret version [{name}/versions/{version}] not found", "notFound")
+            )
+        if versions[version - 1] is None:
+            return JSONResponse(
+                status_code=400,
+                content=google_error(400, f"Secret version [{name}/versions/{version}] is already destroyed", "failedPrecondition")
+            )
+        versions[version - 1] = None
+        return {"name": f"{name}/versions/{version}", "state": "DESTROYED"}
+
+    @fake_app.delete("/secretmanager/v1/projects/{project}/secrets/{secret_id}")
+    async def delete_secret(project: str, secret_id: str, request: Request):
+        server.count("secrets.delete")
+        if not has_bearer(request):
+            return JSONResponse(status_code=401, content=google_error(401, "Missing credentials", "authError"))
+        name = f"projects/{project}/secrets/{secret_id}"
+        if server.secrets.pop(name, None) is None:
+            return JSONResponse(status_code=404, content=google_error(404, f"Secret [{name}] not found", "notFound"))
+        return {}
+
+    # Control surface for benchmarks and tests
+
+    @fake_app.get("/_fake/config")
+    async def get_config():
+        return server.config.model_dump()
+
+    @fake_app.put("/_fake/config")
+    async def update_config(changes: Dict[str, Any]):
+        server.config = server.config.model_copy(update=changes)
+        return server.config.model_dump()
+
+    @fake_app.get("/_fake/stats")
+    async def get_stats():
+        return {"requests": dict(server.stats), "calendars": len(server.calendars)}
+
+    @fake_app.post("/_fake/calendars/{user_key}/{calendar_id}/mutate")
+    async def mutate_calendar(user_key: str, calendar_id: str, count: int = 1, cancel: int = 0):
+        calendar = server.calendar_for(user_key, calendar_id)
+        return {"changed": calendar.mutate(count, cancel), "version": calendar.version}
+
+    @fake_app.post("/_fake/calendars/{user_key}/{calendar_id}/invalidate-sync")
+    async def invalidate_sync(user_key: str, calendar_id: str):
+        calendar = server.calendar_for(user_key, calendar_id)
+        calendar.invalidate_sync_tokens()
+        return {"version": calendar.version}
+
+    return fake_app
+
+
+app = create_app()
@@ -1,35 +1,98 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
+from app.api.admin import router as admin_router
 from app.api.auth import router as auth_router
 from app.api.calendar import router as calendar_router
 from app.api.chat import router as chat_router
-from app.core.middleware import auth_middleware
+from app.core.middleware import auth_middleware, load_shed_middleware, rate_limit_middleware, tracing_middleware
 from app.core.middleware import require_auth
+from app.core.config import settings
+from app.core.auth import auth_service, session_store
+from app.core.loop_monitor import loop_monitor
+from app.core.rate_limit import rate_limiter
+from app.core.load_shedding import load_shedder
+from app.core.id_tokens import id_token_verifier
+from app.core.metrics import registry, calendar_cache_requests_total
+from app.services.secret_manager import secret_manager
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop_monitor.start()
+    id_token_verifier.start()
+    session_store.start()
+    auth_service.revoked_sessions.start()
+    secret_manager.deletions.start()
+    rate_limiter.start()
+    yield
+    await rate_limiter.stop()
+    await secret_manager.deletions.stop()
+    await auth_service.revoked_sessions.stop()
+    await session_store.stop()
+    await id_token_verifier.stop()
+    await loop_monitor.stop()
+
 
 app = FastAPI(
     title="Tenex Take Home API",
     description="Backend API for Tenex take home project",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
+
+def _calendar_cache_hit_ratio() -> float:
+    hits = calendar_cache_requests_total.labels("hit").value
+    total = calendar_cache_requests_total.total()
+    return hits / total if total else 0.0
+
+
+# Metrics computed at scrape time
+registry.gauge_callback("session_store_size", "Sessions held in the session store", lambda: len(session_store))
+registry.gauge_callback("session_store_bytes_per_session", "Approximate memory held per server-side session", session_store.memory_per_session)
+if not auth_service.oauth_states.blocking:
+    # Counting a shared store means scanning Redis, which a scrape should not do on the event loop
+    registry.gauge_callback("oauth_states_pending", "OAuth logins started but not yet completed", lambda: len(auth_service.oauth_states))
+registry.gauge_callback("calendar_cache_hit_ratio", "Fraction of calendar cache lookups served from cache", _calendar_cache_hit_ratio)
+registry.gauge_callback("load_shed_load", "Worker load used for shedding (1.0 = a signal at its limit)", load_shedder.load)
+registry.gauge_callback("event_loop_lag_last_seconds", "Most recent event loop lag sample", lambda: loop_monitor.last_lag)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://localhost:3000"],  # Frontend URL
+    allow_origins=settings.cors_origins,  # Frontend URL
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+# Add rate limiting middleware (registered first so auth wraps it and has resolved the user)
+@app.middleware("http")
+async def rate_limit_middleware_wrapper(request: Request, call_next):
+    return await rate_limit_middleware(request, call_next)
+
 # Add authentication middleware
 @app.middleware("http")
 async def auth_middleware_wrapper(request: Request, call_next):
     return await auth_middleware(request, call_next)
 
+# Add load shedding middleware (outside auth, so an overloaded worker refuses work before doing any)
+@app.middleware("http")
+async def load_shed_middleware_wrapper(request: Request, call_next):
+    return await load_shed_middleware(request, call_next)
+
+# Add tracing middleware (registered after auth so it wraps it and can time it)
+@app.middleware("http")
+async def tracing_middleware_wrapper(request: Request, call_next):
+    return await tracing_middleware(request, call_next)
+
 # Include routes
 app.include_router(auth_router, prefix="/api/v1")
 app.include_router(calendar_router)
 app.include_router(chat_router)
+app.include_router(admin_router)
 
 @app.get("/")
 async def root():
@@ -39,6 +102,11 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/api/v1/protected")
 async def protected_route(request: Request, user=Depends(require_auth)):
     """Example protected route"""
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import Optional, List
 from .calendar import CalendarEvent
@@ -8,6 +8,12 @@ class ChatRequest(BaseModel):
     timestamp: datetime
     include_calendar_context: bool = True
     conversation_history: Optional[List['ChatMessage']] = None
+    # Server-side history: with an id, only the new message needs to be sent
+    # (conversation_history is then only used to seed a conversation the server does not know yet)
+    conversation_id: Optional[str] = Field(default=None, min_length=1, max_length=128)
+    # Streaming chunk coalescing overrides (server defaults when omitted; 0 ms disables)
+    stream_coalesce_ms: Optional[float] = Field(default=None, ge=0, le=1000)
+    stream_coalesce_bytes: Optional[int] = Field(default=None, ge=0, le=65536)
 
 class ChatResponse(BaseModel):
     response: str
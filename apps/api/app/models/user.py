@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 from datetime import datetime, timezone
 from typing import Optional
 
@@ -21,6 +21,8 @@ class UserSession(BaseModel):
     created_at: datetime = datetime.now(timezone.utc)
     is_active: bool = True
     user_info: 'GoogleUserInfo' = None
+    # Resolved principal for this session, cached by app.core.auth alongside the user_info it was built from
+    _principal: Optional[tuple] = PrivateAttr(default=None)
 
 
 class GoogleTokens(BaseModel):
@@ -28,6 +30,7 @@ class GoogleTokens(BaseModel):
     refresh_token: str
     expires_in: int
     token_type: str = "Bearer"
+    id_token: Optional[str] = None
 
 
 class GoogleUserInfo(BaseModel):
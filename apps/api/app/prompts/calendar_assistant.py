@@ -6,6 +6,10 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Previous messages included in a chat prompt, and the longest any one of them may be
+HISTORY_WINDOW = 5
+HISTORY_MESSAGE_MAX_CHARS = 2000
+
 
 class PromptBuilder:
     """Builds structured prompts for the LLM with calendar context."""
@@ -52,7 +56,8 @@ class PromptBuilder:
         user_message: str,
         calendar_events: List[CalendarEvent],
         conversation_history: List[ChatMessage] = None,
-        current_time: datetime = None
+        current_time: datetime = None,
+        history_context: str = None
     ) -> str:
         """
         Build a complete prompt with system instructions, calendar context, and user message.
@@ -62,6 +67,7 @@ class PromptBuilder:
             calendar_events: List of calendar events for context
             conversation_history: Previous chat messages for context
             current_time: The current datetime (defaults to now)
+            history_context: Already formatted history; used instead of conversation_history when given
             
         Returns:
             Complete prompt string
@@ -73,7 +79,8 @@ class PromptBuilder:
         calendar_context = self._format_calendar_events(calendar_events, current_time)
         
         # Format conversation history
-        history_context = self._format_conversation_history(conversation_history or [])
+        if not history_context:
+            history_context = self._format_conversation_history(conversation_history or [])
         
         # Build the complete prompt
         prompt = f"""{self.system_prompt}
@@ -145,13 +152,48 @@ class PromptBuilder:
         if not history:
             return "No previous conversation."
         
-        formatted_history = []
-        for msg in history[-5:]:  # Only include last 5 messages to keep prompt manageable
-            timestamp = msg.timestamp.strftime('%I:%M %p')
-            role = "User" if msg.role == "user" else "Assistant"
-            formatted_history.append(f"{timestamp} - {role}: {msg.content}")
+        # Only include the last few messages to keep prompt manageable
+        return "\n".join(
+            self.format_history_message(msg.role, msg.content, msg.timestamp) for msg in history[-HISTORY_WINDOW:]
+        )
+    
+    @staticmethod
+    def format_history_message(role: str, content: str, timestamp: datetime) -> str:
+        """Format one message as a conversation history line, truncating very long messages."""
+        speaker = "User" if role == "user" else "Assistant"
+        if len(content) > HISTORY_MESSAGE_MAX_CHARS:
+            content = content[:HISTORY_MESSAGE_MAX_CHARS] + " [...]"
+        return f"{timestamp.strftime('%I:%M %p')} - {speaker}: {content}"
+    
+    def build_conversation_summary_prompt(self, previous_summary: str, messages: List[str], max_chars: int) -> str:
+        """
+        Build a prompt that folds older conversation messages into a running summary.
+        
+        Args:
+            previous_summary: The summary so far (may be empty)
+            messages: Formatted history lines to add to it
+            max_chars: Length the summary must stay under
+            
+        Returns:
+            Prompt string for conversation summarization
+        """
+        history = "\n".join(messages)
         
-        return "\n".join(formatted_history)
+        return f"""You maintain a running summary of a conversation between a user and their calendar assistant.
+
+=== SUMMARY SO FAR ===
+{previous_summary or "(none)"}
+
+=== NEW MESSAGES ===
+{history}
+
+=== INSTRUCTIONS ===
+Rewrite the summary so it also covers the new messages. Keep facts the assistant may need later:
+events, dates, times, people, decisions and open requests. Drop pleasantries.
+Use plain sentences, under {max_chars} characters in total.
+
+=== UPDATED SUMMARY ===
+"""
     
     def build_calendar_summary_prompt(
         self,
@@ -1,27 +1,35 @@
 import requests
+import asyncio
 import logging
+from collections import OrderedDict
+from functools import partial
 from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Dict
 from app.models.calendar import CalendarEvent
 from app.models.user import GoogleTokens
 from app.core.auth import auth_service, session_store
+from app.core.config import settings
+from app.core.tracing import tracer
+from app.core.metrics import upstream_errors_total
 
 logger = logging.getLogger(__name__)
 
 
 class CalendarService:
-    def __init__(self):
-        self.base_url = "https://www.googleapis.com/calendar/v3"
+    def __init__(self, max_access_tokens: int = 10_000):
+        self.base_url = settings.google_calendar_api_base_url
+        # Access tokens for users whose session lives on another worker: user_id -> (token, expires_at),
+        # least recently used first and capped at max_access_tokens
+        self.access_tokens: "OrderedDict[str, tuple]" = OrderedDict()
+        self.max_access_tokens = max_access_tokens
     
-    def refresh_access_token(self, user_id: str) -> Optional[GoogleTokens]:
+    async def refresh_access_token(self, user_id: str) -> Optional[GoogleTokens]:
         """Refresh access token using stored refresh token"""
-        refresh_token = auth_service.get_refresh_token_securely(user_id)
+        refresh_token = await auth_service.get_refresh_token_securely(user_id)
         if not refresh_token:
             logger.error(f"No refresh token found for user {user_id}")
             return None
         
-        token_url = "https://oauth2.googleapis.com/token"
-        
         data = {
             "client_id": auth_service.client_id,
             "client_secret": auth_service.client_secret,
@@ -30,7 +38,10 @@ class CalendarService:
         }
         
         try:
-            response = requests.post(token_url, data=data)
+            with tracer.span("google_token_refresh"):
+                response = await asyncio.get_running_loop().run_in_executor(
+                    None, partial(requests.post, auth_service.token_url, data=data)
+                )
             response.raise_for_status()
             
             token_data = response.json()
@@ -48,9 +59,10 @@ class CalendarService:
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Error refreshing access token: {e}")
+            upstream_errors_total.labels("google_oauth", type(e).__name__).inc()
             return None
     
-    def get_user_access_token(self, user_id: str) -> Optional[str]:
+    async def get_user_access_token(self, user_id: str) -> Optional[str]:
         """Get valid access token for user, refreshing if necessary"""
         # Check if user has an active session
         session = None
@@ -60,15 +72,15 @@ class CalendarService:
                 break
         
         if not session:
-            logger.error(f"No active session found for user {user_id}")
-            return None
+            # Signed session cookies let any worker serve the user; fall back to the shared refresh token
+            return await self._access_token_without_session(user_id)
         
         # Check if access token is still valid (with 5 minute buffer)
         if session.expires_at > datetime.now(timezone.utc) + timedelta(minutes=5):
             return session.access_token
         
         # Token is expired, refresh it
-        new_tokens = self.refresh_access_token(user_id)
+        new_tokens = await self.refresh_access_token(user_id)
         if not new_tokens:
             return None
         
@@ -84,9 +96,41 @@ class CalendarService:
         
         return new_tokens.access_token
     
-    def fetch_calendar_events(self, user_id: str, days_ahead: int = 7) -> Optional[List[CalendarEvent]]:
+    async def _access_token_without_session(self, user_id: str) -> Optional[str]:
+        cached = self.access_tokens.get(user_id)
+        if cached:
+            if cached[1] > datetime.now(timezone.utc) + timedelta(minutes=5):
+                self.access_tokens.move_to_end(user_id)
+                return cached[0]
+            del self.access_tokens[user_id]
+        
+        new_tokens = await self.refresh_access_token(user_id)
+        if not new_tokens:
+            logger.error(f"No active session or refresh token found for user {user_id}")
+            return None
+        
+        self._remember_access_token(
+            user_id, new_tokens.access_token, datetime.now(timezone.utc) + timedelta(seconds=new_tokens.expires_in)
+        )
+        return new_tokens.access_token
+    
+    def _remember_access_token(self, user_id: str, access_token: str, expires_at: datetime):
+        now = datetime.now(timezone.utc)
+        if expires_at <= now + timedelta(minutes=5):
+            # Would never be served from the cache
+            return
+        self.access_tokens[user_id] = (access_token, expires_at)
+        self.access_tokens.move_to_end(user_id)
+        # Expired tokens of users who stopped calling gather at the least recently used end
+        while self.access_tokens:
+            oldest_user, (_, oldest_expiry) = next(iter(self.access_tokens.items()))
+            if oldest_expiry > now and len(self.access_tokens) <= self.max_access_tokens:
+                break
+            del self.access_tokens[oldest_user]
+    
+    async def fetch_calendar_events(self, user_id: str, days_ahead: int = 7) -> Optional[List[CalendarEvent]]:
         """Fetch calendar events for the specified number of days ahead"""
-        access_token = self.get_user_access_token(user_id)
+        access_token = await self.get_user_access_token(user_id)
         if not access_token:
             logger.error(f"Could not get access token for user {user_id}")
             return None
@@ -115,7 +159,10 @@ class CalendarService:
         }
         
         try:
-            response = requests.get(url, params=params, headers=headers)
+            with tracer.span("google_fetch"):
+                response = await asyncio.get_running_loop().run_in_executor(
+                    None, partial(requests.get, url, params=params, headers=headers)
+                )
             response.raise_for_status()
             
             calendar_data = response.json()
@@ -133,6 +180,7 @@ class CalendarService:
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Error fetching calendar events: {e}")
+            upstream_errors_total.labels("google_calendar", type(e).__name__).inc()
             return None
     
     def _transform_google_event(self, google_event: Dict) -> Optional[CalendarEvent]:
@@ -170,9 +218,9 @@ class CalendarService:
             # Full datetime with timezone
             return datetime.fromisoformat(time_data["dateTime"].replace('Z', '+00:00'))
         elif "date" in time_data:
-            # Date only (all day event)
+            # Date only (all day event), pinned to UTC so it sorts with timed events
             date_str = time_data["date"]
-            return datetime.fromisoformat(date_str)
+            return datetime.fromisoformat(date_str).replace(tzinfo=timezone.utc)
         else:
             return None
 
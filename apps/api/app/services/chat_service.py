@@ -1,11 +1,18 @@
+from contextlib import aclosing
 from datetime import datetime, timezone
 from typing import List, AsyncGenerator
 from app.models.chat import ChatRequest, ChatResponse
 from app.models.calendar import CalendarEvent
 from app.models.user import User
-from app.services.llm_service import LLMService
+from app.services.llm_service import LLMService, FALLBACK_RESPONSES
 from app.services.calendar_service import calendar_service
+from app.services.conversation_store import conversation_store
+from app.services.conversation_summarizer import ConversationSummarizer
 from app.prompts.calendar_assistant import PromptBuilder
+from app.core.config import settings
+from app.core.tracing import tracer
+from app.utils.streaming import SSEFrameEncoder, coalesce_chunks
+from app.core.metrics import calendar_cache_requests_total
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,6 +21,7 @@ class ChatService:
     def __init__(self):
         self.llm_service = LLMService()
         self.prompt_builder = PromptBuilder()
+        self.summarizer = ConversationSummarizer(self.llm_service, settings.conversation_summary_max_chars)
         self.calendar_cache = {}  # Simple cache for calendar data
         self.cache_ttl = 300  # 5 minutes
     
@@ -38,12 +46,7 @@ class ChatService:
                 calendar_events = await self._get_calendar_context(user.id)
             
             # Build prompt with calendar context
-            prompt = self.prompt_builder.build_chat_prompt(
-                user_message=request.message,
-                calendar_events=calendar_events,
-                conversation_history=request.conversation_history,
-                current_time=datetime.now()
-            )
+            prompt = self._build_prompt(request, user, calendar_events)
             
             # Generate response from LLM (non-streaming)
             response_chunks = []
@@ -55,6 +58,7 @@ class ChatService:
                 response_chunks.append(chunk)
             
             response_text = "".join(response_chunks)
+            self._remember(request, user, response_text)
             
             return ChatResponse(
                 response=response_text,
@@ -95,21 +99,15 @@ class ChatService:
                 calendar_events = await self._get_calendar_context(user.id)
             
             # Build prompt with calendar context
-            prompt = self.prompt_builder.build_chat_prompt(
-                user_message=request.message,
-                calendar_events=calendar_events,
-                conversation_history=request.conversation_history,
-                current_time=datetime.now()
-            )
+            prompt = self._build_prompt(request, user, calendar_events)
             
-            # Generate streaming response from LLM
-            async for chunk in self.llm_service.generate_response(
-                prompt=prompt,
-                temperature=0.7,
-                stream=True
-            ):
-                if chunk:
+            # Generate streaming response from LLM, batching tiny chunks
+            parts = []
+            async with aclosing(self._coalesced_response(prompt, request)) as chunks:
+                async for chunk in chunks:
+                    parts.append(chunk)
                     yield chunk
+            self._remember(request, user, "".join(parts))
                 
         except Exception as e:
             logger.error(f"Error processing streaming chat message: {str(e)}")
@@ -119,25 +117,20 @@ class ChatService:
         self, 
         request: ChatRequest, 
         user: User
-    ) -> AsyncGenerator[str, None]:
+    ) -> AsyncGenerator[bytes, None]:
         """
         Process a chat message and return a streaming response.
         
-        This function yields SSE formatted chunks for direct use with StreamingResponse.
+        This function yields SSE formatted frames (bytes) for direct use with StreamingResponse.
         Integrates with LLM and calendar services to provide intelligent responses.
         """
         try:
             # Validate the message
             if not await self.validate_message(request.message):
                 # Yield an error chunk in the correct format
-                error_chunk = {
-                    "id": "error",
-                    "content": "I'm sorry, but your message appears to be invalid.",
-                    "isComplete": True,
-                    "error": "Invalid message"
-                }
-                import json
-                yield f"data: {json.dumps(error_chunk)}\n\n"
+                yield SSEFrameEncoder("error").error(
+                    "Invalid message", content="I'm sorry, but your message appears to be invalid."
+                )
                 return
             
             # Get calendar context if requested
@@ -146,48 +139,73 @@ class ChatService:
                 calendar_events = await self._get_calendar_context(user.id)
             
             # Build prompt with calendar context
-            prompt = self.prompt_builder.build_chat_prompt(
-                user_message=request.message,
-                calendar_events=calendar_events,
-                conversation_history=request.conversation_history,
-                current_time=datetime.now()
-            )
+            prompt = self._build_prompt(request, user, calendar_events)
             
             # Generate streaming response from LLM
-            import json
             chunk_count = 0
-            async for chunk in self.llm_service.generate_response(
-                prompt=prompt,
-                temperature=0.7,
-                stream=True
-            ):
-                if chunk:
-                    streaming_chunk = {
-                        "id": f"chunk-{chunk_count}",
-                        "content": chunk,
-                        "isComplete": False
-                    }
-                    yield f"data: {json.dumps(streaming_chunk)}\n\n"
+            parts = []
+            async with aclosing(self._coalesced_response(prompt, request)) as chunks:
+                async for chunk in chunks:
+                    parts.append(chunk)
+                    yield SSEFrameEncoder.content_frame(f"chunk-{chunk_count}", chunk)
                     chunk_count += 1
+            self._remember(request, user, "".join(parts))
             
             # Send completion signal
-            completion_chunk = {
-                "id": "complete",
-                "content": "",
-                "isComplete": True
-            }
-            yield f"data: {json.dumps(completion_chunk)}\n\n"
+            yield SSEFrameEncoder("complete").complete()
                 
         except Exception as e:
             logger.error(f"Error processing streaming chat message: {str(e)}")
-            import json
-            error_chunk = {
-                "id": "error",
-                "content": "I'm sorry, I'm having trouble processing your message right now.",
-                "isComplete": True,
-                "error": str(e)
-            }
-            yield f"data: {json.dumps(error_chunk)}\n\n"
+            yield SSEFrameEncoder("error").error(
+                str(e), content="I'm sorry, I'm having trouble processing your message right now."
+            )
+    
+    def _build_prompt(self, request: ChatRequest, user: User, calendar_events: List[CalendarEvent]) -> str:
+        """
+        Build the chat prompt.
+        
+        When the request names a conversation, its history (a running summary plus the
+        recent messages, already formatted) comes from the server-side store rather
+        than from ``request.conversation_history``.
+        """
+        with tracer.span("prompt_build"):
+            history_context = None
+            if request.conversation_id:
+                conversation = conversation_store.get_or_create(user.id, request.conversation_id)
+                if not conversation.message_count and request.conversation_history:
+                    # A conversation the server has not seen (or has expired) can be seeded by the client
+                    for msg in request.conversation_history:
+                        conversation.append(self.prompt_builder.format_history_message(msg.role, msg.content, msg.timestamp))
+                    self.summarizer.schedule(conversation)
+                history_context = conversation.history_text()
+            
+            return self.prompt_builder.build_chat_prompt(
+                user_message=request.message,
+                calendar_events=calendar_events,
+                conversation_history=request.conversation_history,
+                current_time=datetime.now(),
+                history_context=history_context
+            )
+    
+    def _remember(self, request: ChatRequest, user: User, reply: str):
+        """Append a completed exchange to the request's server-side conversation, if it has one."""
+        if not request.conversation_id or reply in FALLBACK_RESPONSES:
+            # A failed generation is not part of the conversation; it must not reach later prompts
+            return
+        conversation = conversation_store.get_or_create(user.id, request.conversation_id)
+        conversation.append(self.prompt_builder.format_history_message("user", request.message, request.timestamp))
+        if reply:
+            conversation.append(self.prompt_builder.format_history_message("assistant", reply, datetime.now()))
+        # Older messages are summarized in the background, after this response has gone out
+        self.summarizer.schedule(conversation)
+    
+    def _coalesced_response(self, prompt: str, request: ChatRequest) -> AsyncGenerator[str, None]:
+        """Stream the LLM response through the chunk coalescing stage."""
+        return coalesce_chunks(
+            self.llm_service.generate_response(prompt=prompt, temperature=0.7, stream=True),
+            window_ms=request.stream_coalesce_ms,
+            max_bytes=request.stream_coalesce_bytes
+        )
     
     async def _get_calendar_context(self, user_id: str) -> List[CalendarEvent]:
         """
@@ -197,10 +215,12 @@ class ChatService:
         current_time = datetime.now().timestamp()
         
         # Check cache first
-        if cache_key in self.calendar_cache:
-            cached_data = self.calendar_cache[cache_key]
-            if current_time - cached_data['timestamp'] < self.cache_ttl:
-                return cached_data['events']
+        with tracer.span("calendar_cache") as span:
+            cached_data = self.calendar_cache.get(cache_key)
+            span["hit"] = cached_data is not None and current_time - cached_data['timestamp'] < self.cache_ttl
+        calendar_cache_requests_total.labels("hit" if span["hit"] else "miss").inc()
+        if span["hit"]:
+            return cached_data['events']
         
         # Fetch fresh calendar data
         events = await self._fetch_calendar_data(user_id)
@@ -219,7 +239,7 @@ class ChatService:
         """
         try:
             # Fetch events for the next 7 days
-            events = calendar_service.fetch_calendar_events(user_id, days_ahead=7)
+            events = await calendar_service.fetch_calendar_events(user_id, days_ahead=7)
             if events is None:
                 return []
             
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+from contextlib import aclosing
+from typing import Any, Dict, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect, status
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.core.rate_limit import rate_limiter
+from app.core.load_shedding import load_shedder
+from app.core.tracing import tracer
+from app.models.chat import ChatRequest
+from app.models.user import User
+from app.services.chat_service import ChatService
+from app.utils.streaming import json_bytes
+
+logger = logging.getLogger(__name__)
+
+ws_connections_in_flight = registry.gauge(
+    "ws_connections_in_flight", "Chat WebSocket connections currently open"
+)
+ws_messages_total = registry.counter(
+    "ws_messages_total", "Chat WebSocket responses by outcome", ("outcome",)
+)
+
+
+class ChatSocketSession:
+    """
+    One authenticated chat WebSocket carrying several conversations at once.
+
+    Client messages are JSON objects in text frames (a binary frame closes the
+    socket with 1003):
+
+    - ``{"type": "chat", "id": "<message id>", "request": {<ChatRequest>}}`` starts a response
+    - ``{"type": "cancel", "id": "<message id>"}`` stops it, cancelling the LLM call
+    - ``{"type": "ping"}`` is answered with ``{"type": "pong"}``
+
+    Every server message carries the ``id`` it belongs to: ``chunk`` frames with
+    ``content``, then one of ``complete``, ``cancelled`` or ``error``. Responses
+    run concurrently, each through the same ``ChatService`` streaming pipeline
+    as ``POST /api/chat/stream``.
+    """
+
+    def __init__(self, websocket: WebSocket, user: User, chat_service: ChatService, max_in_flight: int = 8):
+        self.websocket = websocket
+        self.user = user
+        self.chat_service = chat_service
+        self.max_in_flight = max_in_flight
+        self.tasks: Dict[str, asyncio.Task] = {}
+        # Responses interleave on one socket; only one may write a frame at a time
+        self._send_lock = asyncio.Lock()
+
+    async def run(self):
+        """Serve the socket until the client disconnects, then cancel whatever is still running."""
+        ws_connections_in_flight.inc()
+        try:
+            while True:
+                frame = await self.websocket.receive()
+                if frame["type"] == "websocket.disconnect":
+                    return
+                text = frame.get("text")
+                if text is None:
+                    await self.send({"type": "error", "id": None, "error": "Only text frames are supported"})
+                    await self.websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+                    return
+                try:
+                    message = json.loads(text)
+                except ValueError:
+                    await self.send({"type": "error", "id": None, "error": "Messages must be JSON objects"})
+                    continue
+                await self.handle(message)
+        finally:
+            ws_connections_in_flight.dec()
+            tasks = list(self.tasks.values())
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def handle(self, message: Any):
+        """Dispatch one client message."""
+        if not isinstance(message, dict):
+            await self.send({"type": "error", "id": None, "error": "Messages must be JSON objects"})
+            return
+
+        message_type = message.get("type")
+        message_id = message.get("id")
+        if message_type == "ping":
+            await self.send({"type": "pong"})
+        elif message_type == "cancel":
+            task = self.tasks.get(message_id)
+            if task is not None:
+                task.cancel()
+        elif message_type == "chat":
+            await self.start(message_id, message.get("request"))
+        else:
+            await self.send({"type": "error", "id": message_id, "error": f"Unknown message type: {message_type}"})
+
+    async def start(self, message_id: Optional[str], payload: Any):
+        if not isinstance(message_id, str) or not message_id:
+            await self.send({"type": "error", "id": None, "error": "Chat messages need a string id"})
+            return
+        if message_id in self.tasks:
+            await self.send({"type": "error", "id": message_id, "error": "A response with this id is already running"})
+            return
+        if len(self.tasks) >= self.max_in_flight:
+            await self.send({
+                "type": "error", "id": message_id,
+                "error": f"At most {self.max_in_flight} responses can run at once on a connection"
+            })
+            return
+        if load_shedder.should_shed("high"):
+            await self.send({
+                "type": "error", "id": message_id,
+                "error": "Server is overloaded, please retry shortly", "retry_after": 1
+            })
+            return
+        retry_after = rate_limiter.acquire("chat", self.user.id)
+        if retry_after:
+            # Same budget as POST /api/chat/stream, so the socket is no way around it
+            await self.send({
+                "type": "error", "id": message_id,
+                "error": "Rate limit exceeded", "retry_after": retry_after
+            })
+            return
+        try:
+            request = ChatRequest.model_validate(payload)
+        except ValidationError as e:
+            await self.send({"type": "error", "id": message_id, "error": f"Invalid chat request: {str(e)}"})
+            return
+
+        task = asyncio.get_running_loop().create_task(self._respond(message_id, request))
+        self.tasks[message_id] = task
+        task.add_done_callback(lambda _: self.tasks.pop(message_id, None))
+
+    async def _respond(self, message_id: str, request: ChatRequest):
+        trace = tracer.start_trace("WS /api/chat/ws")
+        outcome = "error"
+        try:
+            chunks = self.chat_service.process_message_streaming_plain(request, self.user)
+            async with aclosing(chunks):
+                async for chunk in chunks:
+                    await self.send({"type": "chunk", "id": message_id, "content": chunk})
+            await self.send({"type": "complete", "id": message_id})
+            outcome = "complete"
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            await self._send_quietly({"type": "cancelled", "id": message_id})
+            raise
+        except WebSocketDisconnect:
+            outcome = "disconnected"
+        except Exception as e:
+            logger.error(f"Error streaming WebSocket response {message_id}: {str(e)}")
+            await self._send_quietly({"type": "error", "id": message_id, "error": str(e)})
+        finally:
+            tracer.end_trace(trace)
+            ws_messages_total.labels(outcome).inc()
+
+    async def send(self, message: Dict[str, Any]):
+        async with self._send_lock:
+            await self.websocket.send_text(json_bytes(message).decode("utf-8"))
+
+    async def _send_quietly(self, message: Dict[str, Any]):
+        # The socket may already be gone (that is often why the response ended)
+        try:
+            await asyncio.shield(self.send(message))
+        except Exception:
+            pass
+
+
+async def serve_chat_socket(websocket: WebSocket, user: User, chat_service: ChatService):
+    """Accept ``websocket`` and serve chat messages on it until it closes."""
+    await websocket.accept()
+    await ChatSocketSession(websocket, user, chat_service, settings.ws_max_in_flight).run()
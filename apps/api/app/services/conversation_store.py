@@ -0,0 +1,173 @@
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+conversations_removed_total = registry.counter(
+    "conversations_removed_total", "Conversations dropped from the server-side history store", ("reason",)
+)
+
+
+class Conversation:
+    """
+    Server-side history for one conversation.
+
+    Messages are stored already formatted for the prompt, one fragment per
+    message, so each new message costs one format call instead of the client
+    resending (and the server re-parsing and re-formatting) the whole history.
+
+    Only the newest ``max_messages`` fragments are meant to stay verbatim.
+    Older ones are compacted into ``summary`` in the background (see
+    ``ConversationSummarizer``); until that happens they stay in the history
+    so no context is lost in between.
+    """
+
+    def __init__(self, conversation_id: str, user_id: str, max_messages: int):
+        self.conversation_id = conversation_id
+        self.user_id = user_id
+        self.max_messages = max_messages
+        self.fragments = deque()
+        self.summary = ""
+        self.message_count = 0
+        self.compacting = False
+        self.updated_at = time.monotonic()
+        self.on_update: Optional[Callable[["Conversation"], None]] = None
+        self._history: Optional[str] = None
+
+    def append(self, fragment: str):
+        """Add one pre-formatted message."""
+        self.fragments.append(fragment)
+        self.message_count += 1
+        self.updated_at = time.monotonic()
+        self._history = None
+        if self.on_update is not None:
+            self.on_update(self)
+
+    def needs_compaction(self) -> bool:
+        return len(self.fragments) > self.max_messages
+
+    def compaction_batch(self) -> List[str]:
+        """The oldest fragments beyond the verbatim window."""
+        return [self.fragments[i] for i in range(len(self.fragments) - self.max_messages)]
+
+    def apply_summary(self, summary: str, compacted: int):
+        """Replace the summary and drop the ``compacted`` oldest fragments it now covers."""
+        for _ in range(compacted):
+            self.fragments.popleft()
+        self.summary = summary
+        self._history = None
+
+    def history_text(self) -> str:
+        """The running summary plus the verbatim messages, joined for the prompt ("" when empty)."""
+        if self._history is None:
+            lines = list(self.fragments)
+            if self.summary:
+                lines.insert(0, f"Summary of the earlier conversation: {self.summary}")
+            self._history = "\n".join(lines)
+        return self._history
+
+
+class ConversationStore:
+    """
+    In-memory conversations keyed by owner and conversation id, expired after a TTL of inactivity.
+
+    Conversations are kept in least-recently-updated order, which with a single
+    TTL is also expiry order, so ``sweep`` only looks at the ones that are due.
+    Starting a conversation beyond ``max_per_user`` for its owner, or beyond
+    ``max_conversations`` in total, evicts the least recently updated one.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 3600.0,
+        max_messages: int = 5,
+        max_conversations: int = 100_000,
+        max_per_user: int = 50
+    ):
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.max_conversations = max(1, max_conversations)
+        self.max_per_user = max(1, max_per_user)
+        self.conversations: "OrderedDict[Tuple[str, str], Conversation]" = OrderedDict()
+        self._by_user: Dict[str, "OrderedDict[str, None]"] = {}
+
+    def get(self, user_id: str, conversation_id: str) -> Optional[Conversation]:
+        """Look up a conversation owned by ``user_id``."""
+        conversation = self.conversations.get((user_id, conversation_id))
+        if conversation is not None and self._expired(conversation, time.monotonic()):
+            self._remove((user_id, conversation_id), "expired")
+            return None
+        return conversation
+
+    def get_or_create(self, user_id: str, conversation_id: str) -> Conversation:
+        """Look up a conversation, starting an empty one if it does not exist."""
+        self.sweep()
+        conversation = self.conversations.get((user_id, conversation_id))
+        if conversation is None:
+            while len(self._by_user.get(user_id, ())) >= self.max_per_user:
+                self._remove((user_id, next(iter(self._by_user[user_id]))), "capacity")
+            while len(self.conversations) >= self.max_conversations:
+                self._remove(next(iter(self.conversations)), "capacity")
+            conversation = Conversation(conversation_id, user_id, self.max_messages)
+            conversation.on_update = self._touch
+            self.conversations[(user_id, conversation_id)] = conversation
+            self._by_user.setdefault(user_id, OrderedDict())[conversation_id] = None
+        return conversation
+
+    def delete(self, user_id: str, conversation_id: str) -> bool:
+        return self._remove((user_id, conversation_id)) is not None
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop conversations idle for longer than the TTL; returns how many were removed."""
+        now = time.monotonic() if now is None else now
+        removed = 0
+        while self.conversations:
+            key, conversation = next(iter(self.conversations.items()))
+            if not self._expired(conversation, now):
+                break
+            self._remove(key, "expired")
+            removed += 1
+        return removed
+
+    def _touch(self, conversation: Conversation):
+        key = (conversation.user_id, conversation.conversation_id)
+        if self.conversations.get(key) is not conversation:
+            return
+        self.conversations.move_to_end(key)
+        self._by_user[conversation.user_id].move_to_end(conversation.conversation_id)
+
+    def _remove(self, key: Tuple[str, str], reason: Optional[str] = None) -> Optional[Conversation]:
+        conversation = self.conversations.pop(key, None)
+        if conversation is None:
+            return None
+        conversation.on_update = None
+        user_conversations = self._by_user.get(key[0])
+        if user_conversations is not None:
+            user_conversations.pop(key[1], None)
+            if not user_conversations:
+                del self._by_user[key[0]]
+        if reason is not None:
+            conversations_removed_total.labels(reason).inc()
+        if reason == "capacity":
+            logger.info(f"Conversation store full, evicted least recently updated conversation {key[1]}")
+        return conversation
+
+    def _expired(self, conversation: Conversation, now: float) -> bool:
+        return conversation.updated_at + self.ttl <= now
+
+
+# Global instance
+conversation_store = ConversationStore(
+    settings.conversation_ttl_s, settings.conversation_max_messages, settings.conversation_max_count,
+    settings.conversation_max_per_user
+)
+
+registry.gauge_callback(
+    "conversations_stored", "Conversations held in the server-side history store",
+    lambda: len(conversation_store.conversations)
+)
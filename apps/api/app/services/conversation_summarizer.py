@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import re
+from typing import List, Optional, Set
+
+from app.core.load_shedding import load_shedder
+from app.core.metrics import (
+    registry, upstream_errors_total, llm_prompt_tokens_total, llm_completion_tokens_total, llm_requests_in_flight
+)
+from app.prompts.calendar_assistant import PromptBuilder
+from app.services.conversation_store import Conversation
+from app.services.llm_service import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+conversation_compactions_total = registry.counter(
+    "conversation_compactions_total", "Conversation history compactions by summarization method", ("method",)
+)
+
+# "09:05 AM - User: text" -> ("User", "text")
+_FRAGMENT = re.compile(r"^.*? - (User|Assistant): (.*)$", re.DOTALL)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+class ConversationSummarizer:
+    """
+    Folds older conversation messages into a bounded running summary.
+
+    Compaction is scheduled after a response has been delivered and runs as a
+    background task, so it never adds latency to a request. The LLM writes the
+    summary when available; otherwise (or when it fails, times out or the
+    worker is shedding load) an extractive summary of the first sentence of
+    each message is used.
+    """
+
+    def __init__(self, llm_service=None, max_chars: int = 1500, timeout: float = 20.0):
+        self.llm_service = llm_service
+        self.max_chars = max_chars
+        self.timeout = timeout
+        self.prompt_builder = PromptBuilder()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def schedule(self, conversation: Conversation):
+        """Start compacting ``conversation`` in the background if it has outgrown its window."""
+        if conversation.compacting or not conversation.needs_compaction():
+            return
+        conversation.compacting = True
+        task = asyncio.get_running_loop().create_task(self._compact(conversation))
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def wait_idle(self):
+        """Wait for running compactions to finish."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def _compact(self, conversation: Conversation):
+        try:
+            # Messages may arrive while the summary is being written; keep going until caught up
+            while conversation.needs_compaction():
+                batch = conversation.compaction_batch()
+                summary = await self.summarize(conversation.summary, batch)
+                conversation.apply_summary(summary, len(batch))
+        except Exception as e:
+            logger.error(f"Error compacting conversation {conversation.conversation_id}: {str(e)}")
+        finally:
+            conversation.compacting = False
+
+    async def summarize(self, previous_summary: str, fragments: List[str]) -> str:
+        """Fold ``fragments`` into ``previous_summary``, keeping the result under ``max_chars``."""
+        summary = await self._llm_summary(previous_summary, fragments)
+        if summary:
+            conversation_compactions_total.labels("llm").inc()
+            return summary[:self.max_chars]
+        conversation_compactions_total.labels("extractive").inc()
+        return self.extractive_summary(previous_summary, fragments)
+
+    async def _llm_summary(self, previous_summary: str, fragments: List[str]) -> Optional[str]:
+        backend = getattr(self.llm_service, "backend", None)
+        if backend is None or not backend.is_ready():
+            return None
+        if load_shedder.should_shed("low"):
+            # Summaries are background work; leave the model to interactive requests
+            return None
+
+        prompt = self.prompt_builder.build_conversation_summary_prompt(previous_summary, fragments, self.max_chars)
+        generation_config = {"temperature": 0.2, "max_output_tokens": self.max_chars // 4}
+        llm_prompt_tokens_total.inc(estimate_tokens(prompt))
+        llm_requests_in_flight.inc()
+        try:
+            summary = await asyncio.wait_for(backend.generate(prompt, generation_config), timeout=self.timeout)
+        except Exception as e:
+            logger.warning(f"LLM conversation summary failed, using extractive summary: {str(e)}")
+            upstream_errors_total.labels("llm", type(e).__name__).inc()
+            return None
+        finally:
+            llm_requests_in_flight.dec()
+        llm_completion_tokens_total.inc(estimate_tokens(summary))
+        return summary.strip() or None
+
+    def extractive_summary(self, previous_summary: str, fragments: List[str]) -> str:
+        """Previous summary plus the first sentence of each message, trimmed from the oldest end."""
+        lines = [previous_summary] if previous_summary else []
+        for fragment in fragments:
+            match = _FRAGMENT.match(fragment)
+            speaker, text = match.groups() if match else ("", fragment)
+            sentence = _SENTENCE_END.split(text.strip(), 1)[0][:200]
+            lines.append(f"{speaker}: {sentence}" if speaker else sentence)
+
+        summary = "\n".join(lines)
+        if len(summary) > self.max_chars:
+            summary = summary[-self.max_chars:]
+            # Do not start mid-line
+            newline = summary.find("\n")
+            if 0 <= newline < len(summary) - 1:
+                summary = summary[newline + 1:]
+        return summary
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import math
+import random
+import re
+from typing import AsyncGenerator, Dict, Any, List, Optional
+
+from app.services.llm_service import LLMBackend
+
+logger = logging.getLogger(__name__)
+
+
+# Calendar-flavoured vocabulary so fake responses have a realistic size and shape
+_VOCABULARY = [
+    "you", "have", "a", "meeting", "with", "the", "team", "at", "10:00", "AM",
+    "tomorrow", "your", "calendar", "is", "free", "between", "and", "after",
+    "lunch", "there", "are", "three", "events", "scheduled", "for", "today",
+    "standup", "review", "planning", "sync", "call", "conflict", "on", "Friday",
+    "I", "would", "suggest", "moving", "the", "one-on-one", "to", "later",
+    "in", "afternoon", "no", "other", "appointments", "this", "week",
+]
+
+
+class FakeLLMError(RuntimeError):
+    """Raised by the fake backend when an upstream failure is injected."""
+
+
+class FakeLLMBackend(LLMBackend):
+    """
+    Deterministic, offline stand-in for Gemini used for load testing.
+
+    The same prompt always produces the same text. Latencies are drawn from
+    log-normal distributions around the configured medians, and errors and
+    timeouts are injected at the configured rates from a seeded RNG, so a
+    benchmark run is reproducible for a given seed.
+    """
+
+    name = "fake"
+    model_name = "fake-llm"
+
+    def __init__(
+        self,
+        ttft_ms: float = 350.0,
+        inter_token_ms: float = 25.0,
+        latency_sigma: float = 0.35,
+        response_tokens: int = 80,
+        chunk_tokens: int = 1,
+        response_text: Optional[str] = None,
+        error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        timeout_after_s: float = 30.0,
+        seed: int = 0
+    ):
+        self.ttft_ms = ttft_ms
+        self.inter_token_ms = inter_token_ms
+        self.latency_sigma = latency_sigma
+        self.response_tokens = response_tokens
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.response_text = response_text
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_after_s = timeout_after_s
+        self.seed = seed
+        self._rng = random.Random(seed)
+
+    @classmethod
+    def from_settings(cls, config) -> "FakeLLMBackend":
+        """Build a fake backend from the ``fake_llm_*`` settings."""
+        return cls(
+            ttft_ms=config.fake_llm_ttft_ms,
+            inter_token_ms=config.fake_llm_inter_token_ms,
+            latency_sigma=config.fake_llm_latency_sigma,
+            response_tokens=config.fake_llm_response_tokens,
+            chunk_tokens=config.fake_llm_chunk_tokens,
+            response_text=config.fake_llm_response_text,
+            error_rate=config.fake_llm_error_rate,
+            timeout_rate=config.fake_llm_timeout_rate,
+            timeout_after_s=config.fake_llm_timeout_after_s,
+            seed=config.fake_llm_seed
+        )
+
+    def is_ready(self) -> bool:
+        return True
+
+    def _sample_delay(self, median_ms: float) -> float:
+        """Sample a delay in seconds from a log-normal distribution around median_ms."""
+        if median_ms <= 0:
+            return 0.0
+        if self.latency_sigma <= 0:
+            return median_ms / 1000.0
+        return self._rng.lognormvariate(math.log(median_ms / 1000.0), self.latency_sigma)
+
+    def _pick_fault(self) -> Optional[str]:
+        """Decide whether this call should fail, and how."""
+        roll = self._rng.random()
+        if roll < self.timeout_rate:
+            return "timeout"
+        if roll < self.timeout_rate + self.error_rate:
+            return "error"
+        return None
+
+    def _tokens_for(self, prompt: str, generation_config: Dict[str, Any]) -> List[str]:
+        """Build the token list for a prompt; identical prompts give identical tokens."""
+        if self.response_text is not None:
+            tokens = re.findall(r"\S+\s*", self.response_text)
+        else:
+            prompt_rng = random.Random(f"{self.seed}:{prompt}")
+            words = [prompt_rng.choice(_VOCABULARY) for _ in range(self.response_tokens)]
+            if words:
+                words[0] = words[0][:1].upper() + words[0][1:]
+                words[-1] += "."
+            tokens = [word + " " for word in words[:-1]] + words[-1:]
+
+        max_tokens = generation_config.get("max_output_tokens")
+        if max_tokens:
+            tokens = tokens[:max_tokens]
+        return tokens
+
+    def _chunks_for(self, prompt: str, generation_config: Dict[str, Any]) -> List[str]:
+        tokens = self._tokens_for(prompt, generation_config)
+        return [
+            "".join(tokens[i:i + self.chunk_tokens])
+            for i in range(0, len(tokens), self.chunk_tokens)
+        ]
+
+    async def _simulate_timeout(self):
+        await asyncio.sleep(self.timeout_after_s)
+        raise asyncio.TimeoutError()
+
+    async def generate(self, prompt: str, generation_config: Dict[str, Any]) -> str:
+        fault = self._pick_fault()
+        chunks = self._chunks_for(prompt, generation_config)
+
+        if fault == "timeout":
+            await self._simulate_timeout()
+
+        delay = self._sample_delay(self.ttft_ms)
+        delay += sum(self._sample_delay(self.inter_token_ms) for _ in chunks[1:])
+        await asyncio.sleep(delay)
+
+        if fault == "error":
+            raise FakeLLMError("Injected fake LLM error")
+        return "".join(chunks)
+
+    async def stream(self, prompt: str, generation_config: Dict[str, Any]) -> AsyncGenerator[str, None]:
+        fault = self._pick_fault()
+        chunks = self._chunks_for(prompt, generation_config)
+        # An injected error fires before chunk ``fail_at``; 0 means before the first token
+        fail_at = self._rng.randrange(len(chunks) or 1) if fault == "error" else None
+
+        await asyncio.sleep(self._sample_delay(self.ttft_ms))
+        if fault == "timeout":
+            await self._simulate_timeout()
+
+        for index, chunk in enumerate(chunks):
+            if index:
+                await asyncio.sleep(self._sample_delay(self.inter_token_ms))
+            if index == fail_at:
+                raise FakeLLMError("Injected fake LLM error")
+            yield chunk
+
+        if fail_at is not None and not chunks:
+            raise FakeLLMError("Injected fake LLM error")
@@ -1,9 +1,20 @@
 import google.generativeai as genai
-from typing import Optional, AsyncGenerator, Dict, Any
+from typing import Optional, AsyncGenerator, Dict, Any, Tuple
+from contextlib import aclosing
+from functools import partial
 import os
 from dotenv import load_dotenv
 import logging
 import asyncio
+import time
+from abc import ABC, abstractmethod
+
+from app.core.config import settings
+from app.core.tracing import tracer
+from app.core.metrics import (
+    llm_prompt_tokens_total, llm_completion_tokens_total, upstream_errors_total,
+    llm_streams_cancelled_total, llm_cancelled_tokens_saved_total, llm_requests_in_flight
+)
 
 # Load environment variables
 load_dotenv()
@@ -11,28 +22,174 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 
+def _sdk_version() -> Tuple[int, ...]:
+    try:
+        return tuple(int(part) for part in genai.__version__.split(".")[:2])
+    except (AttributeError, ValueError):
+        return ()
+
+
+# The SDK has no public way to cancel a stream; up to 0.8 GenerateContentResponse keeps
+# the gRPC call in ``_iterator``, so only reach for it on versions known to have it
+_CANCEL_PRIVATE_ITERATOR = (0, 0) < _sdk_version() <= (0, 8)
+
+
+# Yielded in place of a response when every attempt failed before producing any output
+TIMEOUT_RESPONSE = "I'm sorry, but I'm experiencing a delay in my response. Please try again."
+ERROR_RESPONSE = "I'm sorry, but I'm having trouble generating a response right now. Please try again later."
+FALLBACK_RESPONSES = (TIMEOUT_RESPONSE, ERROR_RESPONSE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token) for usage metrics."""
+    return (len(text) + 3) // 4
+
+
+class LLMBackend(ABC):
+    """Interface for the LLM providers that LLMService can talk to."""
+
+    name = "base"
+    model_name = "unknown"
+
+    @abstractmethod
+    def is_ready(self) -> bool:
+        """Return True when the backend can serve requests."""
+
+    @abstractmethod
+    async def generate(self, prompt: str, generation_config: Dict[str, Any]) -> str:
+        """Generate a complete (non-streaming) response."""
+
+    @abstractmethod
+    def stream(self, prompt: str, generation_config: Dict[str, Any]) -> AsyncGenerator[str, None]:
+        """Stream response chunks as they are produced."""
+
+    def validate(self) -> bool:
+        """Check that the backend is able to answer a trivial request."""
+        return self.is_ready()
+
+
+class GeminiBackend(LLMBackend):
+    """LLM backend backed by the Google Gemini API."""
+
+    name = "gemini"
+    model_name = "gemini-2.5-flash-lite"
+
+    def __init__(self, api_key: Optional[str]):
+        if not api_key:
+            raise ValueError("GOOGLE_GEMINI_API_KEY not configured")
+
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(self.model_name)
+
+    def is_ready(self) -> bool:
+        return self.model is not None
+
+    async def generate(self, prompt: str, generation_config: Dict[str, Any]) -> str:
+        submitted_at = time.perf_counter()
+        started_at = []
+
+        def call():
+            started_at.append(time.perf_counter())
+            return self.model.generate_content(prompt, generation_config=generation_config)
+
+        response = await asyncio.get_event_loop().run_in_executor(None, call)
+        # Time spent waiting for a free executor thread before the request went out
+        tracer.record("llm_queue", started_at[0] - submitted_at, submitted_at)
+        return response.text
+
+    async def stream(self, prompt: str, generation_config: Dict[str, Any]) -> AsyncGenerator[str, None]:
+        loop = asyncio.get_running_loop()
+        # The SDK stream is a blocking iterator; drive it from the executor so the event loop
+        # stays free and an abandoned stream can be cancelled between chunks
+        response = await loop.run_in_executor(
+            None, partial(self.model.generate_content, prompt, generation_config=generation_config, stream=True)
+        )
+        chunks = iter(response)
+        finished = False
+        try:
+            # Process the streaming response and yield chunks as they arrive
+            while True:
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    finished = True
+                    break
+                if hasattr(chunk, 'text') and chunk.text:
+                    yield chunk.text
+                elif hasattr(chunk, 'parts'):
+                    for part in chunk.parts:
+                        if hasattr(part, 'text') and part.text:
+                            yield part.text
+        finally:
+            if not finished:
+                self._cancel_upstream(response, chunks)
+
+    @staticmethod
+    def _cancel_upstream(response, chunks):
+        """
+        Stop the underlying gRPC stream so the provider stops generating.
+
+        Closing the response iterator lets go of the call, and gRPC cancels a
+        call that is released before it completes; on SDK versions where the
+        call is known to live in ``response._iterator`` it is cancelled directly.
+        """
+        close = getattr(chunks, "close", None)
+        if callable(close):
+            try:
+                close()
+            except ValueError:
+                # An executor thread is still inside next(); the call is released when it returns
+                pass
+        if not _CANCEL_PRIVATE_ITERATOR:
+            return
+        cancel = getattr(getattr(response, "_iterator", None), "cancel", None)
+        if callable(cancel):
+            try:
+                cancel()
+            except Exception as e:
+                logger.debug(f"Failed to cancel upstream stream: {str(e)}")
+
+    def validate(self) -> bool:
+        # Try a simple test call
+        self.model.generate_content("test", generation_config={"max_output_tokens": 1})
+        return True
+
+
 class LLMService:
-    """Service for interacting with Google Gemini LLM."""
+    """Service for interacting with the configured LLM backend (Gemini by default)."""
     
-    def __init__(self):
+    def __init__(self, backend: Optional[LLMBackend] = None):
         self.api_key = os.getenv('GOOGLE_GEMINI_API_KEY')
-        self.model = None
+        self.backend = backend
         self.max_retries = 3
         self.timeout = 30.0  # seconds
-        self._initialize_client()
+        # Moving average of completed response sizes, used to estimate tokens saved by cancellation
+        self.average_completion_tokens = 0.0
+        if self.backend is None:
+            self._initialize_client()
     
     def _initialize_client(self):
-        """Initialize the Gemini client with proper configuration."""
+        """Initialize the LLM backend selected by ``settings.llm_backend``."""
         try:
-            if not self.api_key:
-                raise ValueError("GOOGLE_GEMINI_API_KEY not configured")
-            
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-2.5-flash-lite')
-            logger.info("Gemini client initialized successfully")
+            if settings.llm_backend == "fake":
+                from app.services.fake_llm import FakeLLMBackend
+                self.backend = FakeLLMBackend.from_settings(settings)
+            elif settings.llm_backend == "gemini":
+                self.backend = GeminiBackend(self.api_key)
+            else:
+                raise ValueError(f"Unknown LLM backend: {settings.llm_backend}")
+            logger.info(f"{self.backend.name} LLM backend initialized successfully")
         except Exception as e:
-            logger.error(f"Failed to initialize Gemini client: {str(e)}")
+            logger.error(f"Failed to initialize LLM backend: {str(e)}")
             raise
+            
+    @property
+    def model(self):
+        """The underlying provider model, if the backend exposes one."""
+        return getattr(self.backend, "model", None)
+
+    @model.setter
+    def model(self, value):
+        self.backend.model = value
     
     async def generate_response(
         self,
@@ -52,8 +209,11 @@ class LLMService:
             
         Returns:
             AsyncGenerator yielding response chunks if streaming, otherwise full response
+            
+        Failures are retried (and end in an apology message) only until the first
+        chunk has been yielded; after that the error is raised to end the stream.
         """
-        if not self.model:
+        if not self.backend or not self.backend.is_ready():
             raise RuntimeError("LLM service not initialized")
         
         generation_config = {
@@ -65,65 +225,103 @@ class LLMService:
         if max_tokens:
             generation_config["max_output_tokens"] = max_tokens
         
-        for attempt in range(self.max_retries):
-            try:
-                if stream:
-                    async for chunk in self._stream_response(prompt, generation_config):
-                        yield chunk
-                else:
-                    response = await asyncio.wait_for(
-                        asyncio.get_event_loop().run_in_executor(
-                            None,
-                            lambda: self.model.generate_content(prompt, generation_config=generation_config)
-                        ),
-                        timeout=self.timeout
-                    )
-                    yield response.text
+        # Counted for load shedding: requests waiting on or talking to the model
+        llm_requests_in_flight.inc()
+        try:
+            for attempt in range(self.max_retries):
+                started_at = time.perf_counter()
+                llm_prompt_tokens_total.inc(estimate_tokens(prompt))
+                try:
+                    if stream:
+                        first_chunk = True
+                        completion_tokens = 0
+                        try:
+                            async with aclosing(self._stream_response(prompt, generation_config)) as chunks:
+                                async for chunk in chunks:
+                                    if first_chunk:
+                                        tracer.record("llm_ttft", time.perf_counter() - started_at, started_at)
+                                        first_chunk = False
+                                    tokens = estimate_tokens(chunk)
+                                    completion_tokens += tokens
+                                    llm_completion_tokens_total.inc(tokens)
+                                    yield chunk
+                        except (GeneratorExit, asyncio.CancelledError):
+                            self._record_cancelled(completion_tokens, max_tokens)
+                            raise
+                        self._record_completed(completion_tokens)
+                    else:
+                        response_text = await asyncio.wait_for(
+                            self.backend.generate(prompt, generation_config),
+                            timeout=self.timeout
+                        )
+                        llm_completion_tokens_total.inc(estimate_tokens(response_text))
+                        yield response_text
                 
-                return
+                    tracer.record("llm_generate", time.perf_counter() - started_at, started_at, attempt=attempt + 1)
                 
-            except asyncio.TimeoutError:
-                logger.warning(f"Timeout on attempt {attempt + 1}/{self.max_retries}")
-                if attempt == self.max_retries - 1:
-                    yield "I'm sorry, but I'm experiencing a delay in my response. Please try again."
-                await asyncio.sleep(1 * (attempt + 1))  # Exponential backoff
+                    return
                 
-            except Exception as e:
-                logger.error(f"Error generating response (attempt {attempt + 1}/{self.max_retries}): {str(e)}")
-                if attempt == self.max_retries - 1:
-                    yield "I'm sorry, but I'm having trouble generating a response right now. Please try again later."
-                await asyncio.sleep(1 * (attempt + 1))
+                except asyncio.TimeoutError:
+                    logger.warning(f"Timeout on attempt {attempt + 1}/{self.max_retries}")
+                    upstream_errors_total.labels("llm", "TimeoutError").inc()
+                    if stream and not first_chunk:
+                        # The client already has part of the response; retrying would send it again
+                        raise
+                    if attempt == self.max_retries - 1:
+                        yield TIMEOUT_RESPONSE
+                    await asyncio.sleep(1 * (attempt + 1))  # Exponential backoff
+                
+                except Exception as e:
+                    logger.error(f"Error generating response (attempt {attempt + 1}/{self.max_retries}): {str(e)}")
+                    upstream_errors_total.labels("llm", type(e).__name__).inc()
+                    if stream and not first_chunk:
+                        raise
+                    if attempt == self.max_retries - 1:
+                        yield ERROR_RESPONSE
+                    await asyncio.sleep(1 * (attempt + 1))
+        finally:
+            llm_requests_in_flight.dec()
     
     async def _stream_response(self, prompt: str, generation_config: Dict[str, Any]) -> AsyncGenerator[str, None]:
-        """Stream response from Gemini model."""
+        """
+        Stream response from the LLM backend.
+        
+        Closing this generator (the client went away) closes the backend stream right
+        away, which cancels the upstream request instead of draining it.
+        """
         try:
-            # Create the streaming response
-            response = self.model.generate_content(prompt, generation_config=generation_config, stream=True)
-            
-            # Process the streaming response and yield chunks as they arrive
-            for chunk in response:
-                if hasattr(chunk, 'text') and chunk.text:
-                    yield chunk.text
-                elif hasattr(chunk, 'parts'):
-                    for part in chunk.parts:
-                        if hasattr(part, 'text') and part.text:
-                            yield part.text
+            async with aclosing(self.backend.stream(prompt, generation_config)) as chunks:
+                async for chunk in chunks:
+                    yield chunk
                             
         except asyncio.TimeoutError:
             raise
+        except (GeneratorExit, asyncio.CancelledError):
+            logger.info("LLM stream cancelled before completion")
+            raise
         except Exception as e:
             logger.error(f"Error in streaming response: {str(e)}")
             raise
     
+    def _record_completed(self, completion_tokens: int):
+        self.average_completion_tokens += 0.1 * (completion_tokens - self.average_completion_tokens)
+    
+    def _record_cancelled(self, completion_tokens: int, max_tokens: Optional[int]):
+        expected = self.average_completion_tokens
+        if max_tokens:
+            expected = min(expected, max_tokens) if expected else max_tokens
+        llm_streams_cancelled_total.inc()
+        llm_cancelled_tokens_saved_total.inc(max(0.0, expected - completion_tokens))
+
     def validate_api_key(self) -> bool:
-        """Validate that the API key is properly configured."""
+        """Validate that the backend is properly configured."""
         try:
-            if not self.api_key:
+            if self.backend is None:
+                return False
+            if isinstance(self.backend, GeminiBackend) and not self.api_key:
                 return False
             
-            # Try a simple test call
-            self.model.generate_content("test", generation_config={"max_output_tokens": 1})
-            return True
+            return self.backend.validate()
         except Exception as e:
             logger.error(f"API key validation failed: {str(e)}")
             return False
@@ -131,7 +329,8 @@ class LLMService:
     def get_model_info(self) -> Dict[str, Any]:
         """Get information about the configured model."""
         return {
-            "model_name": "gemini-2.5-flash-lite",
+            "backend": self.backend.name if self.backend else None,
+            "model_name": self.backend.model_name if self.backend else None,
             "api_key_configured": bool(self.api_key),
             "max_retries": self.max_retries,
             "timeout": self.timeout
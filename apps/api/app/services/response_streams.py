@@ -0,0 +1,332 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from collections import deque
+from typing import AsyncIterator, AsyncGenerator, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import registry, sse_slow_readers_dropped_total
+from app.core.tracing import tracer
+from app.utils.streaming import SSEFrameEncoder
+
+logger = logging.getLogger(__name__)
+
+sse_replay_buffers_removed_total = registry.counter(
+    "sse_replay_buffers_removed_total", "Response streams dropped from the replay store", ("reason",)
+)
+
+
+class ResponseStream:
+    """
+    Replay buffer for one streamed chat response.
+
+    Generation runs in its own task and appends SSE frames here, each tagged
+    with a sequential ``id: <response_id>:<seq>`` line. Any number of readers
+    (the original request and later reconnects) follow the buffer from a given
+    sequence number, so a dropped connection can resume without regenerating.
+    The buffer keeps at most ``max_bytes`` of frames, dropping the oldest.
+    A reader more than ``write_buffer_max_bytes`` behind the newest frame is
+    disconnected rather than left to hold a slow connection open; it can
+    resume from its last event id while that is still buffered.
+
+    When the last reader disconnects and nobody reconnects within
+    ``abandon_grace`` seconds, generation is cancelled so the upstream LLM
+    call stops instead of running to completion for no one.
+
+    ``expires_at`` is ``max_lifetime`` after creation while generating (never,
+    if that is 0) and ``ttl`` after the end once finished.
+    """
+
+    def __init__(
+        self,
+        response_id: str,
+        user_id: str,
+        max_bytes: int,
+        ttl: float,
+        abandon_grace: float = 10.0,
+        write_buffer_max_bytes: int = 0,
+        max_lifetime: float = 0.0
+    ):
+        self.response_id = response_id
+        self.user_id = user_id
+        self.max_bytes = max_bytes
+        self.write_buffer_max_bytes = write_buffer_max_bytes
+        self.ttl = ttl
+        self.abandon_grace = abandon_grace
+        self.subscribers = 0
+        self._abandon_handle: Optional[asyncio.TimerHandle] = None
+        self.frames = deque()
+        self._end_offsets = deque()  # Total bytes appended up to and including each buffered frame
+        self.total_bytes = 0
+        self.first_seq = 1
+        self.next_seq = 1
+        self.buffered_bytes = 0
+        self.done = False
+        self.expires_at = time.monotonic() + max_lifetime if max_lifetime > 0 else math.inf
+        self.on_finish: Optional[Callable[["ResponseStream"], None]] = None
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._cancel_reason = "Response cancelled after the client disconnected"
+
+    def start(self, source: AsyncIterator[bytes]):
+        """Consume ``source`` in a background task, buffering each frame."""
+        self._task = asyncio.get_running_loop().create_task(self._produce(source))
+        self._task.add_done_callback(self._produced)
+
+    async def _produce(self, source: AsyncIterator[bytes]):
+        try:
+            async for frame in source:
+                self.append(frame)
+        except asyncio.CancelledError:
+            # Leave a terminal frame so a late reconnect does not wait for a completion that never comes
+            self.append(SSEFrameEncoder(self.response_id).error(self._cancel_reason))
+            raise
+        except Exception as e:
+            logger.error(f"Response stream {self.response_id} failed: {str(e)}")
+        finally:
+            self.finish()
+
+    def _produced(self, task: asyncio.Task):
+        # A task cancelled before its first step never runs _produce's cleanup
+        if not self.done:
+            self.append(SSEFrameEncoder(self.response_id).error(self._cancel_reason))
+            self.finish()
+
+    def cancel(self, reason: Optional[str] = None):
+        """Stop generation; closing the source cancels the upstream LLM call."""
+        if self._task is not None and not self._task.done():
+            if reason:
+                self._cancel_reason = reason
+            self._task.cancel()
+
+    def _reader_left(self):
+        if self.subscribers or self.done:
+            return
+        if self.abandon_grace <= 0:
+            self._abandon()
+        else:
+            self._abandon_handle = asyncio.get_running_loop().call_later(self.abandon_grace, self._abandon)
+
+    def _abandon(self):
+        self._abandon_handle = None
+        if not self.subscribers and not self.done:
+            logger.info(f"Cancelling response stream {self.response_id}: no reader reconnected")
+            self.cancel()
+
+    def append(self, frame: bytes):
+        seq = self.next_seq
+        frame = f"id: {self.response_id}:{seq}\n".encode() + frame
+        self.frames.append(frame)
+        self.total_bytes += len(frame)
+        self._end_offsets.append(self.total_bytes)
+        self.next_seq += 1
+        self.buffered_bytes += len(frame)
+        # Always keep the newest frame, even if it alone exceeds the budget
+        while self.buffered_bytes > self.max_bytes and len(self.frames) > 1:
+            self.buffered_bytes -= len(self.frames.popleft())
+            self._end_offsets.popleft()
+            self.first_seq += 1
+        self._notify()
+
+    def finish(self):
+        self.done = True
+        self.expires_at = time.monotonic() + self.ttl
+        self._notify()
+        if self.on_finish is not None:
+            self.on_finish(self)
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def can_resume_after(self, seq: int) -> bool:
+        return self.first_seq - 1 <= seq < self.next_seq
+
+    async def subscribe(self, after_seq: int = 0) -> AsyncGenerator[bytes, None]:
+        """Yield frames after ``after_seq``, waiting for new ones until generation ends."""
+        self.subscribers += 1
+        if self._abandon_handle is not None:
+            self._abandon_handle.cancel()
+            self._abandon_handle = None
+        # Time spent suspended at ``yield`` is time the server spends writing to this client
+        write_time = 0.0
+        try:
+            seq = after_seq
+            # A reconnect starts with its whole replay pending; only lag beyond that counts as slow
+            lag_allowance = None
+            while True:
+                changed = self._changed
+                if seq + 1 < self.first_seq:
+                    # This reader fell behind the buffer; it has to reconnect and will get a 410
+                    logger.warning(f"Reader of response stream {self.response_id} fell behind the replay buffer")
+                    return
+                while seq + 1 < self.next_seq:
+                    seq += 1
+                    index = seq - self.first_seq
+                    frame = self.frames[index]
+                    if self.write_buffer_max_bytes > 0:
+                        lag = self.total_bytes - self._end_offsets[index] + len(frame)
+                        if lag_allowance is None:
+                            lag_allowance = max(self.write_buffer_max_bytes, lag)
+                        elif lag > lag_allowance:
+                            sse_slow_readers_dropped_total.inc()
+                            logger.warning(
+                                f"Dropping slow reader of response stream {self.response_id}: {lag} bytes behind"
+                            )
+                            return
+                    yielded_at = time.perf_counter()
+                    yield frame
+                    write_time += time.perf_counter() - yielded_at
+                    if seq + 1 < self.first_seq:
+                        break
+                if self.done and seq + 1 >= self.next_seq:
+                    return
+                if changed is self._changed:
+                    await changed.wait()
+        finally:
+            tracer.record("client_write", write_time)
+            self.subscribers -= 1
+            self._reader_left()
+
+
+class ResponseStreamStore:
+    """
+    In-memory registry of replayable response streams, bounded in count and age.
+
+    Streams are held in creation order with a per-user index; creating one
+    beyond ``max_per_user`` for its user, or ``max_streams`` in total, evicts
+    the oldest (cancelling it if it is still generating). A min-heap ordered by
+    ``expires_at`` lets ``sweep`` drop finished streams after ``ttl`` and cancel
+    ones generating for longer than ``max_lifetime`` in O(k log n).
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        max_bytes: int = 256 * 1024,
+        abandon_grace: float = 10.0,
+        write_buffer_max_bytes: int = 0,
+        max_lifetime: float = 600.0,
+        max_streams: int = 10_000,
+        max_per_user: int = 16
+    ):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.abandon_grace = abandon_grace
+        self.write_buffer_max_bytes = write_buffer_max_bytes
+        self.max_lifetime = max_lifetime
+        self.max_streams = max(1, max_streams)
+        self.max_per_user = max(1, max_per_user)
+        self.streams: Dict[str, ResponseStream] = {}
+        self._by_user: Dict[str, Dict[str, None]] = {}
+        self._expiry: List[Tuple[float, int, str]] = []
+        self._counter = itertools.count()
+
+    def create(self, response_id: str, user_id: str, source: AsyncIterator[bytes]) -> ResponseStream:
+        """Register a new stream and start buffering ``source``."""
+        self.sweep()
+        self._remove(response_id, "replaced")
+        while len(self._by_user.get(user_id, ())) >= self.max_per_user:
+            self._remove(next(iter(self._by_user[user_id])), "capacity")
+        while len(self.streams) >= self.max_streams:
+            self._remove(next(iter(self.streams)), "capacity")
+
+        stream = ResponseStream(
+            response_id, user_id, self.max_bytes, self.ttl, self.abandon_grace, self.write_buffer_max_bytes,
+            self.max_lifetime
+        )
+        stream.on_finish = self._schedule_expiry
+        self.streams[response_id] = stream
+        self._by_user.setdefault(user_id, {})[response_id] = None
+        self._schedule_expiry(stream)
+        stream.start(source)
+        return stream
+
+    def get(self, response_id: str, user_id: str) -> Optional[ResponseStream]:
+        """Look up a live stream owned by ``user_id``."""
+        self.sweep()
+        stream = self.streams.get(response_id)
+        if stream is None or stream.user_id != user_id:
+            return None
+        return stream
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop expired streams, cancelling any still generating; returns how many were removed."""
+        now = time.monotonic() if now is None else now
+        removed = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            _, _, response_id = heapq.heappop(self._expiry)
+            stream = self.streams.get(response_id)
+            # Gone already, or rescheduled when it finished (that pushed a later entry)
+            if stream is None or stream.expires_at > now:
+                continue
+            if not stream.done:
+                logger.warning(f"Cancelling response stream {response_id}: generating for over {self.max_lifetime}s")
+            self._remove(response_id, "expired" if stream.done else "lifetime")
+            removed += 1
+        return removed
+
+    def buffered_bytes(self) -> int:
+        return sum(stream.buffered_bytes for stream in list(self.streams.values()))
+
+    def _schedule_expiry(self, stream: ResponseStream):
+        if stream.expires_at == math.inf or self.streams.get(stream.response_id) is not stream:
+            return
+        heapq.heappush(self._expiry, (stream.expires_at, next(self._counter), stream.response_id))
+        # Evicted and rescheduled streams leave stale entries behind; rebuild before they pile up
+        if len(self._expiry) > 2 * len(self.streams) + 1024:
+            self._expiry = [
+                (stream.expires_at, next(self._counter), response_id)
+                for response_id, stream in self.streams.items() if stream.expires_at != math.inf
+            ]
+            heapq.heapify(self._expiry)
+
+    def _remove(self, response_id: str, reason: str):
+        stream = self.streams.pop(response_id, None)
+        if stream is None:
+            return
+        user_streams = self._by_user.get(stream.user_id)
+        if user_streams is not None:
+            user_streams.pop(response_id, None)
+            if not user_streams:
+                del self._by_user[stream.user_id]
+        if reason == "capacity":
+            logger.info(f"Response stream store full, evicted response stream {response_id}")
+        stream.cancel("Response cancelled by the server")
+        sse_replay_buffers_removed_total.labels(reason).inc()
+
+
+def parse_last_event_id(value: Optional[str], response_id: str) -> int:
+    """
+    Parse a ``Last-Event-ID`` header into a sequence number (0 when absent).
+
+    Accepts the ``<response_id>:<seq>`` form sent by this server, or a bare sequence number.
+    """
+    if not value:
+        return 0
+    stream_id, _, seq = value.rpartition(":")
+    if stream_id and stream_id != response_id:
+        raise ValueError("Last-Event-ID belongs to a different response")
+    seq = int(seq)
+    if seq < 0:
+        raise ValueError("Last-Event-ID must not be negative")
+    return seq
+
+
+# Global instance
+response_stream_store = ResponseStreamStore(
+    settings.sse_replay_ttl_s, settings.sse_replay_max_bytes, settings.sse_abandon_grace_s,
+    settings.sse_write_buffer_max_bytes, settings.sse_max_stream_lifetime_s, settings.sse_replay_max_streams,
+    settings.sse_replay_max_streams_per_user
+)
+
+registry.gauge_callback(
+    "sse_replay_buffers", "Response streams held for Last-Event-ID resumption",
+    lambda: len(response_stream_store.streams)
+)
+registry.gauge_callback(
+    "sse_replay_buffered_bytes", "Bytes held in SSE replay buffers", response_stream_store.buffered_bytes
+)
@@ -1,52 +1,567 @@
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
 import logging
-from typing import Optional
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
 from app.core.config import settings
+from app.core.metrics import registry, upstream_errors_total
+from app.core.session_tokens import RevocationList, RedisRevocationSync, check_secret
+
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:  # pragma: no cover - cryptography is optional; only the file backend needs it
+    AESGCM = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX; the file backend is then single-process only
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
+secret_cache_requests_total = registry.counter(
+    "secret_cache_requests_total", "Refresh token reads by secret cache result", ("result",)
+)
+secret_write_batch_size = registry.histogram(
+    "secret_write_batch_size", "Refresh token writes flushed to the secret backend per batch",
+    bounds=(1, 2, 5, 10, 25, 50, 100)
+)
+
+
+def derive_key(secret: str, purpose: bytes) -> bytes:
+    """Derive a 256-bit key for ``purpose`` from a configured secret."""
+    return hashlib.pbkdf2_hmac("sha256", secret.encode("utf-8"), purpose, 100_000)
+
+
+class SecretBackend(ABC):
+    """Where refresh tokens are persisted. Implementations raise on failure; the service logs it."""
+
+    @abstractmethod
+    def get(self, name: str) -> Optional[str]:
+        """Return the secret, or None if it does not exist."""
+
+    @abstractmethod
+    def put(self, name: str, value: str):
+        """Create or overwrite a secret."""
+
+    @abstractmethod
+    def delete(self, name: str):
+        """Delete a secret; deleting a missing one is not an error."""
+
+    def write_many(self, changes: Dict[str, Optional[str]]):
+        """Apply several writes at once; a None value deletes the secret."""
+        for name, value in changes.items():
+            if value is None:
+                self.delete(name)
+            else:
+                self.put(name, value)
+
+
+class MemorySecretBackend(SecretBackend):
+    """Process-local storage for development; tokens are lost on restart."""
 
-class MockSecretManagerService:
     def __init__(self):
+        self._storage: Dict[str, str] = {}
+
+    def get(self, name: str) -> Optional[str]:
+        return self._storage.get(name)
+
+    def put(self, name: str, value: str):
+        self._storage[name] = value
+
+    def delete(self, name: str):
+        self._storage.pop(name, None)
+
+
+class EncryptedFileSecretBackend(SecretBackend):
+    """
+    Secrets in a local append-only log, one AES-GCM sealed record per line.
+
+    Every write appends a ``put`` or ``del`` record, so the file never has to
+    be rewritten in place and a crash can at worst lose the record being
+    written. Reads are served from an index rebuilt by replaying the log; the
+    tail is replayed again whenever the file grew, so several workers on one
+    host can share the file. Once superseded records outnumber live ones the
+    log is compacted into a fresh file that is swapped in atomically.
+    """
+
+    def __init__(self, path: str, key: str, compact_min_records: int = 64):
+        if AESGCM is None:
+            raise RuntimeError("The encrypted file secret backend needs the 'cryptography' package")
+        self.path = path
+        self.compact_min_records = compact_min_records
+        self._aead = AESGCM(derive_key(key, b"secret-log-enc"))
+        self._secrets: Dict[str, str] = {}
+        self._records = 0
+        self._offset = 0
+        self._inode: Optional[int] = None
+        self._lock = threading.Lock()
+        with self._lock:
+            self._sync()
+
+    def get(self, name: str) -> Optional[str]:
+        with self._lock:
+            self._sync()
+            return self._secrets.get(name)
+
+    def put(self, name: str, value: str):
+        self._append([{"op": "put", "name": name, "value": value}])
+
+    def delete(self, name: str):
+        self._append([{"op": "del", "name": name}])
+
+    def write_many(self, changes: Dict[str, Optional[str]]):
+        # One append and one fsync for the whole batch
+        self._append([
+            {"op": "del", "name": name} if value is None else {"op": "put", "name": name, "value": value}
+            for name, value in changes.items()
+        ])
+
+    def _seal(self, record: Dict[str, str]) -> bytes:
+        nonce = os.urandom(12)
+        sealed = self._aead.encrypt(nonce, json.dumps(record, separators=(",", ":")).encode("utf-8"), None)
+        return base64.b64encode(nonce + sealed) + b"\n"
+
+    def _apply(self, line: bytes):
+        try:
+            sealed = base64.b64decode(line)
+            record = json.loads(self._aead.decrypt(sealed[:12], sealed[12:], None))
+        except Exception:
+            logger.warning(f"Skipping unreadable record in secret log {self.path}")
+            return
+        if record["op"] == "put":
+            self._secrets[record["name"]] = record["value"]
+        else:
+            self._secrets.pop(record["name"], None)
+        self._records += 1
+
+    def _sync(self):
+        """Replay records appended since the last read (by this or another process)."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._secrets, self._records, self._offset, self._inode = {}, 0, 0, None
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            # New file, or another process compacted it: replay from the start
+            self._secrets, self._records, self._offset, self._inode = {}, 0, 0, stat.st_ino
+        if stat.st_size == self._offset:
+            return
+        with open(self.path, "rb") as log:
+            log.seek(self._offset)
+            data = log.read()
+        # A record still being written by another process has no newline yet
+        complete = data.rfind(b"\n") + 1
+        for line in data[:complete].splitlines():
+            self._apply(line)
+        self._offset += complete
+
+    def _append(self, records: List[Dict[str, str]]):
+        lines = [self._seal(record) for record in records]
+        with self._lock, _FileLock(self.path + ".lock"):
+            self._sync()
+            with open(self.path, "ab") as log:
+                log.write(b"".join(lines))
+                log.flush()
+                os.fsync(log.fileno())
+            if self._inode is None:
+                self._inode = os.stat(self.path).st_ino
+            for line in lines:
+                self._apply(line.rstrip(b"\n"))
+                self._offset += len(line)
+            if self._records > 2 * len(self._secrets) + self.compact_min_records:
+                self._compact()
+
+    def _compact(self):
+        temporary = self.path + ".compact"
+        with open(temporary, "wb") as log:
+            for name, value in self._secrets.items():
+                log.write(self._seal({"op": "put", "name": name, "value": value}))
+            log.flush()
+            os.fsync(log.fileno())
+        os.replace(temporary, self.path)
+        stat = os.stat(self.path)
+        self._records, self._offset, self._inode = len(self._secrets), stat.st_size, stat.st_ino
+        logger.info(f"Compacted secret log {self.path} to {len(self._secrets)} records")
+
+
+class _FileLock:
+    """Exclusive advisory lock on a side file, held across processes while the log is written."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._file = open(self.path, "a")
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class CloudSecretManagerBackend(SecretBackend):
+    """
+    Secrets in Google Cloud Secret Manager, through its v1 REST API.
+
+    Each refresh token is one secret whose latest version holds the value;
+    the version it replaces is destroyed, so an old token neither stays
+    readable nor keeps being billed. Requests are authenticated with
+    ``access_token`` when it is configured, otherwise with the service account
+    token from the GCE metadata server. Calls come from executor threads, so
+    each thread gets its own ``requests.Session`` (an injected ``http`` client
+    is used as is). ``app.fakes.google_api`` serves the same endpoints for
+    local runs.
+    """
+
+    METADATA_TOKEN_URL = "http://metadata.google.internal/computeMetadata/v1/instance/service-accounts/default/token"
+
+    def __init__(self, project_id: str, base_url: str, access_token: Optional[str] = None, http=None):
+        self.project_id = project_id
+        self.base_url = base_url.rstrip("/")
+        self._http = http
+        self._local = threading.local()
+        self._token: Optional[Tuple[str, float]] = (access_token, float("inf")) if access_token else None
+
+    @property
+    def http(self):
+        if self._http is not None:
+            return self._http
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _headers(self) -> Dict[str, str]:
+        if self._token is None or self._token[1] <= time.monotonic():
+            response = self.http.get(self.METADATA_TOKEN_URL, headers={"Metadata-Flavor": "Google"}, timeout=5)
+            response.raise_for_status()
+            body = response.json()
+            # Renew a minute early so a token never expires mid-request
+            self._token = (body["access_token"], time.monotonic() + body.get("expires_in", 3600) - 60)
+        return {"Authorization": f"Bearer {self._token[0]}"}
+
+    def _secret_url(self, name: str) -> str:
+        return f"{self.base_url}/projects/{self.project_id}/secrets/{name}"
+
+    def get(self, name: str) -> Optional[str]:
+        response = self.http.get(f"{self._secret_url(name)}/versions/latest:access", headers=self._headers(), timeout=5)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return base64.b64decode(response.json()["payload"]["data"]).decode("utf-8")
+
+    def put(self, name: str, value: str):
+        body = {"payload": {"data": base64.b64encode(value.encode("utf-8")).decode("ascii")}}
+        response = self.http.post(f"{self._secret_url(name)}:addVersion", json=body, headers=self._headers(), timeout=5)
+        if response.status_code == 404:
+            # First token for this user: create the secret, then add the version
+            created = self.http.post(
+                f"{self.base_url}/projects/{self.project_id}/secrets",
+                params={"secretId": name},
+                json={"replication": {"automatic": {}}},
+                headers=self._headers(),
+                timeout=5
+            )
+            if created.status_code != 409:
+                created.raise_for_status()
+            response = self.http.post(f"{self._secret_url(name)}:addVersion", json=body, headers=self._headers(), timeout=5)
+        response.raise_for_status()
+        self._destroy_previous_version(response.json()["name"])
+
+    def _destroy_previous_version(self, version_name: str):
+        """Destroy the version before ``version_name``; the new value is already stored, so failures are only logged."""
+        secret_name, _, number = version_name.rpartition("/versions/")
+        if int(number) <= 1:
+            return
+        try:
+            response = self.http.post(
+                f"{self.base_url}/{secret_name}/versions/{int(number) - 1}:destroy", headers=self._headers(), timeout=5
+            )
+            # 400 is an already destroyed version, 404 one that is gone
+            if response.status_code not in (400, 404):
+                response.raise_for_status()
+        except Exception as e:
+            logger.warning(f"Could not destroy the previous version of {secret_name}: {e}")
+            upstream_errors_total.labels("secret_manager", type(e).__name__).inc()
+
+    def delete(self, name: str):
+        response = self.http.delete(self._secret_url(name), headers=self._headers(), timeout=5)
+        if response.status_code != 404:
+            response.raise_for_status()
+
+
+class SecretManagerService:
+    """
+    Stores users' Google refresh tokens in a ``SecretBackend``.
+
+    Reads go through an in-memory cache with a TTL, so refreshing an access
+    token does not touch the backend each time. Writes update the cache
+    directly. Deletes are also recorded in ``deletions``, a revocation list
+    shared with the other workers when it has a sync backend: a cached value
+    read from the backend before its secret was deleted is never served, so a
+    logout is not undone by another worker's cache.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[SecretBackend] = None,
+        cache_ttl: float = 300.0,
+        deletions: Optional[RevocationList] = None
+    ):
         self.project_id = settings.google_cloud_project_id
-        self._storage = {}  # In-memory storage for development
-    
+        self.backend = backend or MemorySecretBackend()
+        self.cache_ttl = cache_ttl
+        self.deletions = deletions if deletions is not None else RevocationList()
+        # secret id -> (value, cache expiry on the monotonic clock, Unix time the value was read or written)
+        self._cache: Dict[str, Tuple[str, float, float]] = {}
+
+    @staticmethod
+    def secret_id(user_id: str) -> str:
+        return f"google-refresh-token-{user_id}"
+
+    def cached(self, secret_id: str) -> Optional[str]:
+        """The cached value for ``secret_id``, without touching the backend"""
+        cached = self._cache.get(secret_id)
+        if cached is None:
+            return None
+        deleted_at = self.deletions.revoked_at(secret_id)
+        if cached[1] <= time.monotonic() or (deleted_at is not None and deleted_at >= cached[2]):
+            self._cache.pop(secret_id, None)
+            return None
+        secret_cache_requests_total.labels("hit").inc()
+        return cached[0]
+
+    def remember(self, secret_id: str, value: Optional[str], as_of: Optional[float] = None):
+        """Cache ``value`` (None forgets it) as known at Unix time ``as_of`` (now by default)"""
+        if value is None:
+            self._cache.pop(secret_id, None)
+        else:
+            self._cache[secret_id] = (value, time.monotonic() + self.cache_ttl, time.time() if as_of is None else as_of)
+
+    def record_deletion(self, secret_id: str):
+        """Stop every worker from serving a cached copy of a secret that was just deleted"""
+        self._cache.pop(secret_id, None)
+        # Only needed while a copy cached before now could still be served
+        self.deletions.revoke(secret_id, time.time() + self.cache_ttl + 60)
+
+    def write_batch(self, changes: Dict[str, Optional[str]]) -> bool:
+        """Write several refresh tokens (None deletes) in one backend call"""
+        secret_write_batch_size.observe(len(changes))
+        try:
+            self.backend.write_many(changes)
+        except Exception as e:
+            logger.error(f"Error writing {len(changes)} refresh tokens: {e}")
+            upstream_errors_total.labels("secret_manager", type(e).__name__).inc()
+            for secret_id in changes:
+                self._cache.pop(secret_id, None)
+            return False
+        return True
+
     def store_refresh_token(self, user_id: str, refresh_token: str) -> bool:
-        """Store refresh token in mock storage"""
+        """Store refresh token in the secret backend"""
+        secret_id = self.secret_id(user_id)
         try:
-            secret_id = f"google-refresh-token-{user_id}"
-            self._storage[secret_id] = refresh_token
-            
-            logger.info(f"Successfully stored refresh token for user {user_id}")
-            return True
-            
+            self.backend.put(secret_id, refresh_token)
         except Exception as e:
             logger.error(f"Error storing refresh token: {e}")
+            upstream_errors_total.labels("secret_manager", type(e).__name__).inc()
+            self._cache.pop(secret_id, None)
             return False
-    
-    def get_refresh_token(self, user_id: str) -> Optional[str]:
-        """Retrieve refresh token from mock storage"""
+
+        self.remember(secret_id, refresh_token)
+        logger.info(f"Successfully stored refresh token for user {user_id}")
+        return True
+
+    def fetch(self, secret_id: str) -> Tuple[Optional[str], Optional[float]]:
+        """
+        Read a secret from the backend, bypassing the cache.
+
+        Returns the value and the Unix time the read started, or ``(None, None)``
+        if it failed. It touches neither the cache nor ``deletions``, so it is
+        the part that may run in an executor thread.
+        """
+        secret_cache_requests_total.labels("miss").inc()
+        # A delete that lands while this read is in flight must still invalidate what it returns
+        read_at = time.time()
         try:
-            secret_id = f"google-refresh-token-{user_id}"
-            return self._storage.get(secret_id)
-            
+            return self.backend.get(secret_id), read_at
         except Exception as e:
             logger.error(f"Error retrieving refresh token: {e}")
-            return None
-    
+            upstream_errors_total.labels("secret_manager", type(e).__name__).inc()
+            return None, None
+
+    def get_refresh_token(self, user_id: str) -> Optional[str]:
+        """Retrieve refresh token, from the cache when possible"""
+        secret_id = self.secret_id(user_id)
+        cached = self.cached(secret_id)
+        if cached is not None:
+            return cached
+
+        refresh_token, read_at = self.fetch(secret_id)
+        if read_at is not None:
+            self.remember(secret_id, refresh_token, read_at)
+        return refresh_token
+
     def delete_refresh_token(self, user_id: str) -> bool:
-        """Delete refresh token from mock storage"""
+        """Delete refresh token from the secret backend"""
+        secret_id = self.secret_id(user_id)
+        self._cache.pop(secret_id, None)
         try:
-            secret_id = f"google-refresh-token-{user_id}"
-            if secret_id in self._storage:
-                del self._storage[secret_id]
-            
-            logger.info(f"Successfully deleted refresh token for user {user_id}")
-            return True
-            
+            self.backend.delete(secret_id)
         except Exception as e:
             logger.error(f"Error deleting refresh token: {e}")
+            upstream_errors_total.labels("secret_manager", type(e).__name__).inc()
             return False
 
+        self.record_deletion(secret_id)
+        logger.info(f"Successfully deleted refresh token for user {user_id}")
+        return True
+
+
+class AsyncSecretManager:
+    """
+    Non-blocking front end to a ``SecretManagerService`` for async callers.
+
+    Backend calls run in the default executor instead of on the event loop.
+    Writes are queued and flushed by a background task that waits
+    ``batch_window`` for more to arrive and then sends up to ``max_batch`` of
+    them in one backend call; a newer write for the same user replaces a
+    queued one. Concurrent reads of a token that is not cached share a single
+    backend fetch.
+    """
+
+    def __init__(self, service: SecretManagerService, batch_window: float = 0.005, max_batch: int = 100):
+        self.service = service
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._pending: Dict[str, Optional[str]] = {}
+        self._writing: Dict[str, Optional[str]] = {}
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._reads: Dict[str, asyncio.Future] = {}
+
+    async def store_refresh_token(self, user_id: str, refresh_token: str) -> bool:
+        """Queue a refresh token write and wait until its batch is written"""
+        return await self._enqueue(self.service.secret_id(user_id), refresh_token)
+
+    async def delete_refresh_token(self, user_id: str) -> bool:
+        """Queue a refresh token deletion and wait until its batch is written"""
+        return await self._enqueue(self.service.secret_id(user_id), None)
+
+    async def get_refresh_token(self, user_id: str) -> Optional[str]:
+        """Retrieve refresh token, seeing queued writes and sharing in-flight fetches"""
+        secret_id = self.service.secret_id(user_id)
+        for queued in (self._pending, self._writing):
+            if secret_id in queued:
+                return queued[secret_id]
+        cached = self.service.cached(secret_id)
+        if cached is not None:
+            return cached
+
+        loop = asyncio.get_running_loop()
+        read = self._reads.get(secret_id)
+        if read is None or read.get_loop() is not loop:
+            # Only the backend read runs in the executor; the cache and deletion list stay on this thread
+            read = loop.run_in_executor(None, self.service.fetch, secret_id)
+            self._reads[secret_id] = read
+            read.add_done_callback(lambda done: self._fetched(secret_id, done))
+        # Shielded so one caller being cancelled does not cancel the fetch for the others
+        refresh_token, _ = await asyncio.shield(read)
+        return refresh_token
+
+    def _fetched(self, secret_id: str, read: asyncio.Future):
+        """Cache a finished backend read, on the loop thread."""
+        if self._reads.get(secret_id) is read:
+            del self._reads[secret_id]
+        if not read.cancelled() and read.exception() is None:
+            refresh_token, read_at = read.result()
+            if read_at is not None:
+                self.service.remember(secret_id, refresh_token, read_at)
+
+    async def _enqueue(self, secret_id: str, value: Optional[str]) -> bool:
+        loop = asyncio.get_running_loop()
+        self.service.remember(secret_id, value)
+        self._pending[secret_id] = value
+        done = loop.create_future()
+        self._waiters.setdefault(secret_id, []).append(done)
+        if self._flusher is None or self._flusher.done() or self._flusher.get_loop() is not loop:
+            self._flusher = loop.create_task(self._flush())
+        return await done
+
+    async def _flush(self):
+        """Write queued changes in batches until the queue is empty, then exit."""
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            if len(self._pending) < self.max_batch:
+                # Give concurrent writers a moment to join this batch
+                await asyncio.sleep(self.batch_window)
+            names = list(itertools.islice(self._pending, self.max_batch))
+            self._writing = {name: self._pending.pop(name) for name in names}
+            waiters = [waiter for name in names for waiter in self._waiters.pop(name, [])]
+            try:
+                written = await loop.run_in_executor(None, self.service.write_batch, self._writing)
+                if written:
+                    # Recorded here rather than in the executor: the deletion list is not thread-safe
+                    for name, value in self._writing.items():
+                        if value is None:
+                            self.service.record_deletion(name)
+            finally:
+                self._writing = {}
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(written)
+
+
+class MockSecretManagerService(SecretManagerService):
+    """Secret manager backed by process memory, for development and tests."""
+
+    def __init__(self, deletions: Optional[RevocationList] = None):
+        super().__init__(MemorySecretBackend(), settings.secret_cache_ttl_s, deletions)
+
+
+def create_secret_deletions() -> RevocationList:
+    """Deleted secret ids, shared across workers through SESSION_BACKEND_URL when it is set."""
+    sync = None
+    if settings.session_backend_url:
+        sync = RedisRevocationSync(settings.session_backend_url, "deleted_secret", settings.secret_cache_ttl_s + 60)
+    return RevocationList(sync, settings.revocation_sync_interval_s)
+
+
+def create_secret_manager() -> SecretManagerService:
+    """Build the secret manager selected by SECRET_BACKEND ("memory", "file" or "gcp")."""
+    deletions = create_secret_deletions()
+    if settings.secret_backend == "file":
+        # Its own key: sealing refresh tokens with the cookie signing key would tie the two together
+        check_secret(settings.secret_encryption_key, "SECRET_ENCRYPTION_KEY")
+        backend = EncryptedFileSecretBackend(settings.secret_file_path, settings.secret_encryption_key)
+    elif settings.secret_backend == "gcp":
+        backend = CloudSecretManagerBackend(
+            settings.google_cloud_project_id,
+            settings.secret_manager_api_base_url,
+            settings.secret_manager_access_token
+        )
+    elif settings.secret_backend == "memory":
+        return MockSecretManagerService(deletions)
+    else:
+        raise ValueError(f"Unknown secret backend: {settings.secret_backend}")
+    return SecretManagerService(backend, settings.secret_cache_ttl_s, deletions)
+
 
-# Global instance
-secret_manager = MockSecretManagerService()
\ No newline at end of file
+# Global instances
+secret_manager = create_secret_manager()
+async_secret_manager = AsyncSecretManager(secret_manager)
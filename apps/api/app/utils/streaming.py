@@ -1,12 +1,219 @@
+import asyncio
 import json
-from typing import AsyncGenerator, Any, Dict
+import math
+from contextlib import aclosing
+from typing import AsyncGenerator, AsyncIterable, AsyncIterator, Any, Dict, Optional
 from fastapi.responses import StreamingResponse
 from fastapi import HTTPException
 import logging
 import uuid
+from app.core.config import settings
+from app.core.metrics import sse_heartbeats_total, sse_idle_timeouts_total
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# SSE comment line; clients ignore it, but it keeps proxies from closing an idle connection
+SSE_HEARTBEAT = b": keep-alive\n\n"
+
+
+if orjson is not None:
+    json_bytes = orjson.dumps
+else:
+    def json_bytes(value: Any) -> bytes:
+        """Serialize ``value`` to UTF-8 JSON bytes."""
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class SSEFrameEncoder:
+    """
+    Encodes chat SSE frames straight to bytes.
+
+    Everything except ``content`` is constant for a response, so the frame
+    prefix and suffix are rendered once and each chunk only needs its
+    content escaped. Bytes pass through Starlette without being re-encoded.
+    """
+
+    __slots__ = ("_prefix", "_suffix", "_complete", "_response_id")
+
+    def __init__(self, response_id: str):
+        self._response_id = response_id
+        self._prefix = b'data: {"id":' + json_bytes(response_id) + b',"content":'
+        self._suffix = b',"isComplete":false}\n\n'
+        self._complete = self._prefix + b'"","isComplete":true}\n\n'
+
+    def chunk(self, content: str) -> bytes:
+        """Frame for one content chunk."""
+        return self._prefix + json_bytes(content) + self._suffix
+
+    def complete(self) -> bytes:
+        """Final frame signalling the end of the response."""
+        return self._complete
+
+    def error(self, message: str, content: str = "") -> bytes:
+        """Final frame carrying an error message."""
+        return self.frame({"id": self._response_id, "content": content, "isComplete": True, "error": message})
+
+    @staticmethod
+    def content_frame(frame_id: str, content: str) -> bytes:
+        """Content frame with its own id, for streams that number their chunks."""
+        return b'data: {"id":' + json_bytes(frame_id) + b',"content":' + json_bytes(content) + b',"isComplete":false}\n\n'
+
+    @staticmethod
+    def frame(data: Dict[str, Any]) -> bytes:
+        """Frame for an arbitrary payload."""
+        return b"data: " + json_bytes(data) + b"\n\n"
+
+
+class _ReadAhead:
+    """
+    Reads an async iterator from one background task, for stages that wait with a timeout.
+
+    Giving up on a wait must not cancel the read, so the read has to run in a task
+    of its own. One task per stream reads ahead into ``items`` until ``limit`` is
+    buffered, instead of a new Task around every ``__anext__``; a waiting stage is
+    only woken once ``threshold`` is reached, so most chunks wake nobody.
+    ``size`` measures an item (1 per item by default); a ``limit`` of 0 means no limit.
+    """
+
+    def __init__(self, iterator: AsyncIterator, size=None, limit: float = 1):
+        self._iterator = iterator
+        self._size = size
+        self._limit = limit
+        self.items = []
+        self.buffered = 0
+        self.first_buffered_at: Optional[float] = None
+        self.finished = False
+        self.error: Optional[Exception] = None
+        self._loop = asyncio.get_running_loop()
+        self._threshold = math.inf
+        self._waiter: Optional[asyncio.Future] = None
+        self._resume: Optional[asyncio.Future] = None
+        self.task = self._loop.create_task(self._read())
+
+    async def _read(self):
+        try:
+            async for item in self._iterator:
+                size = 1 if self._size is None else self._size(item)
+                if size and not self.buffered:
+                    self.first_buffered_at = self._loop.time()
+                self.items.append(item)
+                self.buffered += size
+                if self.buffered >= self._threshold:
+                    self._wake()
+                if self._limit and self.buffered >= self._limit:
+                    self._resume = self._loop.create_future()
+                    await self._resume
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+            self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def wait(self, threshold: float, timeout: Optional[float] = None) -> bool:
+        """Wait until ``threshold`` is buffered or the source has ended; False on timeout."""
+        if self.buffered >= threshold or self.finished:
+            return True
+        self._threshold = threshold
+        self._waiter = self._loop.create_future()
+        timer = self._loop.call_later(timeout, self._wake) if timeout is not None else None
+        try:
+            await self._waiter
+        finally:
+            if timer is not None:
+                timer.cancel()
+            self._waiter, self._threshold = None, math.inf
+        return self.buffered >= threshold or self.finished
+
+    def take(self) -> list:
+        """Everything buffered so far, letting the reader continue."""
+        items, self.items = self.items, []
+        self.buffered, self.first_buffered_at = 0, None
+        if self._resume is not None and not self._resume.done():
+            self._resume.set_result(None)
+        return items
+
+    @property
+    def exhausted(self) -> bool:
+        """The source has ended and everything it produced has been taken."""
+        return self.finished and not self.items
+
+
+async def coalesce_chunks(
+    source: AsyncIterable[str],
+    window_ms: Optional[float] = None,
+    max_bytes: Optional[int] = None
+) -> AsyncGenerator[str, None]:
+    """
+    Batch small text chunks into fewer, larger ones.
+
+    The first non-empty chunk is passed through immediately so time to first
+    token is unchanged. After that, chunks are buffered until ``max_bytes`` of
+    UTF-8 have accumulated or ``window_ms`` has passed since the first buffered
+    chunk, whichever comes first. The source keeps being read while a batch is
+    being written to the client, up to ``max_bytes`` ahead.
+
+    Args:
+        source: Async iterable of text chunks
+        window_ms: Flush window in milliseconds (settings default when None; 0 disables coalescing)
+        max_bytes: Flush once this many bytes are buffered (settings default when None; 0 means no limit)
+    """
+    window = (settings.sse_coalesce_window_ms if window_ms is None else window_ms) / 1000
+    max_bytes = settings.sse_coalesce_max_bytes if max_bytes is None else max_bytes
+
+    iterator = source.__aiter__()
+    reader: Optional[_ReadAhead] = None
+    try:
+        if window <= 0:
+            async for chunk in iterator:
+                if chunk:
+                    yield chunk
+            return
+
+        async for chunk in iterator:
+            if chunk:
+                yield chunk
+                break
+        else:
+            return
+
+        loop = asyncio.get_running_loop()
+        reader = _ReadAhead(iterator, size=lambda chunk: len(chunk.encode("utf-8")), limit=max_bytes)
+        while not reader.exhausted:
+            # Wait for a first byte, then for a full batch until the window closes
+            await reader.wait(1)
+            if reader.first_buffered_at is not None:
+                timeout = max(0.0, reader.first_buffered_at + window - loop.time())
+                await reader.wait(max_bytes or math.inf, timeout)
+            batch = "".join(reader.take())
+            if batch:
+                yield batch
+
+        if reader.error is not None:
+            raise reader.error
+    finally:
+        await _close_pending_read(reader.task if reader is not None else None, iterator)
+
+
+async def _close_pending_read(pending: Optional[asyncio.Future], iterator: AsyncIterator):
+    """Cancel an in-flight ``__anext__`` and close the iterator it was reading."""
+    if pending is not None:
+        pending.cancel()
+        await asyncio.wait((pending,))
+        if not pending.cancelled():
+            pending.exception()  # Retrieve it so asyncio does not log it as unhandled
+    aclose = getattr(iterator, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
 
 class StreamingUtils:
     """Utilities for handling streaming responses."""
@@ -16,8 +223,9 @@ class StreamingUtils:
         response_generator: AsyncGenerator[str, None],
         response_id: str,
         calendar_context_included: bool = False,
-        event_count: int = 0
-    ) -> AsyncGenerator[str, None]:
+        event_count: int = 0,
+        idle_timeout: Optional[float] = None
+    ) -> AsyncGenerator[bytes, None]:
         """
         Create a streaming response generator with proper formatting.
         
@@ -26,39 +234,50 @@ class StreamingUtils:
             response_id: Unique ID for this response
             calendar_context_included: Whether calendar context was included
             event_count: Number of calendar events included
+            idle_timeout: Give up when the source sends nothing for this many seconds
+                (settings default when None; 0 disables)
             
         Yields:
-            Formatted SSE (Server-Sent Events) chunks
+            Formatted SSE (Server-Sent Events) frames, as bytes
         """
+        idle_timeout = settings.sse_idle_timeout_s if idle_timeout is None else idle_timeout
+        encoder = SSEFrameEncoder(response_id)
+        timed_out = False
         try:
-            # Stream response chunks
-            async for chunk in response_generator:
-                if chunk:
-                    chunk_data = {
-                        "id": response_id,
-                        "content": chunk,
-                        "isComplete": False
-                    }
-                    yield f"data: {json.dumps(chunk_data)}\n\n"
+            # Stream response chunks; closing this generator (client disconnect) closes the
+            # source straight away, which cancels the LLM call down in LLMService._stream_response
+            async with aclosing(response_generator) as chunks:
+                iterator = chunks.__aiter__()
+                while True:
+                    try:
+                        if idle_timeout > 0:
+                            # On timeout the read is cancelled in place, which stops the upstream
+                            # call; unlike wait_for this needs no extra Task per chunk
+                            async with asyncio.timeout(idle_timeout):
+                                chunk = await iterator.__anext__()
+                        else:
+                            chunk = await iterator.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        timed_out = True
+                        break
+                    if chunk:
+                        yield encoder.chunk(chunk)
+            
+            if timed_out:
+                sse_idle_timeouts_total.inc()
+                logger.warning(f"Stream {response_id} sent nothing for {idle_timeout}s, closing it")
+                yield encoder.error("Timed out waiting for the model to respond")
+                return
             
             # Send completion signal
-            completion_data = {
-                "id": response_id,
-                "content": "",
-                "isComplete": True
-            }
-            yield f"data: {json.dumps(completion_data)}\n\n"
+            yield encoder.complete()
             
         except Exception as e:
             logger.error(f"Error in streaming response: {str(e)}")
             # Send error message
-            error_data = {
-                "id": response_id,
-                "content": "",
-                "isComplete": True,
-                "error": str(e)
-            }
-            yield f"data: {json.dumps(error_data)}\n\n"
+            yield encoder.error(str(e))
     
     @staticmethod
     def create_streaming_response(
@@ -79,19 +298,83 @@ class StreamingUtils:
         """
         response_id = str(uuid.uuid4())
         
-        return StreamingResponse(
+        return StreamingUtils.sse_response(
             StreamingUtils.create_stream_generator(
                 response_generator,
                 response_id,
                 calendar_context_included,
                 event_count
-            ),
+            )
+        )
+    
+    @staticmethod
+    async def with_heartbeats(
+        frames: AsyncIterable[bytes],
+        interval: Optional[float] = None
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Pass ``frames`` through, sending a keep-alive comment whenever none arrives for ``interval`` seconds.
+        
+        This mostly covers the wait for the first token, when a long model call would
+        otherwise leave the connection silent long enough for a proxy to drop it.
+        
+        Args:
+            frames: Async iterable of encoded SSE frames
+            interval: Heartbeat interval in seconds (settings default when None; 0 disables)
+        """
+        interval = settings.sse_heartbeat_interval_s if interval is None else interval
+        iterator = frames.__aiter__()
+        reader: Optional[_ReadAhead] = None
+        try:
+            if interval <= 0:
+                async for frame in iterator:
+                    yield frame
+                return
+            
+            # Frames are read one ahead, so a stream that keeps up never waits on a timer
+            reader = _ReadAhead(iterator)
+            while not reader.exhausted:
+                if not await reader.wait(1, interval):
+                    sse_heartbeats_total.inc()
+                    yield SSE_HEARTBEAT
+                    continue
+                for frame in reader.take():
+                    yield frame
+            
+            if reader.error is not None:
+                raise reader.error
+        finally:
+            await _close_pending_read(reader.task if reader is not None else None, iterator)
+    
+    @staticmethod
+    def sse_response(
+        frames: AsyncIterable[bytes],
+        headers: Optional[Dict[str, str]] = None,
+        heartbeat_interval: Optional[float] = None
+    ) -> StreamingResponse:
+        """
+        Wrap already-encoded SSE frames in a StreamingResponse with the standard headers.
+        
+        Keep-alive comments are added while the stream is idle; they are per connection
+        and never stored in a replay buffer.
+        
+        Args:
+            frames: Async iterable of encoded SSE frames
+            headers: Extra response headers
+            heartbeat_interval: Heartbeat interval in seconds (settings default when None; 0 disables)
+            
+        Returns:
+            FastAPI StreamingResponse
+        """
+        return StreamingResponse(
+            StreamingUtils.with_heartbeats(frames, heartbeat_interval),
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
                 "Connection": "keep-alive",
                 "Access-Control-Allow-Origin": "*",
                 "Access-Control-Allow-Headers": "*",
+                **(headers or {}),
             }
         )
     
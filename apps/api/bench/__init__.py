@@ -0,0 +1 @@
+# Load tests and benchmarks for the API (run from apps/api, e.g. `python -m bench.load_test`)
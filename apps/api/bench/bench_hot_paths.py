@@ -0,0 +1,286 @@
+"""
+Microbenchmarks for hot-path functions (pytest-benchmark).
+
+The file is named ``bench_*`` so the regular test run does not collect it.
+Run it explicitly from apps/api; results are stored as JSON under
+``bench/results`` and can be compared against a saved baseline:
+
+    # Record a baseline
+    python -m pytest bench/bench_hot_paths.py --benchmark-storage=bench/results --benchmark-save=baseline
+
+    # Compare against the most recent saved run and fail on a >15% mean regression
+    python -m pytest bench/bench_hot_paths.py --benchmark-storage=bench/results \\
+        --benchmark-autosave --benchmark-compare --benchmark-compare-fail=mean:15%
+"""
+import asyncio
+import itertools
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from starlette.requests import Request
+
+# The app will not import without a session key; any throwaway value does for benchmarks
+os.environ.setdefault("SESSION_SECRET_KEY", "bench-only-session-secret-0123456789abcdef")
+
+from app.core.auth import auth_service, get_current_user, session_store
+from app.core.rate_limit import RateLimiter
+from app.fakes.google_api import FakeCalendar
+from app.models.calendar import CalendarEvent, CalendarEventResponse
+from app.models.chat import ChatRequest, ChatMessage
+from app.models.user import User, UserSession, GoogleUserInfo
+from app.prompts.calendar_assistant import PromptBuilder
+from app.services.calendar_service import CalendarService
+from app.utils.streaming import StreamingUtils, SSEFrameEncoder, coalesce_chunks
+
+CALENDAR_SIZES = [0, 10, 100, 1000, 5000]
+CURRENT_TIME = datetime.now(timezone.utc)
+
+_raw_events_cache = {}
+
+
+def raw_google_events(count: int):
+    """Synthetic Google Calendar API items, as returned by the events endpoint."""
+    if count not in _raw_events_cache:
+        calendar = FakeCalendar(f"bench/{count}", count, days_span=30, seed=0)
+        _raw_events_cache[count] = list(calendar.events.values())
+    return _raw_events_cache[count]
+
+
+def calendar_events(count: int):
+    service = CalendarService()
+    return [service._transform_google_event(event) for event in raw_google_events(count)]
+
+
+def conversation_history(count: int = 10):
+    return [
+        ChatMessage(
+            id=str(number),
+            content=f"Message number {number} about my schedule",
+            role="user" if number % 2 == 0 else "assistant",
+            timestamp=CURRENT_TIME - timedelta(minutes=count - number)
+        )
+        for number in range(count)
+    ]
+
+
+@pytest.fixture(scope="module")
+def prompt_builder():
+    return PromptBuilder()
+
+
+@pytest.fixture(scope="module")
+def calendar_service():
+    return CalendarService()
+
+
+# Prompt building
+
+@pytest.mark.parametrize("size", CALENDAR_SIZES)
+def test_build_chat_prompt(benchmark, prompt_builder, size):
+    events = calendar_events(size)
+    history = conversation_history()
+
+    benchmark(
+        prompt_builder.build_chat_prompt,
+        user_message="What meetings do I have today?",
+        calendar_events=events,
+        conversation_history=history,
+        current_time=CURRENT_TIME
+    )
+
+
+@pytest.mark.parametrize("size", CALENDAR_SIZES)
+def test_format_calendar_events(benchmark, prompt_builder, size):
+    events = calendar_events(size)
+
+    benchmark(prompt_builder._format_calendar_events, events, CURRENT_TIME)
+
+
+@pytest.mark.parametrize("message", [
+    "What meetings do I have today?",
+    "Am I free tomorrow afternoon?",
+    "Find my planning review with the design team sometime next month please",
+])
+def test_extract_calendar_intent(benchmark, prompt_builder, message):
+    benchmark(prompt_builder.extract_calendar_intent, message)
+
+
+# Calendar transformation
+
+@pytest.mark.parametrize("size", CALENDAR_SIZES)
+def test_transform_google_events(benchmark, calendar_service, size):
+    events = raw_google_events(size)
+
+    benchmark(lambda: [calendar_service._transform_google_event(event) for event in events])
+
+
+@pytest.mark.parametrize("time_data", [
+    {"dateTime": "2025-09-10T10:00:00Z"},
+    {"dateTime": "2025-09-10T10:00:00-07:00"},
+    {"date": "2025-09-10"},
+], ids=["utc", "offset", "all_day"])
+def test_parse_datetime(benchmark, calendar_service, time_data):
+    benchmark(calendar_service._parse_datetime, time_data)
+
+
+# SSE framing
+
+@pytest.mark.parametrize("chunk_count", [1, 100, 1000])
+def test_stream_generator_framing(benchmark, chunk_count):
+    chunks = [f"token {number} " for number in range(chunk_count)]
+    loop = asyncio.new_event_loop()
+
+    async def source():
+        for chunk in chunks:
+            yield chunk
+
+    async def drain():
+        async for _ in StreamingUtils.create_stream_generator(source(), "bench-response"):
+            pass
+
+    try:
+        benchmark(lambda: loop.run_until_complete(drain()))
+    finally:
+        loop.close()
+
+
+@pytest.mark.parametrize("window_ms", [0, 16], ids=["uncoalesced", "coalesced"])
+def test_stream_pipeline_frames(benchmark, window_ms):
+    """
+    Tokens through the whole SSE pipeline: coalescing, idle timeout and heartbeats.
+
+    The source yields to the loop between tokens like a network read would, so every
+    stage really waits. ``tokens_per_second`` in the results is the figure to watch.
+    """
+    token_count = 1000
+    loop = asyncio.new_event_loop()
+
+    async def source():
+        for number in range(token_count):
+            await asyncio.sleep(0)
+            yield f"token {number} "
+
+    async def drain():
+        chunks = coalesce_chunks(source(), window_ms=window_ms, max_bytes=256)
+        frames = StreamingUtils.create_stream_generator(chunks, "bench-response", idle_timeout=120)
+        async for _ in StreamingUtils.with_heartbeats(frames, interval=15):
+            pass
+
+    try:
+        benchmark(lambda: loop.run_until_complete(drain()))
+    finally:
+        loop.close()
+    if benchmark.stats is not None:
+        benchmark.extra_info["tokens_per_second"] = round(token_count / benchmark.stats.stats.mean)
+
+
+SSE_CHUNKS = {
+    "token": "meeting ",
+    "sentence": "You have a design review with the platform team at 3pm in Room 4.",
+    "escaped": 'Agenda:\n- "Q3 planning"\n- caf\u00e9 \U0001F4C5 notes',
+}
+
+
+@pytest.mark.parametrize("chunk", SSE_CHUNKS.values(), ids=SSE_CHUNKS.keys())
+def test_sse_frame_dict_dumps(benchmark, chunk):
+    """Per-chunk cost of the previous framing: fresh dict, json.dumps, f-string, encode."""
+    def encode():
+        chunk_data = {"id": "bench-response", "content": chunk, "isComplete": False}
+        return f"data: {json.dumps(chunk_data)}\n\n".encode("utf-8")
+
+    benchmark(encode)
+
+
+@pytest.mark.parametrize("chunk", SSE_CHUNKS.values(), ids=SSE_CHUNKS.keys())
+def test_sse_frame_encoder(benchmark, chunk):
+    """Per-chunk cost with the pre-rendered frame and fast JSON backend."""
+    encoder = SSEFrameEncoder("bench-response")
+
+    benchmark(encoder.chunk, chunk)
+
+
+# Authentication
+
+def test_get_current_user(benchmark):
+    user_info = GoogleUserInfo(
+        id="bench_user", email="bench@example.com", name="Bench User",
+        picture="https://example.com/avatar.jpg", verified_email=True
+    )
+    session_store["bench_session"] = UserSession(
+        user_id="bench_user",
+        session_id="bench_session",
+        access_token="token",
+        expires_at=datetime.now(timezone.utc) + timedelta(hours=1),
+        user_info=user_info
+    )
+    cookie = auth_service.create_session_cookie("bench_session")
+    request = Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/api/chat/stream",
+        "headers": [(b"cookie", f"session_id={cookie}".encode("ascii"))],
+    })
+
+    try:
+        # A fresh request per call so cookie parsing is not cached
+        benchmark(lambda: get_current_user(Request(request.scope)))
+    finally:
+        del session_store["bench_session"]
+
+
+# Rate limiting
+
+def test_rate_limiter_acquire(benchmark):
+    limiter = RateLimiter({"chat": (1e9, 1e9)})
+    benchmark(limiter.acquire, "chat", "alice")
+
+
+def test_rate_limiter_acquire_new_keys_at_cap(benchmark):
+    # Every call is a new user with the limiter full, so each one evicts the least recently used bucket
+    limiter = RateLimiter({"chat": (1.0, 5)}, max_buckets=10_000)
+    keys = itertools.count()
+    for _ in range(limiter.max_buckets):
+        limiter.acquire("chat", f"user-{next(keys)}")
+    benchmark(lambda: limiter.acquire("chat", f"user-{next(keys)}"))
+
+
+# Pydantic models
+
+def test_construct_calendar_event(benchmark):
+    benchmark(
+        CalendarEvent,
+        id="event1",
+        summary="Weekly sync",
+        start_time=CURRENT_TIME,
+        end_time=CURRENT_TIME + timedelta(hours=1),
+        description="Agenda",
+        location="Room 1",
+        attendees=[{"email": "a@example.com"}, {"email": "b@example.com"}]
+    )
+
+
+def test_construct_user(benchmark):
+    benchmark(User, id="user1", email="user@example.com", name="User", picture="https://example.com/a.png")
+
+
+@pytest.mark.parametrize("history_length", [0, 10, 100])
+def test_parse_chat_request(benchmark, history_length):
+    payload = json.dumps({
+        "message": "What meetings do I have today?",
+        "timestamp": CURRENT_TIME.isoformat(),
+        "include_calendar_context": True,
+        "conversation_history": [
+            json.loads(message.model_dump_json()) for message in conversation_history(history_length)
+        ],
+    })
+
+    benchmark(ChatRequest.model_validate_json, payload)
+
+
+@pytest.mark.parametrize("size", CALENDAR_SIZES)
+def test_serialize_calendar_response(benchmark, size):
+    events = calendar_events(size)
+
+    benchmark(lambda: CalendarEventResponse(events=events, total_count=len(events), time_range="Next 7 days").model_dump_json())
@@ -0,0 +1,415 @@
+"""
+End-to-end load generator for the chat and calendar APIs.
+
+Drives ``/api/chat/stream``, ``/api/chat/`` and ``/api/v1/calendar/events``
+with a pool of logged-in sessions and reports throughput, time-to-first-token,
+inter-chunk gaps, latency percentiles and error rates per scenario.
+
+Sessions are created through the real OAuth callback, so the API must be
+pointed at the fake Google server (``app.fakes.google_api``). ``--spawn``
+starts both the fake and the API (with ``LLM_BACKEND=fake``) for you:
+
+    python -m bench.load_test --spawn --concurrency 50 --duration 30
+    python -m bench.load_test --base-url http://127.0.0.1:8000 --mix stream=80,calendar=20
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import secrets
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Optional, Dict, List, Any, Callable
+
+import httpx
+from pydantic import BaseModel
+
+DEFAULT_MESSAGES = [
+    "What meetings do I have today?",
+    "Am I free tomorrow afternoon?",
+    "Do I have any conflicts this week?",
+    "Give me a summary of my week.",
+    "When is my next one-on-one?",
+    "Find a 30 minute slot for a call on Friday.",
+]
+
+SCENARIOS = ("stream", "chat", "calendar")
+
+
+class LoadTestConfig(BaseModel):
+    base_url: str = "http://127.0.0.1:8000"
+    concurrency: int = 10
+    duration_s: float = 30.0
+    warmup_s: float = 0.0
+    sessions: int = 10
+    mix: Dict[str, float] = {"stream": 0.7, "chat": 0.2, "calendar": 0.1}
+    messages: List[str] = DEFAULT_MESSAGES
+    history_length: int = 0
+    include_calendar_context: bool = True
+    request_timeout_s: float = 60.0
+    seed: int = 0
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of ``values`` (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    """Percentile summary in milliseconds for a list of durations in seconds."""
+    summary = {}
+    for label, pct in (("p50", 50), ("p90", 90), ("p95", 95), ("p99", 99), ("max", 100)):
+        value = percentile(values, pct)
+        summary[label] = round(value * 1000, 2) if value is not None else None
+    return summary
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parse ``stream=70,chat=20,calendar=10`` into normalised weights."""
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}', expected one of {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Scenario mix must have a positive total weight")
+    return {name: weight / total for name, weight in weights.items()}
+
+
+class ScenarioStats:
+    """Samples collected for one scenario."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.requests = 0
+        self.latencies: List[float] = []
+        self.ttfts: List[float] = []
+        self.gaps: List[float] = []
+        self.errors: Dict[str, int] = {}
+
+    def record_error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def report(self, elapsed_s: float) -> Dict[str, Any]:
+        error_count = sum(self.errors.values())
+        report = {
+            "requests": self.requests,
+            "errors": error_count,
+            "error_rate": round(error_count / self.requests, 4) if self.requests else 0.0,
+            "throughput_rps": round((self.requests - error_count) / elapsed_s, 2) if elapsed_s else 0.0,
+            "latency_ms": summarize(self.latencies),
+            "errors_by_kind": dict(self.errors),
+        }
+        if self.name == "stream":
+            report["ttft_ms"] = summarize(self.ttfts)
+            report["inter_chunk_gap_ms"] = summarize(self.gaps)
+        return report
+
+
+class LoadGenerator:
+    """Runs a weighted mix of scenarios from ``concurrency`` workers."""
+
+    def __init__(
+        self,
+        config: LoadTestConfig,
+        client_factory: Optional[Callable[[], httpx.AsyncClient]] = None
+    ):
+        self.config = config
+        self.client_factory = client_factory or self._default_client
+        self._rng = random.Random(config.seed)
+        self.stats = {name: ScenarioStats(name) for name in SCENARIOS}
+
+    def _default_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=self.config.concurrency * 2)
+        return httpx.AsyncClient(
+            base_url=self.config.base_url,
+            timeout=self.config.request_timeout_s,
+            limits=limits,
+            # Logins run concurrently on one client; cookies are passed explicitly per request instead
+            cookies=CookieJar(DefaultCookiePolicy(allowed_domains=[]))
+        )
+
+    async def login(self, client: httpx.AsyncClient, user_key: str) -> str:
+        """Log in through the fake Google OAuth flow and return the session cookie."""
+        response = await client.get("/api/v1/auth/google")
+        authorize_url = response.headers["location"]
+        # The callback only accepts the state together with the cookie that binds it to this login
+        state_cookie = response.cookies.get("oauth_state")
+
+        response = await client.get(authorize_url, params={"login_hint": user_key})
+        callback_url = response.headers["location"]
+
+        response = await client.get(callback_url, headers={"Cookie": f"oauth_state={state_cookie}"})
+        session_id = response.cookies.get("session_id")
+        if not session_id:
+            raise RuntimeError(f"Login for {user_key} failed with status {response.status_code}")
+        return session_id
+
+    async def login_sessions(self, client: httpx.AsyncClient) -> List[str]:
+        return await asyncio.gather(*[
+            self.login(client, f"loaduser-{number}") for number in range(self.config.sessions)
+        ])
+
+    def _chat_payload(self) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc).isoformat()
+        payload = {
+            "message": self._rng.choice(self.config.messages),
+            "timestamp": now,
+            "include_calendar_context": self.config.include_calendar_context,
+        }
+        if self.config.history_length:
+            payload["conversation_history"] = [
+                {
+                    "id": f"h{number}",
+                    "content": self._rng.choice(self.config.messages),
+                    "role": "user" if number % 2 == 0 else "assistant",
+                    "timestamp": now,
+                }
+                for number in range(self.config.history_length)
+            ]
+        return payload
+
+    async def _run_stream(self, client: httpx.AsyncClient, headers: Dict[str, str], stats: ScenarioStats):
+        started = time.perf_counter()
+        first_chunk_at = last_chunk_at = None
+        gaps = []
+
+        async with client.stream("POST", "/api/chat/stream", json=self._chat_payload(), headers=headers) as response:
+            if response.status_code != 200:
+                await response.aread()
+                stats.record_error(f"http_{response.status_code}")
+                return
+
+            completed = False
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                data = json.loads(line[6:])
+                if data.get("error"):
+                    stats.record_error("stream_error")
+                    return
+                if data.get("isComplete"):
+                    completed = True
+                    break
+
+                now = time.perf_counter()
+                if first_chunk_at is None:
+                    first_chunk_at = now
+                else:
+                    gaps.append(now - last_chunk_at)
+                last_chunk_at = now
+
+            if not completed:
+                stats.record_error("stream_incomplete")
+                return
+
+        stats.latencies.append(time.perf_counter() - started)
+        if first_chunk_at is not None:
+            stats.ttfts.append(first_chunk_at - started)
+        stats.gaps.extend(gaps)
+
+    async def _run_chat(self, client: httpx.AsyncClient, headers: Dict[str, str], stats: ScenarioStats):
+        started = time.perf_counter()
+        response = await client.post("/api/chat/", json=self._chat_payload(), headers=headers)
+        if response.status_code != 200:
+            stats.record_error(f"http_{response.status_code}")
+            return
+        stats.latencies.append(time.perf_counter() - started)
+
+    async def _run_calendar(self, client: httpx.AsyncClient, headers: Dict[str, str], stats: ScenarioStats):
+        started = time.perf_counter()
+        response = await client.get("/api/v1/calendar/events", params={"days_ahead": 7}, headers=headers)
+        if response.status_code != 200:
+            stats.record_error(f"http_{response.status_code}")
+            return
+        stats.latencies.append(time.perf_counter() - started)
+
+    async def _worker(self, client: httpx.AsyncClient, sessions: List[str], measure_from: float, deadline: float):
+        runners = {"stream": self._run_stream, "chat": self._run_chat, "calendar": self._run_calendar}
+        names = list(self.config.mix)
+        weights = [self.config.mix[name] for name in names]
+
+        while time.perf_counter() < deadline:
+            name = self._rng.choices(names, weights)[0]
+            headers = {"Cookie": f"session_id={self._rng.choice(sessions)}"}
+            measuring = time.perf_counter() >= measure_from
+            stats = self.stats[name] if measuring else ScenarioStats(name)
+
+            stats.requests += 1
+            try:
+                await runners[name](client, headers, stats)
+            except httpx.TimeoutException:
+                stats.record_error("timeout")
+            except Exception as e:
+                stats.record_error(type(e).__name__)
+
+    async def run(self, sessions: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Run the load test and return the report."""
+        async with self.client_factory() as client:
+            if sessions is None:
+                sessions = await self.login_sessions(client)
+
+            start = time.perf_counter()
+            measure_from = start + self.config.warmup_s
+            deadline = measure_from + self.config.duration_s
+            await asyncio.gather(*[
+                self._worker(client, sessions, measure_from, deadline)
+                for _ in range(self.config.concurrency)
+            ])
+            elapsed = time.perf_counter() - measure_from
+
+        scenarios = {name: stats.report(elapsed) for name, stats in self.stats.items() if stats.requests}
+        total_requests = sum(stats.requests for stats in self.stats.values())
+        total_errors = sum(sum(stats.errors.values()) for stats in self.stats.values())
+        return {
+            "config": self.config.model_dump(exclude={"messages"}),
+            "elapsed_s": round(elapsed, 3),
+            "total": {
+                "requests": total_requests,
+                "errors": total_errors,
+                "error_rate": round(total_errors / total_requests, 4) if total_requests else 0.0,
+                "throughput_rps": round((total_requests - total_errors) / elapsed, 2) if elapsed else 0.0,
+            },
+            "scenarios": scenarios,
+        }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Render a report as a plain-text table."""
+    lines = [
+        f"Elapsed {report['elapsed_s']}s, {report['total']['requests']} requests, "
+        f"{report['total']['throughput_rps']} ok/s, error rate {report['total']['error_rate']:.2%}",
+        "",
+        f"{'scenario':<10} {'metric':<20} {'p50':>9} {'p90':>9} {'p95':>9} {'p99':>9} {'max':>9}",
+    ]
+    for name, scenario in report["scenarios"].items():
+        for metric in ("latency_ms", "ttft_ms", "inter_chunk_gap_ms"):
+            if metric not in scenario:
+                continue
+            values = scenario[metric]
+            cells = " ".join(f"{values[k]:>9.1f}" if values[k] is not None else f"{'-':>9}" for k in ("p50", "p90", "p95", "p99", "max"))
+            lines.append(f"{name:<10} {metric:<20} {cells}")
+        lines.append(
+            f"{name:<10} {'requests/errors':<20} {scenario['requests']:>9} {scenario['errors']:>9} "
+            f"({scenario['throughput_rps']} ok/s) {scenario['errors_by_kind'] or ''}"
+        )
+    return "\n".join(lines)
+
+
+class SpawnedStack:
+    """Starts the fake Google server and the API (with the fake LLM) as subprocesses."""
+
+    def __init__(self, api_port: int = 8000, google_port: int = 8081, extra_env: Optional[Dict[str, str]] = None):
+        self.api_port = api_port
+        self.google_port = google_port
+        self.extra_env = extra_env or {}
+        self.processes: List[subprocess.Popen] = []
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.api_port}"
+
+    def _env(self) -> Dict[str, str]:
+        google = f"http://127.0.0.1:{self.google_port}"
+        env = dict(os.environ)
+        env.update({
+            "LLM_BACKEND": "fake",
+            "GOOGLE_OAUTH_AUTHORIZE_URL": f"{google}/o/oauth2/v2/auth",
+            "GOOGLE_OAUTH_TOKEN_URL": f"{google}/token",
+            "GOOGLE_USERINFO_URL": f"{google}/oauth2/v2/userinfo",
+            "GOOGLE_OAUTH_CERTS_URL": f"{google}/oauth2/v3/certs",
+            "GOOGLE_CALENDAR_API_BASE_URL": f"{google}/calendar/v3",
+            "GOOGLE_OAUTH_REDIRECT_URI": f"{self.base_url}/api/v1/auth/google/callback",
+            # Load tests drive many requests per user on purpose
+            "RATE_LIMIT_ENABLED": "false",
+        })
+        # The API refuses to start without a session key; a throwaway one is fine for a load test
+        env.setdefault("SESSION_SECRET_KEY", secrets.token_hex(32))
+        env.update(self.extra_env)
+        return env
+
+    async def __aenter__(self) -> "SpawnedStack":
+        env = self._env()
+        for target, port in (("app.fakes.google_api:app", self.google_port), ("app.main:app", self.api_port)):
+            self.processes.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", target, "--port", str(port), "--log-level", "warning"],
+                env=env
+            ))
+        async with httpx.AsyncClient() as client:
+            for url in (f"http://127.0.0.1:{self.google_port}/_fake/stats", f"{self.base_url}/health"):
+                for _ in range(100):
+                    try:
+                        if (await client.get(url)).status_code == 200:
+                            break
+                    except httpx.TransportError:
+                        pass
+                    await asyncio.sleep(0.1)
+                else:
+                    raise RuntimeError(f"Timed out waiting for {url}")
+        return self
+
+    async def __aexit__(self, *exc_info):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.wait(timeout=10)
+
+
+async def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=LoadTestConfig.model_fields["base_url"].default)
+    parser.add_argument("--spawn", action="store_true", help="start the fake Google server and the API locally")
+    parser.add_argument("--api-port", type=int, default=8000)
+    parser.add_argument("--google-port", type=int, default=8081)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--warmup", type=float, default=0.0)
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--mix", type=parse_mix, default="stream=70,chat=20,calendar=10")
+    parser.add_argument("--history", type=int, default=0, help="conversation history messages sent per chat request")
+    parser.add_argument("--no-calendar-context", action="store_true")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json-out", help="write the JSON report to this path")
+    args = parser.parse_args(argv)
+
+    config = LoadTestConfig(
+        base_url=args.base_url,
+        concurrency=args.concurrency,
+        duration_s=args.duration,
+        warmup_s=args.warmup,
+        sessions=args.sessions,
+        mix=args.mix,
+        history_length=args.history,
+        include_calendar_context=not args.no_calendar_context,
+        request_timeout_s=args.timeout,
+        seed=args.seed,
+    )
+
+    if args.spawn:
+        async with SpawnedStack(args.api_port, args.google_port) as stack:
+            config.base_url = stack.base_url
+            report = await LoadGenerator(config).run()
+    else:
+        report = await LoadGenerator(config).run()
+
+    print(format_report(report))
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
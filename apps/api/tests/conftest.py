@@ -7,7 +7,9 @@ os.environ.setdefault("GOOGLE_OAUTH_CLIENT_ID", "test_client_id")
 os.environ.setdefault("GOOGLE_OAUTH_CLIENT_SECRET", "test_client_secret")
 os.environ.setdefault("GOOGLE_CLOUD_PROJECT_ID", "test_project_id")
 os.environ.setdefault("GOOGLE_CLOUD_CREDENTIALS_PATH", "test_credentials_path")
-os.environ.setdefault("SESSION_SECRET_KEY", "test_secret_key")
+os.environ.setdefault("SESSION_SECRET_KEY", "tests-only-session-secret-0123456789abcdef")
+# Tests reuse a handful of users and one client address; rate limit tests turn the limiter back on
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
 
 
 @pytest.fixture
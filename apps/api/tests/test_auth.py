@@ -1,14 +1,20 @@
+import asyncio
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 from fastapi.testclient import TestClient
 from fastapi import Request, HTTPException
 from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlparse
 
 from app.main import app
-from app.core.auth import AuthService, auth_service, session_store
+from app.core.auth import AuthService, auth_service, session_store, get_current_user, OAUTH_STATE_COOKIE, OAUTH_STATE_COOKIE_PATH
+from app.core.config import Settings
+from app.core.session_tokens import SessionTokenSigner, RevocationList, RedisRevocationSync
 from app.models.user import GoogleUserInfo, GoogleTokens, UserSession
 from app.services.secret_manager import MockSecretManagerService
 
+TEST_SECRET = "signer-test-secret-0123456789abcdefgh"
+
 
 @pytest.fixture
 def client():
@@ -146,6 +152,187 @@ class TestAuthService:
         assert result == session_id
 
 
+class TestSignedSessionCookies:
+    
+    @pytest.fixture
+    def signed_cookie(self, mock_google_user_info):
+        session = auth_service.create_user_session(mock_google_user_info, "mock_access_token")
+        return auth_service.create_session_cookie(session.session_id, session)
+    
+    def test_cookie_authenticates_without_session_store(self, client, signed_cookie):
+        """Test a signed cookie is enough to authenticate on a worker that never saw the login"""
+        client.cookies.set("session_id", signed_cookie)
+        
+        response = client.get("/api/v1/auth/me")
+        
+        assert response.status_code == 200
+        assert response.json()["email"] == "test@example.com"
+    
+    def test_tampered_cookie_rejected(self, client, signed_cookie):
+        """Test a cookie whose payload was changed fails the signature check"""
+        body, _, signature = signed_cookie.rpartition(".")
+        forged = SessionTokenSigner("another-secret-0123456789abcdefghijk").encode({"sid": "x", "uid": "admin", "exp": 2 ** 32})
+        
+        for cookie in [forged, body[:-2] + "AA." + signature]:
+            client.cookies.set("session_id", cookie)
+            assert client.get("/api/v1/auth/me").status_code == 401
+    
+    @pytest.mark.parametrize("secret", [
+        Settings.model_fields["session_secret_key"].default, "test_secret_key", "a-very-secret-key-for-local-dev",
+        "short-secret"
+    ])
+    def test_weak_secret_rejected(self, secret):
+        """Test the default, placeholder and short secrets cannot sign or verify cookies"""
+        with pytest.raises(ValueError, match="SESSION_SECRET_KEY"):
+            SessionTokenSigner(secret)
+    
+    def test_expired_cookie_rejected(self):
+        """Test tokens are rejected after their expiry"""
+        signer = SessionTokenSigner(TEST_SECRET)
+        token = signer.encode({"sid": "abc", "exp": 1000})
+        
+        assert signer.decode(token, now=999) == {"sid": "abc", "exp": 1000}
+        assert signer.decode(token, now=1000) is None
+    
+    def test_unsigned_session_id_rejected(self, client, mock_user_session):
+        """Test a bare session id is refused, even for a stored session, unless migrating from unsigned cookies"""
+        session_store[mock_user_session.session_id] = mock_user_session
+        client.cookies.set("session_id", mock_user_session.session_id)
+        try:
+            assert client.get("/api/v1/auth/me").status_code == 401
+            assert auth_service.validate_session_cookie(mock_user_session.session_id) is None
+            
+            with patch.object(auth_service, "accept_unsigned_session_ids", True):
+                assert client.get("/api/v1/auth/me").status_code == 200
+        finally:
+            session_store.pop(mock_user_session.session_id, None)
+    
+    def test_logout_revokes_cookie(self, client, signed_cookie):
+        """Test a logged-out cookie is rejected even though its signature is still valid"""
+        client.cookies.set("session_id", signed_cookie)
+        client.get("/api/v1/auth/logout", follow_redirects=False)
+        client.cookies.set("session_id", signed_cookie)
+        
+        assert client.get("/api/v1/auth/me").status_code == 401
+    
+    def test_encrypted_cookie_round_trip(self):
+        """Test encrypted tokens hide the claims and still decode"""
+        signer = SessionTokenSigner(TEST_SECRET, encrypt=True)
+        token = signer.encode({"sid": "abc", "email": "test@example.com", "exp": 2 ** 32})
+        
+        assert token.startswith("v1e.")
+        assert "test@example.com" not in token
+        assert signer.decode(token)["email"] == "test@example.com"
+        assert SessionTokenSigner("other-secret-0123456789abcdefghijklm", encrypt=True).decode(token) is None
+    
+    def test_revocation_list_forgets_expired_entries(self):
+        """Test revocations are only kept until the token would have expired"""
+        revoked = RevocationList()
+        revoked.revoke("old", expires_at=1)
+        revoked.revoke("new", expires_at=2 ** 32)
+        
+        assert revoked.is_revoked("new")
+        assert not revoked.is_revoked("old")
+        assert len(revoked) == 1
+    
+    @pytest.mark.asyncio
+    async def test_revocations_exchanged_with_other_workers(self):
+        """Test revocations are published and pulled in the background, never looked up per request"""
+        class FakeSync:
+            def __init__(self):
+                self.published = []
+                self.remote = [("other-worker-sid", 2 ** 32, 1000.0)]
+            
+            def exchange(self, revoked):
+                self.published.extend(revoked)
+                remote, self.remote = self.remote, []
+                return remote
+        
+        sync = FakeSync()
+        revoked = RevocationList(sync, sync_interval=0.01)
+        revoked.revoke("local-sid", expires_at=2 ** 32)
+        assert revoked.is_revoked("local-sid")
+        
+        revoked.start()
+        await asyncio.sleep(0.05)
+        await revoked.stop()
+        
+        assert [key for key, _, _ in sync.published] == ["local-sid"]
+        assert revoked.is_revoked("other-worker-sid")
+        assert revoked.revoked_at("other-worker-sid") == 1000.0
+
+
+class TestRedisRevocationSync:
+    
+    def test_exchange_reads_only_recent_revocations(self):
+        """Test each exchange publishes local revocations and reads from where the last one stopped"""
+        with patch("app.core.session_tokens.redis") as redis_module:
+            pipeline = redis_module.Redis.from_url.return_value.pipeline.return_value
+            sync = RedisRevocationSync("redis://localhost", "revoked_session", retention=86400, overlap=5)
+            
+            pipeline.execute.return_value = [1, [(b"4102444800.0:sid:with:colons", 1000.0)], 0]
+            assert sync.exchange([("sid:with:colons", 4102444800.0, 1000.0)]) == [
+                ("sid:with:colons", 4102444800.0, 1000.0)
+            ]
+            pipeline.zadd.assert_called_once_with(
+                "revoked_session:revocations", {"4102444800.0:sid:with:colons": 1000.0}
+            )
+            
+            pipeline.execute.return_value = [[], 0]
+            assert sync.exchange([]) == []
+            assert pipeline.zrangebyscore.call_args.args[1] == 995.0
+
+
+class TestCachedPrincipal:
+    
+    @staticmethod
+    def request_with_cookie(cookie):
+        return Mock(cookies={"session_id": cookie})
+    
+    def test_stored_session_reuses_principal(self, mock_user_session, mock_google_user_info):
+        """Test the User for a stored session is built once and rebuilt when its user info changes"""
+        mock_user_session.user_info = mock_google_user_info
+        session_store[mock_user_session.session_id] = mock_user_session
+        request = self.request_with_cookie(auth_service.create_session_cookie(mock_user_session.session_id))
+        try:
+            first = get_current_user(request)
+            assert get_current_user(request) is first
+            
+            mock_user_session.user_info = mock_google_user_info.model_copy(update={"name": "Renamed"})
+            renamed = get_current_user(request)
+            assert renamed is not first
+            assert renamed.name == "Renamed"
+        finally:
+            session_store.pop(mock_user_session.session_id, None)
+    
+    def test_signed_cookie_reuses_principal(self, mock_google_user_info):
+        """Test a self-contained cookie is resolved once, and a revoked one is not served from the cache"""
+        session = auth_service.create_user_session(mock_google_user_info, "mock_access_token")
+        cookie = auth_service.create_session_cookie(session.session_id, session)
+        request = self.request_with_cookie(cookie)
+        
+        first = get_current_user(request)
+        assert get_current_user(request) is first
+        
+        auth_service.revoke_session_cookie(cookie)
+        assert get_current_user(request) is None
+    
+    def test_status_serves_cached_json(self, client, mock_user_session, mock_google_user_info):
+        """Test /auth/status returns the same payload shape from the cached JSON"""
+        mock_user_session.user_info = mock_google_user_info
+        session_store[mock_user_session.session_id] = mock_user_session
+        client.cookies.set("session_id", auth_service.create_session_cookie(mock_user_session.session_id))
+        try:
+            response = client.get("/api/v1/auth/status")
+        finally:
+            session_store.pop(mock_user_session.session_id, None)
+        
+        assert response.status_code == 200
+        assert response.json()["authenticated"] is True
+        assert response.json()["user"]["email"] == "test@example.com"
+        assert response.json()["user"]["id"] == "123456789"
+
+
 class TestMockSecretManagerService:
     
     @patch('app.services.secret_manager.MockSecretManagerService')
@@ -221,6 +408,55 @@ class TestAuthEndpoints:
         assert response.status_code == 400
         assert "OAuth error: access_denied" in response.json()["detail"]
     
+    def test_auth_callback_rejects_unknown_state(self, client):
+        """Test OAuth callback with a state this server never issued"""
+        with patch.object(auth_service, "exchange_code_for_tokens") as exchange:
+            response = client.get("/api/v1/auth/google/callback?code=code&state=forged")
+        
+        assert response.status_code == 400
+        assert "Invalid or expired OAuth state" in response.json()["detail"]
+        exchange.assert_not_called()
+    
+    def test_auth_state_is_single_use(self, client):
+        """Test the state issued by /auth/google is accepted by the callback exactly once"""
+        location = client.get("/api/v1/auth/google", follow_redirects=False).headers["location"]
+        state = parse_qs(urlparse(location).query)["state"][0]
+        
+        with patch.object(auth_service, "exchange_code_for_tokens", return_value=None):
+            first = client.get(f"/api/v1/auth/google/callback?code=code&state={state}")
+            replay = client.get(f"/api/v1/auth/google/callback?code=code&state={state}")
+        
+        assert first.json()["detail"] == "Failed to exchange code for tokens"
+        assert replay.json()["detail"] == "Invalid or expired OAuth state"
+    
+    def test_auth_state_sets_browser_cookie(self, client):
+        """Test /auth/google binds the state to the browser with an HttpOnly, SameSite=Lax cookie"""
+        response = client.get("/api/v1/auth/google", follow_redirects=False)
+        state = parse_qs(urlparse(response.headers["location"]).query)["state"][0]
+        
+        cookie = response.headers["set-cookie"]
+        assert cookie.startswith(f"{OAUTH_STATE_COOKIE}={state};")
+        assert "HttpOnly" in cookie
+        assert "SameSite=lax" in cookie
+        assert f"Path={OAUTH_STATE_COOKIE_PATH}" in cookie
+    
+    def test_auth_state_requires_matching_cookie(self, client):
+        """Test a valid state is refused in a browser that did not start the login (login CSRF)"""
+        location = client.get("/api/v1/auth/google", follow_redirects=False).headers["location"]
+        state = parse_qs(urlparse(location).query)["state"][0]
+        
+        with patch.object(auth_service, "exchange_code_for_tokens") as exchange:
+            client.cookies.clear()
+            missing = client.get(f"/api/v1/auth/google/callback?code=code&state={state}")
+            client.cookies.set(OAUTH_STATE_COOKIE, "someone-elses-state", path=OAUTH_STATE_COOKIE_PATH)
+            mismatched = client.get(f"/api/v1/auth/google/callback?code=code&state={state}")
+        
+        assert missing.status_code == 400
+        assert mismatched.status_code == 400
+        exchange.assert_not_called()
+        # Not consumed: the browser that holds the cookie can still finish its login
+        assert asyncio.run(auth_service.consume_oauth_state(state, state))
+    
     def test_auth_status_unauthenticated(self, client):
         """Test auth status when not authenticated"""
         response = client.get("/api/v1/auth/status")
@@ -3,11 +3,11 @@ from datetime import datetime, timezone, timedelta
 from unittest.mock import Mock, patch, MagicMock
 from fastapi.testclient import TestClient
 from app.main import app
-from app.models.user import User, UserSession, GoogleUserInfo
+from app.models.user import User, UserSession, GoogleUserInfo, GoogleTokens
 from app.models.calendar import CalendarEvent
 from app.core.auth import auth_service
-from app.services.calendar_service import calendar_service
-from app.services.secret_manager import secret_manager
+from app.services.calendar_service import CalendarService, calendar_service
+from app.services.secret_manager import async_secret_manager
 
 
 @pytest.fixture
@@ -107,7 +107,7 @@ class TestCalendarEndpoints:
             session_store["test_session_id"] = session
             
             # Set session cookie for authentication
-            client.cookies.set("session_id", "test_session_id")
+            client.cookies.set("session_id", auth_service.create_session_cookie("test_session_id"))
             
             response = client.get("/api/v1/calendar/events")
             
@@ -146,7 +146,7 @@ class TestCalendarEndpoints:
             session_store["test_session_id"] = session
             
             # Set session cookie for authentication
-            client.cookies.set("session_id", "test_session_id")
+            client.cookies.set("session_id", auth_service.create_session_cookie("test_session_id"))
             
             response = client.get("/api/v1/calendar/events?days_ahead=14")
             
@@ -181,7 +181,7 @@ class TestCalendarEndpoints:
         session_store["test_session_id"] = session
         
         # Set session cookie for authentication
-        client.cookies.set("session_id", "test_session_id")
+        client.cookies.set("session_id", auth_service.create_session_cookie("test_session_id"))
         
         response = client.get("/api/v1/calendar/events?days_ahead=0")
         assert response.status_code == 422
@@ -217,7 +217,7 @@ class TestCalendarEndpoints:
             session_store["test_session_id"] = session
             
             # Set session cookie for authentication
-            client.cookies.set("session_id", "test_session_id")
+            client.cookies.set("session_id", auth_service.create_session_cookie("test_session_id"))
             
             response = client.get("/api/v1/calendar/events")
             
@@ -251,7 +251,7 @@ class TestCalendarEndpoints:
         session_store["test_session_id"] = session
         
         # Set session cookie for authentication
-        client.cookies.set("session_id", "test_session_id")
+        client.cookies.set("session_id", auth_service.create_session_cookie("test_session_id"))
         
         response = client.get("/api/v1/calendar/events/event1")
         
@@ -264,7 +264,8 @@ class TestCalendarEndpoints:
 
 class TestCalendarService:
     
-    def test_refresh_access_token_success(self):
+    @pytest.mark.asyncio
+    async def test_refresh_access_token_success(self):
         """Test successful access token refresh"""
         with patch('requests.post') as mock_post:
             mock_post.return_value.status_code = 200
@@ -274,21 +275,23 @@ class TestCalendarService:
                 "token_type": "Bearer"
             }
             
-            with patch.object(secret_manager, 'get_refresh_token', return_value="test_refresh_token"):
-                tokens = calendar_service.refresh_access_token("test_user_id")
+            with patch.object(async_secret_manager, 'get_refresh_token', return_value="test_refresh_token"):
+                tokens = await calendar_service.refresh_access_token("test_user_id")
                 
                 assert tokens is not None
                 assert tokens.access_token == "new_access_token"
                 assert tokens.refresh_token == "test_refresh_token"
     
-    def test_refresh_access_token_no_refresh_token(self):
+    @pytest.mark.asyncio
+    async def test_refresh_access_token_no_refresh_token(self):
         """Test refresh access token when no refresh token exists"""
-        with patch.object(secret_manager, 'get_refresh_token', return_value=None):
-            tokens = calendar_service.refresh_access_token("test_user_id")
+        with patch.object(async_secret_manager, 'get_refresh_token', return_value=None):
+            tokens = await calendar_service.refresh_access_token("test_user_id")
             
             assert tokens is None
     
-    def test_get_user_access_token_valid_session(self):
+    @pytest.mark.asyncio
+    async def test_get_user_access_token_valid_session(self):
         """Test getting access token from valid session"""
         user_info = GoogleUserInfo(
             id="test_user_id",
@@ -310,14 +313,15 @@ class TestCalendarService:
         from app.core.auth import session_store
         session_store["test_session_id"] = session
         
-        token = calendar_service.get_user_access_token("test_user_id")
+        token = await calendar_service.get_user_access_token("test_user_id")
         
         assert token == "valid_token"
         
         # Clean up
         del session_store["test_session_id"]
     
-    def test_get_user_access_token_expired_session(self):
+    @pytest.mark.asyncio
+    async def test_get_user_access_token_expired_session(self):
         """Test getting access token when session is expired"""
         user_info = GoogleUserInfo(
             id="test_user_id",
@@ -340,13 +344,37 @@ class TestCalendarService:
         session_store["test_session_id"] = session
         
         with patch.object(calendar_service, 'refresh_access_token', return_value=None):
-            token = calendar_service.get_user_access_token("test_user_id")
+            token = await calendar_service.get_user_access_token("test_user_id")
             
             assert token is None
         
         # Clean up
         del session_store["test_session_id"]
     
+    @pytest.mark.asyncio
+    async def test_access_tokens_without_session_are_bounded(self):
+        """Test cached access tokens are capped, least recently used first, and expired ones are dropped"""
+        service = CalendarService(max_access_tokens=2)
+        expires_in = {"alice": 3600, "bob": 3600, "carol": 3600, "dave": 0}
+        
+        async def refresh(user_id):
+            return GoogleTokens(
+                access_token=f"{user_id}-token", refresh_token="refresh", expires_in=expires_in[user_id]
+            )
+        
+        with patch.object(service, "refresh_access_token", side_effect=refresh) as refresh_access_token:
+            assert await service.get_user_access_token("alice") == "alice-token"
+            assert await service.get_user_access_token("bob") == "bob-token"
+            assert await service.get_user_access_token("alice") == "alice-token"
+            assert refresh_access_token.call_count == 2
+            
+            await service.get_user_access_token("carol")
+            assert list(service.access_tokens) == ["alice", "carol"]
+            
+            # A token too close to expiry to be reused is not cached, so it evicts nobody
+            await service.get_user_access_token("dave")
+            assert list(service.access_tokens) == ["alice", "carol"]
+    
     def test_transform_google_event_datetime(self):
         """Test transforming Google Calendar event with datetime"""
         google_event = {
@@ -0,0 +1,165 @@
+import asyncio
+import pytest
+from unittest.mock import Mock, patch
+from app.core.metrics import llm_streams_cancelled_total, llm_cancelled_tokens_saved_total
+from app.services.fake_llm import FakeLLMBackend
+from app.services.llm_service import LLMService, GeminiBackend
+from app.services.response_streams import ResponseStream
+from app.utils.streaming import StreamingUtils
+
+
+class TrackingBackend(FakeLLMBackend):
+    """Fake backend that records whether its stream was closed early."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.closed_early = False
+        self.chunks_sent = 0
+
+    async def stream(self, prompt, generation_config):
+        finished = False
+        try:
+            async for chunk in super().stream(prompt, generation_config):
+                self.chunks_sent += 1
+                yield chunk
+            finished = True
+        finally:
+            self.closed_early = not finished
+
+
+def slow_backend():
+    return TrackingBackend(ttft_ms=0, inter_token_ms=20, latency_sigma=0, response_tokens=100)
+
+
+class TestLLMCancellation:
+
+    @pytest.mark.asyncio
+    async def test_closing_response_cancels_backend_stream(self):
+        """Test closing generate_response closes the backend stream and counts saved tokens"""
+        backend = slow_backend()
+        service = LLMService(backend=backend)
+        service.average_completion_tokens = 100
+        cancelled_before = llm_streams_cancelled_total.value
+        saved_before = llm_cancelled_tokens_saved_total.value
+
+        response = service.generate_response("Hello", stream=True)
+        for _ in range(3):
+            await response.__anext__()
+        await response.aclose()
+
+        assert backend.closed_early
+        assert backend.chunks_sent == 3
+        assert llm_streams_cancelled_total.value == cancelled_before + 1
+        assert llm_cancelled_tokens_saved_total.value > saved_before
+
+    @pytest.mark.asyncio
+    async def test_completed_stream_updates_average(self):
+        """Test finished streams feed the average used for the savings estimate"""
+        backend = TrackingBackend(ttft_ms=0, inter_token_ms=0, response_tokens=20)
+        service = LLMService(backend=backend)
+
+        chunks = [chunk async for chunk in service.generate_response("Hello", stream=True)]
+
+        assert chunks
+        assert not backend.closed_early
+        assert service.average_completion_tokens > 0
+
+    @pytest.mark.asyncio
+    async def test_stream_generator_close_reaches_llm(self):
+        """Test closing the SSE generator promptly cancels the upstream stream"""
+        backend = slow_backend()
+        service = LLMService(backend=backend)
+
+        frames = StreamingUtils.create_stream_generator(service.generate_response("Hello", stream=True), "resp")
+        await frames.__anext__()
+        await frames.aclose()
+
+        assert backend.closed_early
+        assert backend.chunks_sent == 1
+
+    @staticmethod
+    def gemini_backend():
+        with patch('app.services.llm_service.genai'):
+            backend = GeminiBackend("key")
+
+        closed = []
+
+        def sdk_chunks():
+            try:
+                for i in range(10):
+                    yield Mock(text=f"token {i} ")
+            finally:
+                closed.append(True)
+
+        response = Mock()
+        response.__iter__ = Mock(return_value=sdk_chunks())
+        backend.model = Mock()
+        backend.model.generate_content.return_value = response
+        return backend, response, closed
+
+    @pytest.mark.asyncio
+    async def test_gemini_stream_closes_sdk_iterator(self):
+        """Test an abandoned Gemini stream closes the SDK iterator and cancels its gRPC call"""
+        backend, response, closed = self.gemini_backend()
+
+        stream = backend.stream("Hello", {})
+        assert await stream.__anext__() == "token 0 "
+        await stream.aclose()
+
+        assert closed == [True]
+        response._iterator.cancel.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_private_iterator_left_alone_on_unknown_sdk_versions(self):
+        """Test the private _iterator fallback is skipped when the SDK version is not known to have it"""
+        backend, response, closed = self.gemini_backend()
+
+        with patch('app.services.llm_service._CANCEL_PRIVATE_ITERATOR', False):
+            stream = backend.stream("Hello", {})
+            await stream.__anext__()
+            await stream.aclose()
+
+        assert closed == [True]
+        response._iterator.cancel.assert_not_called()
+
+
+class TestAbandonedResponseStream:
+
+    @staticmethod
+    async def frames(backend):
+        service = LLMService(backend=backend)
+        async for frame in StreamingUtils.create_stream_generator(service.generate_response("Hello", stream=True), "resp"):
+            yield frame
+
+    @pytest.mark.asyncio
+    async def test_generation_cancelled_when_reader_does_not_return(self):
+        """Test generation stops once the last reader has been gone for the grace period"""
+        backend = slow_backend()
+        stream = ResponseStream("resp", "user", max_bytes=65536, ttl=60, abandon_grace=0.05)
+        stream.start(self.frames(backend))
+
+        reader = stream.subscribe()
+        await reader.__anext__()
+        await reader.aclose()
+        await asyncio.sleep(0.15)
+
+        assert stream.done
+        assert backend.closed_early
+        assert backend.chunks_sent < 100
+        assert b"Response cancelled" in stream.frames[-1]
+
+    @pytest.mark.asyncio
+    async def test_reconnect_within_grace_keeps_generating(self):
+        """Test a reader reconnecting inside the grace period keeps generation alive"""
+        backend = TrackingBackend(ttft_ms=0, inter_token_ms=5, latency_sigma=0, response_tokens=20)
+        stream = ResponseStream("resp", "user", max_bytes=65536, ttl=60, abandon_grace=0.05)
+        stream.start(self.frames(backend))
+
+        reader = stream.subscribe()
+        await reader.__anext__()
+        await reader.aclose()
+        await asyncio.sleep(0.01)
+        frames = [frame async for frame in stream.subscribe(1)]
+
+        assert not backend.closed_early
+        assert b'"isComplete":true' in frames[-1]
@@ -1,3 +1,4 @@
+import json
 import pytest
 from datetime import datetime
 from unittest.mock import Mock, patch, AsyncMock
@@ -6,6 +7,8 @@ from app.models.chat import ChatRequest, ChatResponse, ChatMessage
 from app.models.user import User
 from app.models.calendar import CalendarEvent
 from app.services.chat_service import ChatService
+from app.services.conversation_store import conversation_store
+from app.services.fake_llm import FakeLLMBackend
 
 
 @pytest.fixture
@@ -131,10 +134,10 @@ async def test_process_message_streaming(chat_service, test_user, test_events, t
         
         # Check that we got SSE-formatted chunks
         assert len(response_chunks) >= 2
-        assert "data:" in response_chunks[0]
-        assert "Hello" in response_chunks[0]
-        assert "data:" in response_chunks[1]
-        assert "world!" in response_chunks[1]
+        assert b"data:" in response_chunks[0]
+        assert b"Hello" in response_chunks[0]
+        assert b"data:" in response_chunks[1]
+        assert b"world!" in response_chunks[1]
 
 
 @pytest.mark.asyncio
@@ -218,4 +221,98 @@ async def test_process_message_error_handling(chat_service, test_user):
     
     response = await chat_service.process_message(request, test_user)
     
-    assert "having trouble" in response.response
\ No newline at end of file
+    assert "having trouble" in response.response
+
+
+@pytest.mark.asyncio
+async def test_process_message_streaming_coalesces_chunks(chat_service):
+    """Test many tiny LLM chunks are batched into fewer SSE frames"""
+    test_user = User(id="test_user", email="test@example.com", name="Test User")
+    backend = FakeLLMBackend(ttft_ms=0, inter_token_ms=0, response_tokens=200)
+    request = ChatRequest(
+        message="Hello",
+        timestamp=datetime.now(),
+        include_calendar_context=False,
+        stream_coalesce_ms=1000,
+        stream_coalesce_bytes=256
+    )
+
+    with patch.object(chat_service.llm_service, "backend", backend):
+        frames = [frame async for frame in chat_service.process_message_streaming(request, test_user)]
+
+    content_frames = [json.loads(frame[6:]) for frame in frames[:-1]]
+    assert 2 <= len(content_frames) < 200
+    assert all(len(frame["content"].encode()) <= 256 + 32 for frame in content_frames[1:])
+    assert json.loads(frames[-1][6:])["isComplete"] is True
+
+
+@pytest.mark.asyncio
+async def test_conversation_history_kept_server_side(chat_service, test_user, test_history):
+    """Test a conversation id makes the server supply the history to later messages"""
+    def reply(text):
+        async def stream():
+            yield text
+        return stream()
+
+    first = ChatRequest(
+        message="When is my dentist appointment?",
+        timestamp=datetime(2023, 12, 1, 9, 5),
+        include_calendar_context=False,
+        conversation_history=test_history,
+        conversation_id="history-test"
+    )
+    second = ChatRequest(
+        message="Move it to Friday",
+        timestamp=datetime(2023, 12, 1, 9, 6),
+        include_calendar_context=False,
+        conversation_id="history-test"
+    )
+    summary_backend = FakeLLMBackend(ttft_ms=0, inter_token_ms=0, response_text="User said hello.")
+
+    try:
+        with patch.object(chat_service.llm_service, 'generate_response') as mock_generate, \
+             patch.object(chat_service.llm_service, 'backend', summary_backend):
+            mock_generate.return_value = reply("It is on Thursday.")
+            await chat_service.process_message(first, test_user)
+            mock_generate.return_value = reply("Done.")
+            await chat_service.process_message(second, test_user)
+            await chat_service.summarizer.wait_idle()
+
+        prompt = mock_generate.call_args.kwargs["prompt"]
+        assert "User: Hello" in prompt
+        assert "User: When is my dentist appointment?" in prompt
+        assert "Assistant: It is on Thursday." in prompt
+
+        conversation = conversation_store.get(test_user.id, "history-test")
+        assert conversation.message_count == 6
+        assert len(conversation.fragments) == conversation.max_messages
+        assert conversation.summary == "User said hello."
+        assert conversation_store.get("someone-else", "history-test") is None
+    finally:
+        conversation_store.delete(test_user.id, "history-test")
+
+
+@pytest.mark.asyncio
+async def test_failed_generation_not_remembered(chat_service, test_user):
+    """Test an apology sent for a failed LLM call does not become an assistant turn in the conversation"""
+    backend = FakeLLMBackend(ttft_ms=0, inter_token_ms=0, error_rate=1.0)
+    request = ChatRequest(
+        message="What is on today?",
+        timestamp=datetime.now(),
+        include_calendar_context=False,
+        conversation_id="failure-test"
+    )
+
+    try:
+        with patch.object(chat_service.llm_service, "backend", backend), \
+             patch("app.services.llm_service.asyncio.sleep"):
+            frames = [frame async for frame in chat_service.process_message_streaming(request, test_user)]
+            response = await chat_service.process_message(request, test_user)
+
+        # Whether it failed before or after the first chunk, the client got an apology
+        assert any("I'm sorry" in json.loads(frame[6:])["content"] for frame in frames)
+        assert "I'm sorry" in response.response
+        conversation = conversation_store.get(test_user.id, "failure-test")
+        assert conversation is None or conversation.message_count == 0
+    finally:
+        conversation_store.delete(test_user.id, "failure-test")
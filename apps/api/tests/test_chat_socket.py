@@ -0,0 +1,134 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from app.main import app
+from app.core.auth import auth_service, session_store
+from app.models.user import UserSession, GoogleUserInfo
+from app.services.chat_service import chat_service
+from app.services.fake_llm import FakeLLMBackend
+
+
+def chat(message_id, text="What is on today?"):
+    return {
+        "type": "chat",
+        "id": message_id,
+        "request": {
+            "message": text,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "include_calendar_context": False,
+            "stream_coalesce_ms": 0
+        }
+    }
+
+
+def receive_until_done(websocket, ids):
+    """Collect server messages until every id in ``ids`` has finished."""
+    chunks = {message_id: [] for message_id in ids}
+    endings = {}
+    while len(endings) < len(ids):
+        message = websocket.receive_json()
+        if message["type"] == "chunk":
+            chunks[message["id"]].append(message["content"])
+        else:
+            endings[message["id"]] = message
+    return chunks, endings
+
+
+class TestChatWebSocket:
+
+    @pytest.fixture
+    def client(self):
+        user_info = GoogleUserInfo(
+            id="socket_user", email="socket@example.com", name="Socket User",
+            picture="https://example.com/avatar.jpg", verified_email=True
+        )
+        session_store["socket_session"] = UserSession(
+            user_id="socket_user",
+            session_id="socket_session",
+            access_token="valid_token",
+            expires_at=datetime.now(timezone.utc) + timedelta(hours=1),
+            user_info=user_info
+        )
+        client = TestClient(app)
+        client.cookies.update({"session_id": auth_service.create_session_cookie("socket_session")})
+        yield client
+        session_store.pop("socket_session", None)
+
+    def test_requires_session(self):
+        """Test a socket without a session cookie is closed during the handshake"""
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            with TestClient(app).websocket_connect("/api/chat/ws"):
+                pass
+
+        assert exc_info.value.code == 1008
+
+    def test_concurrent_conversations_on_one_socket(self, client):
+        """Test two responses stream at once and are told apart by message id"""
+        backend = FakeLLMBackend(ttft_ms=0, inter_token_ms=1, latency_sigma=0, response_tokens=10)
+        with patch.object(chat_service.llm_service, "backend", backend):
+            with client.websocket_connect("/api/chat/ws") as websocket:
+                websocket.send_json(chat("first"))
+                websocket.send_json(chat("second"))
+                chunks, endings = receive_until_done(websocket, ["first", "second"])
+
+        assert endings["first"]["type"] == "complete"
+        assert endings["second"]["type"] == "complete"
+        assert chunks["first"] and chunks["second"]
+
+    def test_cancel_stops_generation(self, client):
+        """Test a cancel message ends that response and leaves the socket usable"""
+        backend = FakeLLMBackend(ttft_ms=0, inter_token_ms=20, latency_sigma=0, response_tokens=200)
+        with patch.object(chat_service.llm_service, "backend", backend):
+            with client.websocket_connect("/api/chat/ws") as websocket:
+                websocket.send_json(chat("slow"))
+                assert websocket.receive_json()["type"] == "chunk"
+                websocket.send_json({"type": "cancel", "id": "slow"})
+                chunks, endings = receive_until_done(websocket, ["slow"])
+
+                websocket.send_json({"type": "ping"})
+                pong = websocket.receive_json()
+
+        assert endings["slow"]["type"] == "cancelled"
+        assert len(chunks["slow"]) < 199
+        assert pong == {"type": "pong"}
+
+    def test_invalid_messages_get_errors(self, client):
+        """Test malformed messages are answered with errors instead of closing the socket"""
+        with client.websocket_connect("/api/chat/ws") as websocket:
+            websocket.send_json({"type": "chat", "request": {}})
+            missing_id = websocket.receive_json()
+            websocket.send_json({"type": "chat", "id": "bad", "request": {"message": "hi"}})
+            invalid = websocket.receive_json()
+            websocket.send_json({"type": "shout", "id": "x"})
+            unknown = websocket.receive_json()
+
+        assert missing_id["type"] == "error" and missing_id["id"] is None
+        assert invalid["type"] == "error" and invalid["id"] == "bad"
+        assert "Unknown message type" in unknown["error"]
+
+    def test_binary_frame_closes_with_unsupported_data(self, client):
+        """Test a binary frame gets an error and closes the socket with 1003"""
+        with client.websocket_connect("/api/chat/ws") as websocket:
+            websocket.send_bytes(b'{"type": "ping"}')
+            error = websocket.receive_json()
+            with pytest.raises(WebSocketDisconnect) as exc_info:
+                websocket.receive_json()
+
+        assert error["type"] == "error" and "text frames" in error["error"]
+        assert exc_info.value.code == 1003
+
+    def test_cross_origin_handshake_rejected(self, client):
+        """Test a handshake from a page on another origin is refused before the cookie is used"""
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            with client.websocket_connect("/api/chat/ws", headers={"Origin": "https://evil.example"}):
+                pass
+
+        assert exc_info.value.code == 1008
+
+    def test_allowed_origin_accepted(self, client):
+        """Test a handshake from a configured CORS origin is accepted"""
+        with client.websocket_connect("/api/chat/ws", headers={"Origin": "http://localhost:3000"}) as websocket:
+            websocket.send_json({"type": "ping"})
+            assert websocket.receive_json() == {"type": "pong"}
@@ -0,0 +1,128 @@
+import time
+import pytest
+from app.services.conversation_store import ConversationStore
+from app.services.conversation_summarizer import ConversationSummarizer
+from app.services.fake_llm import FakeLLMBackend
+from app.services.llm_service import LLMService
+
+
+def fragment(number, role="User"):
+    return f"09:0{number % 10} AM - {role}: Message {number}. It has a second sentence."
+
+
+class TestConversationStore:
+
+    def test_history_includes_summary_and_verbatim_messages(self):
+        """Test the prompt history is the running summary followed by the kept messages"""
+        store = ConversationStore(ttl=60, max_messages=2)
+        conversation = store.get_or_create("user", "conv")
+        for number in range(4):
+            conversation.append(f"line {number}")
+
+        assert conversation.needs_compaction()
+        assert conversation.compaction_batch() == ["line 0", "line 1"]
+        # Nothing is dropped before the summary exists
+        assert conversation.history_text() == "line 0\nline 1\nline 2\nline 3"
+
+        conversation.apply_summary("Earlier stuff.", 2)
+
+        assert not conversation.needs_compaction()
+        assert conversation.message_count == 4
+        assert conversation.history_text() == "Summary of the earlier conversation: Earlier stuff.\nline 2\nline 3"
+
+    def test_history_text_cache_invalidated_on_append(self):
+        """Test the joined history is rebuilt after a new message"""
+        conversation = ConversationStore(ttl=60).get_or_create("user", "conv")
+        conversation.append("first")
+        assert conversation.history_text() == "first"
+
+        conversation.append("second")
+
+        assert conversation.history_text() == "first\nsecond"
+
+    def test_conversations_scoped_to_owner_and_expire(self):
+        """Test conversations are per user and dropped after the TTL"""
+        store = ConversationStore(ttl=0.01)
+        store.get_or_create("user", "conv").append("hello")
+
+        assert store.get("other-user", "conv") is None
+        assert store.get("user", "conv").history_text() == "hello"
+        time.sleep(0.02)
+        assert store.get("user", "conv") is None
+
+    def test_least_recently_updated_evicted_per_user_and_in_total(self):
+        """Test the per-user and total caps evict the conversation updated longest ago"""
+        store = ConversationStore(ttl=60, max_conversations=3, max_per_user=2)
+        store.get_or_create("alice", "a1")
+        store.get_or_create("alice", "a2")
+        store.get("alice", "a1").append("still talking")
+        store.get_or_create("alice", "a3")
+
+        assert store.get("alice", "a2") is None
+        assert store.get("alice", "a1") is not None
+
+        store.get_or_create("bob", "b1")
+        store.get_or_create("bob", "b2")
+
+        assert list(store.conversations) == [("alice", "a3"), ("bob", "b1"), ("bob", "b2")]
+
+    def test_sweep_stops_at_first_live_conversation(self):
+        """Test sweeping drops only the expired head of the update order"""
+        store = ConversationStore(ttl=60)
+        for index in range(5):
+            store.get_or_create("user", f"conv{index}")
+        store.get("user", "conv0").append("hello")
+        now = time.monotonic()
+
+        assert store.sweep(now) == 0
+        assert store.sweep(store.get("user", "conv4").updated_at + 60) == 4
+        assert list(store.conversations) == [("user", "conv0")]
+
+
+class TestConversationSummarizer:
+
+    def test_extractive_summary_is_bounded(self):
+        """Test the extractive fallback keeps first sentences and trims the oldest lines"""
+        summarizer = ConversationSummarizer(max_chars=60)
+        summary = summarizer.extractive_summary("", [fragment(1), fragment(2, "Assistant")])
+
+        assert summary == "User: Message 1.\nAssistant: Message 2."
+
+        summary = summarizer.extractive_summary(summary, [fragment(n) for n in range(3, 8)])
+
+        assert len(summary) <= 60
+        assert summary.endswith("User: Message 7.")
+        assert not summary.startswith("essage")
+
+    @pytest.mark.asyncio
+    async def test_compaction_runs_in_background(self):
+        """Test scheduling returns immediately and the LLM summary replaces older messages"""
+        backend = FakeLLMBackend(ttft_ms=20, inter_token_ms=0, response_text="They discussed messages 0 to 2.")
+        summarizer = ConversationSummarizer(LLMService(backend=backend), max_chars=500)
+        conversation = ConversationStore(ttl=60, max_messages=2).get_or_create("user", "conv")
+        for number in range(5):
+            conversation.append(fragment(number))
+
+        summarizer.schedule(conversation)
+        assert conversation.compacting and conversation.summary == ""
+
+        await summarizer.wait_idle()
+
+        assert conversation.summary == "They discussed messages 0 to 2."
+        assert list(conversation.fragments) == [fragment(3), fragment(4)]
+        assert not conversation.compacting
+
+    @pytest.mark.asyncio
+    async def test_llm_failure_falls_back_to_extractive(self):
+        """Test a failing LLM still produces a summary"""
+        backend = FakeLLMBackend(ttft_ms=0, inter_token_ms=0, error_rate=1.0)
+        summarizer = ConversationSummarizer(LLMService(backend=backend), max_chars=500)
+        conversation = ConversationStore(ttl=60, max_messages=1).get_or_create("user", "conv")
+        conversation.append(fragment(1))
+        conversation.append(fragment(2))
+
+        summarizer.schedule(conversation)
+        await summarizer.wait_idle()
+
+        assert conversation.summary == "User: Message 1."
+        assert list(conversation.fragments) == [fragment(2)]
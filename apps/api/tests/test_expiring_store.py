@@ -0,0 +1,97 @@
+import threading
+import pytest
+from app.core.expiring_store import MemoryExpiringStore, create_expiring_store
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestMemoryExpiringStore:
+
+    def test_put_get_pop(self):
+        """Test values can be read until consumed, and consumed only once"""
+        store = MemoryExpiringStore()
+        store.put("state", {"next": "/"}, ttl=60)
+
+        assert store.get("state") == {"next": "/"}
+        assert store.pop("state") == {"next": "/"}
+        assert store.pop("state") is None
+        assert len(store) == 0
+
+    def test_entries_expire(self):
+        """Test an entry is invisible once its TTL has passed, even before it is swept"""
+        clock = FakeClock()
+        store = MemoryExpiringStore(clock=clock)
+        store.put("a", 1, ttl=10)
+        store.put("b", 2, ttl=10)
+
+        clock.now += 10.5
+        assert store.get("a") is None
+        assert store.pop("b") is None
+
+    def test_memory_stays_flat_under_churn(self):
+        """Test abandoned entries are swept as new ones arrive"""
+        clock = FakeClock()
+        store = MemoryExpiringStore(clock=clock)
+
+        for second in range(300):
+            for number in range(20):
+                store.put(f"{second}-{number}", True, ttl=10)
+            clock.now += 1
+
+        # Only roughly the last TTL's worth of entries (plus one wheel tick) is retained
+        assert len(store) <= 12 * 20
+
+    def test_sweep_is_batched(self):
+        """Test one sweep removes at most sweep_batch entries and the next one continues"""
+        clock = FakeClock()
+        store = MemoryExpiringStore(sweep_batch=100, clock=clock)
+        for number in range(250):
+            store.put(str(number), True, ttl=1)
+
+        clock.now += 5
+        assert store.sweep() == 100
+        assert store.sweep() == 100
+        assert store.sweep() == 50
+        assert len(store) == 0
+
+    def test_overwritten_key_keeps_new_expiry(self):
+        """Test re-putting a key is not swept at its old expiry"""
+        clock = FakeClock()
+        store = MemoryExpiringStore(clock=clock)
+        store.put("key", "old", ttl=1)
+        store.put("key", "new", ttl=60)
+
+        clock.now += 5
+        store.sweep()
+        assert store.get("key") == "new"
+
+
+def test_default_backend_is_in_process():
+    """Test the in-memory backend is used when no session backend is configured"""
+    assert isinstance(create_expiring_store("test"), MemoryExpiringStore)
+
+
+@pytest.mark.asyncio
+async def test_blocking_store_called_off_the_event_loop():
+    """Test the async methods run a network-backed store in an executor and a local one inline"""
+    class NetworkStore(MemoryExpiringStore):
+        blocking = True
+
+        def put(self, key, value, ttl):
+            self.thread = threading.get_ident()
+            super().put(key, value, ttl)
+
+    store = NetworkStore()
+    await store.put_async("state", True, 60)
+    assert store.thread != threading.get_ident()
+    assert await store.pop_async("state") is True
+
+    local = MemoryExpiringStore()
+    await local.put_async("state", True, 60)
+    assert await local.pop_async("state") is True
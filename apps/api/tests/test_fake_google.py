@@ -0,0 +1,154 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse, parse_qs
+from fastapi.testclient import TestClient
+from app.fakes.google_api import create_app, FakeGoogleConfig
+from app.services.calendar_service import CalendarService
+
+
+@pytest.fixture
+def fake_google():
+    return TestClient(create_app(FakeGoogleConfig(events_per_calendar=300, days_span=20, max_page_size=100)))
+
+
+def login(client, user_key="alice"):
+    """Run the fake OAuth flow and return the token response."""
+    response = client.get(
+        "/o/oauth2/v2/auth",
+        params={"redirect_uri": "http://localhost:8000/callback", "state": "xyz", "login_hint": user_key},
+        follow_redirects=False
+    )
+    assert response.status_code == 302
+    query = parse_qs(urlparse(response.headers["location"]).query)
+    assert query["state"] == ["xyz"]
+
+    response = client.post("/token", data={"grant_type": "authorization_code", "code": query["code"][0]})
+    assert response.status_code == 200
+    return response.json()
+
+
+def auth_header(tokens):
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+def list_all(client, headers, params):
+    """Follow nextPageToken links and return (items, nextSyncToken)."""
+    items, page_token = [], None
+    while True:
+        page_params = dict(params, pageToken=page_token) if page_token else params
+        body = client.get("/calendar/v3/calendars/primary/events", params=page_params, headers=headers).json()
+        items.extend(body["items"])
+        page_token = body.get("nextPageToken")
+        if not page_token:
+            return items, body.get("nextSyncToken")
+
+
+class TestFakeGoogleOAuth:
+
+    def test_login_flow_and_userinfo(self, fake_google):
+        """Test code exchange and userinfo lookup for a user"""
+        tokens = login(fake_google, "alice")
+
+        response = fake_google.get("/oauth2/v2/userinfo", headers=auth_header(tokens))
+
+        assert response.status_code == 200
+        assert response.json()["email"] == "alice@fake.example.com"
+        assert tokens["id_token"].count(".") == 2
+        second = fake_google.get("/oauth2/v2/userinfo", headers=auth_header(login(fake_google, "alice")))
+        assert second.json()["id"] == response.json()["id"]
+
+    def test_refresh_token_grant(self, fake_google):
+        """Test refreshing an access token"""
+        tokens = login(fake_google)
+
+        response = fake_google.post("/token", data={"grant_type": "refresh_token", "refresh_token": tokens["refresh_token"]})
+
+        assert response.status_code == 200
+        assert response.json()["access_token"] != tokens["access_token"]
+
+    def test_userinfo_requires_token(self, fake_google):
+        """Test userinfo rejects missing credentials"""
+        response = fake_google.get("/oauth2/v2/userinfo")
+
+        assert response.status_code == 401
+
+
+class TestFakeGoogleCalendar:
+
+    def test_pagination_covers_window(self, fake_google):
+        """Test paging through a time window returns each event once, ordered by start"""
+        headers = auth_header(login(fake_google))
+        params = {"singleEvents": "true", "orderBy": "startTime", "maxResults": 40}
+
+        items, sync_token = list_all(fake_google, headers, params)
+
+        assert sync_token is not None
+        assert len(items) == 300
+        assert len({item["id"] for item in items}) == 300
+
+    def test_time_window_filter(self, fake_google):
+        """Test timeMin/timeMax restrict the returned events"""
+        headers = auth_header(login(fake_google))
+        now = datetime.now(timezone.utc)
+        params = {
+            "timeMin": now.isoformat(),
+            "timeMax": (now + timedelta(days=2)).isoformat(),
+            "singleEvents": "true",
+            "orderBy": "startTime",
+            "maxResults": 100
+        }
+
+        body = fake_google.get("/calendar/v3/calendars/primary/events", params=params, headers=headers).json()
+
+        assert 0 < len(body["items"]) < 300
+
+    def test_etag_not_modified(self, fake_google):
+        """Test If-None-Match returns 304 until the calendar changes"""
+        headers = auth_header(login(fake_google, "bob"))
+        url = "/calendar/v3/calendars/primary/events"
+
+        first = fake_google.get(url, headers=headers)
+        etag = first.headers["ETag"]
+        cached = fake_google.get(url, headers=dict(headers, **{"If-None-Match": etag}))
+        fake_google.post("/_fake/calendars/bob/primary/mutate", params={"count": 1})
+        changed = fake_google.get(url, headers=dict(headers, **{"If-None-Match": etag}))
+
+        assert cached.status_code == 304
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != etag
+
+    def test_sync_token_returns_changes(self, fake_google):
+        """Test incremental sync returns only updated and cancelled events"""
+        headers = auth_header(login(fake_google, "carol"))
+        url = "/calendar/v3/calendars/primary/events"
+        _, sync_token = list_all(fake_google, headers, {})
+
+        fake_google.post("/_fake/calendars/carol/primary/mutate", params={"count": 2, "cancel": 1})
+        body = fake_google.get(url, params={"syncToken": sync_token}, headers=headers).json()
+
+        assert len(body["items"]) == 3
+        assert sum(item["status"] == "cancelled" for item in body["items"]) == 1
+
+        fake_google.post("/_fake/calendars/carol/primary/invalidate-sync")
+        gone = fake_google.get(url, params={"syncToken": sync_token}, headers=headers)
+        assert gone.status_code == 410
+
+    def test_error_injection(self, fake_google):
+        """Test configured error rate produces upstream errors"""
+        headers = auth_header(login(fake_google))
+        fake_google.put("/_fake/config", json={"error_rate": 1.0, "error_status": 503})
+
+        response = fake_google.get("/calendar/v3/calendars/primary/events", headers=headers)
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+    def test_events_parse_with_calendar_service(self, fake_google):
+        """Test fake events match the shape CalendarService expects"""
+        headers = auth_header(login(fake_google))
+        items = fake_google.get("/calendar/v3/calendars/primary/events", headers=headers).json()["items"]
+
+        service = CalendarService()
+        events = [service._transform_google_event(item) for item in items]
+
+        assert all(event is not None for event in events)
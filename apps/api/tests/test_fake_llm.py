@@ -0,0 +1,153 @@
+import pytest
+import asyncio
+from unittest.mock import patch
+from app.services.fake_llm import FakeLLMBackend, FakeLLMError
+from app.services.llm_service import LLMBackend, LLMService
+
+
+def make_backend(**kwargs):
+    defaults = {"ttft_ms": 0, "inter_token_ms": 0, "response_tokens": 12}
+    defaults.update(kwargs)
+    return FakeLLMBackend(**defaults)
+
+
+async def collect(generator):
+    return [chunk async for chunk in generator]
+
+
+class TestFakeLLMBackend:
+    """Test cases for FakeLLMBackend."""
+
+    @pytest.mark.asyncio
+    async def test_stream_is_deterministic_per_prompt(self):
+        """Test the same prompt always streams the same tokens."""
+        first = await collect(make_backend().stream("What is on today?", {}))
+        second = await collect(make_backend().stream("What is on today?", {}))
+        other = await collect(make_backend().stream("Am I free tomorrow?", {}))
+
+        assert len(first) == 12
+        assert first == second
+        assert first != other
+
+    @pytest.mark.asyncio
+    async def test_stream_uses_configured_text_and_chunking(self):
+        """Test canned responses are split into chunks of chunk_tokens tokens."""
+        backend = make_backend(response_text="one two three four five", chunk_tokens=2)
+
+        chunks = await collect(backend.stream("prompt", {}))
+
+        assert chunks == ["one two ", "three four ", "five"]
+
+    @pytest.mark.asyncio
+    async def test_generate_respects_max_output_tokens(self):
+        """Test non-streaming generation and the max_output_tokens cap."""
+        backend = make_backend(response_text="one two three four five")
+
+        text = await backend.generate("prompt", {"max_output_tokens": 3})
+
+        assert text == "one two three "
+
+    @pytest.mark.asyncio
+    async def test_injected_error(self):
+        """Test an error rate of 1.0 always fails the stream."""
+        backend = make_backend(error_rate=1.0)
+
+        with pytest.raises(FakeLLMError):
+            await collect(backend.stream("prompt", {}))
+        with pytest.raises(FakeLLMError):
+            await backend.generate("prompt", {})
+
+    @pytest.mark.asyncio
+    async def test_injected_timeout(self):
+        """Test a timeout rate of 1.0 stalls and then times out."""
+        backend = make_backend(timeout_rate=1.0, timeout_after_s=0.01)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await collect(backend.stream("prompt", {}))
+
+    def test_latency_distribution_centres_on_median(self):
+        """Test sampled delays are log-normal around the configured median."""
+        backend = make_backend(seed=42)
+
+        samples = sorted(backend._sample_delay(100.0) for _ in range(2001))
+
+        assert 0.08 < samples[1000] < 0.12
+        assert all(sample > 0 for sample in samples)
+
+
+class TestLLMServiceWithFakeBackend:
+    """Test cases for selecting the fake backend through LLMService."""
+
+    @pytest.mark.asyncio
+    async def test_fake_backend_selected_from_settings(self):
+        """Test llm_backend='fake' works without a Gemini API key."""
+        with patch('app.services.llm_service.settings') as mock_settings, \
+             patch.dict('os.environ', {}, clear=True):
+            mock_settings.llm_backend = "fake"
+            mock_settings.fake_llm_ttft_ms = 0
+            mock_settings.fake_llm_inter_token_ms = 0
+            mock_settings.fake_llm_latency_sigma = 0
+            mock_settings.fake_llm_response_tokens = 5
+            mock_settings.fake_llm_chunk_tokens = 1
+            mock_settings.fake_llm_response_text = None
+            mock_settings.fake_llm_error_rate = 0.0
+            mock_settings.fake_llm_timeout_rate = 0.0
+            mock_settings.fake_llm_timeout_after_s = 1.0
+            mock_settings.fake_llm_seed = 0
+            llm_service = LLMService()
+
+        chunks = await collect(llm_service.generate_response("prompt", stream=True))
+
+        assert isinstance(llm_service.backend, FakeLLMBackend)
+        assert len(chunks) == 5
+        assert llm_service.get_model_info()["backend"] == "fake"
+
+    def test_backend_must_implement_interface(self):
+        """Test a backend missing part of the interface cannot be constructed."""
+        class PartialBackend(LLMBackend):
+            def is_ready(self) -> bool:
+                return True
+
+        with pytest.raises(TypeError):
+            PartialBackend()
+
+    @pytest.mark.asyncio
+    async def test_error_mid_stream_is_not_retried(self):
+        """Test a stream that fails after sending chunks ends with the error instead of starting over."""
+        class MidStreamFailure(FakeLLMBackend):
+            calls = 0
+
+            async def stream(self, prompt, generation_config):
+                MidStreamFailure.calls += 1
+                yield "first "
+                raise FakeLLMError("Injected fake LLM error")
+
+        service = LLMService(backend=MidStreamFailure(ttft_ms=0, inter_token_ms=0))
+        chunks = []
+
+        with pytest.raises(FakeLLMError):
+            async for chunk in service.generate_response("prompt", stream=True):
+                chunks.append(chunk)
+
+        assert chunks == ["first "]
+        assert MidStreamFailure.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_error_before_first_chunk_is_retried(self):
+        """Test a stream that fails before sending anything is retried."""
+        class FlakyStart(FakeLLMBackend):
+            calls = 0
+
+            async def stream(self, prompt, generation_config):
+                FlakyStart.calls += 1
+                if FlakyStart.calls == 1:
+                    raise FakeLLMError("Injected fake LLM error")
+                yield "hello"
+
+        service = LLMService(backend=FlakyStart(ttft_ms=0, inter_token_ms=0))
+
+        with patch("app.services.llm_service.asyncio.sleep"):
+            chunks = await collect(service.generate_response("prompt", stream=True))
+
+        assert chunks == ["hello"]
+        assert FlakyStart.calls == 2
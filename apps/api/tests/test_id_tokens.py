@@ -0,0 +1,161 @@
+import asyncio
+import base64
+import json
+import threading
+import time
+import pytest
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.auth import AuthService, auth_service, session_store, OAUTH_STATE_COOKIE
+from app.models.user import GoogleTokens
+from app.core.id_tokens import GoogleIdTokenVerifier
+from app.fakes.google_api import create_app, FakeGoogleConfig
+
+CERTS_URL = "http://fake-google/oauth2/v3/certs"
+
+
+def fake_google():
+    return TestClient(create_app(FakeGoogleConfig(events_per_calendar=0)))
+
+
+def issue_id_token(google, user_key="alice", client_id="test_client_id"):
+    server = google.app.state.server
+    return server.issue_id_token(user_key, client_id)
+
+
+def sign_claims(google, claims):
+    """An ID token with arbitrary claims, signed with the fake server's key."""
+    server = google.app.state.server
+    encode = lambda data: base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+    header = {"alg": "RS256", "kid": server.signing_kid, "typ": "JWT"}
+    signing_input = f"{encode(json.dumps(header).encode())}.{encode(json.dumps(claims).encode())}"
+    signature = server.signing_key.sign(signing_input.encode(), padding.PKCS1v15(), hashes.SHA256())
+    return f"{signing_input}.{encode(signature)}"
+
+
+def serving_certs(google):
+    """Route the verifier's JWKS requests to a fake Google server."""
+    return patch("app.core.id_tokens.requests.get", side_effect=lambda url, timeout: google.get("/oauth2/v3/certs"))
+
+
+class TestGoogleIdTokenVerifier:
+
+    @pytest.fixture
+    def google(self):
+        return fake_google()
+
+    @pytest.fixture
+    def verifier(self):
+        return GoogleIdTokenVerifier(CERTS_URL, "test_client_id")
+
+    def test_verifies_token_locally_after_one_key_fetch(self, google, verifier):
+        """Test claims are returned and the keys are fetched once, then cached"""
+        with serving_certs(google) as get:
+            first = asyncio.run(verifier.verify(issue_id_token(google, "alice")))
+            second = asyncio.run(verifier.verify(issue_id_token(google, "bob")))
+
+        assert first["email"] == "alice@fake.example.com"
+        assert second["email"] == "bob@fake.example.com"
+        assert get.call_count == 1
+
+    def test_rejects_wrong_audience_and_tampering(self, google, verifier):
+        """Test tokens for another client or with an altered payload are rejected"""
+        token = issue_id_token(google)
+        header, payload, signature = token.split(".")
+        other = issue_id_token(google, "mallory").split(".")[1]
+
+        with serving_certs(google):
+            assert asyncio.run(verifier.verify(issue_id_token(google, client_id="another-client"))) is None
+            assert asyncio.run(verifier.verify(f"{header}.{other}.{signature}")) is None
+            assert asyncio.run(verifier.verify("not-a-token")) is None
+
+    def test_unknown_key_triggers_refetch(self, google, verifier):
+        """Test a token signed with a rotated-in key is accepted after refreshing the keys"""
+        rotated = fake_google()
+        verifier.min_refetch_interval = 0
+        with serving_certs(google):
+            verifier.refresh_keys()
+        with serving_certs(rotated) as get:
+            claims = asyncio.run(verifier.verify(issue_id_token(rotated)))
+
+        assert claims is not None
+        assert get.call_count == 1
+
+    def test_concurrent_logins_share_one_refetch_off_the_loop(self, google, verifier):
+        """Test logins with an unknown key wait for a single key fetch that runs outside the event loop"""
+        fetch_threads = []
+
+        def get_certs(url, timeout):
+            fetch_threads.append(threading.current_thread())
+            time.sleep(0.05)
+            return google.get("/oauth2/v3/certs")
+
+        async def login_burst():
+            return await asyncio.gather(*[verifier.verify(issue_id_token(google)) for _ in range(5)])
+
+        with patch("app.core.id_tokens.requests.get", side_effect=get_certs):
+            results = asyncio.run(login_burst())
+
+        assert all(claims is not None for claims in results)
+        assert len(fetch_threads) == 1
+        assert fetch_threads[0] is not threading.main_thread()
+
+    def test_rejects_non_numeric_times(self, google, verifier):
+        """Test a correctly signed token with a malformed exp or iat is rejected instead of raising"""
+        now = int(time.time())
+        claims = {"iss": "https://accounts.google.com", "aud": "test_client_id", "sub": "1", "iat": now, "exp": now + 60}
+
+        with serving_certs(google):
+            assert asyncio.run(verifier.verify(sign_claims(google, claims))) is not None
+            assert asyncio.run(verifier.verify(sign_claims(google, {**claims, "exp": "never"}))) is None
+            assert asyncio.run(verifier.verify(sign_claims(google, {**claims, "iat": None}))) is None
+
+    def test_refresh_honours_cache_control(self, google, verifier):
+        """Test the key cache lifetime follows the JWKS max-age"""
+        google.app.state.server.config.certs_max_age = 120
+        with serving_certs(google):
+            assert verifier.refresh_keys()
+
+        assert 0 < verifier.expires_at - time.monotonic() <= 120
+
+
+class TestIdTokenLogin:
+
+    def test_login_uses_id_token_instead_of_userinfo(self):
+        """Test the callback takes the profile from the verified ID token without a userinfo call"""
+        google = fake_google()
+        verifier = GoogleIdTokenVerifier(CERTS_URL, auth_service.client_id)
+        tokens = GoogleTokens(
+            access_token="access",
+            refresh_token="refresh",
+            expires_in=3600,
+            id_token=issue_id_token(google, client_id=auth_service.client_id)
+        )
+
+        state = asyncio.run(auth_service.create_oauth_state())
+        with serving_certs(google), \
+             patch("app.core.auth.id_token_verifier", verifier), \
+             patch.object(auth_service, "exchange_code_for_tokens", return_value=tokens), \
+             patch.object(auth_service, "get_user_info") as get_user_info, \
+             patch.object(auth_service, "store_refresh_token_securely"):
+            client = TestClient(app)
+            client.cookies.set(OAUTH_STATE_COOKIE, state)
+            response = client.get(
+                "/api/v1/auth/google/callback", params={"code": "code", "state": state}, follow_redirects=False
+            )
+
+        assert response.status_code == 307
+        get_user_info.assert_not_called()
+        claims = auth_service.decode_session_cookie(response.cookies["session_id"])
+        assert claims["email"] == "alice@fake.example.com"
+        session_store.pop(claims["sid"], None)
+
+    def test_invalid_id_token_falls_back(self):
+        """Test a missing or unverifiable ID token yields None so the caller uses userinfo"""
+        service = AuthService()
+
+        assert asyncio.run(service.user_info_from_id_token(None)) is None
+        assert asyncio.run(service.user_info_from_id_token("a.b.c")) is None
@@ -0,0 +1,101 @@
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.core.load_shedding import LoadShedder, load_shedder
+from app.core.loop_monitor import loop_monitor
+from app.core.metrics import sse_streams_in_flight
+from app.services.conversation_summarizer import ConversationSummarizer
+from app.services.fake_llm import FakeLLMBackend
+from app.services.llm_service import LLMService
+
+
+def lagging(seconds):
+    """Simulate a smoothed event loop lag of ``seconds``."""
+    return patch.object(loop_monitor, "smoothed_lag", seconds)
+
+
+class TestLoadShedder:
+
+    def test_route_priorities(self):
+        """Test routes map to their shedding priority"""
+        assert LoadShedder.priority("/api/chat/stream") == "high"
+        assert LoadShedder.priority("/api/chat/stream/abc") == "high"
+        assert LoadShedder.priority("/api/v1/calendar/events") == "low"
+        assert LoadShedder.priority("/api/chat/") == "normal"
+        assert LoadShedder.priority("/health") == "exempt"
+
+    def test_lowest_priority_is_shed_first(self):
+        """Test rising load sheds low, then normal, then high priority work"""
+        shedder = LoadShedder(lag_limit=0.2)
+
+        with lagging(0.1):
+            assert [shedder.should_shed(p) for p in ("low", "normal", "high")] == [False, False, False]
+        with lagging(0.14):
+            assert [shedder.should_shed(p) for p in ("low", "normal", "high")] == [True, False, False]
+        with lagging(0.18):
+            assert [shedder.should_shed(p) for p in ("low", "normal", "high")] == [True, True, False]
+        with lagging(0.25):
+            assert [shedder.should_shed(p) for p in ("low", "normal", "high", "exempt")] == [True, True, True, False]
+
+    def test_load_is_highest_signal(self):
+        """Test open streams count toward load alongside loop lag"""
+        shedder = LoadShedder(max_streams=10)
+        sse_streams_in_flight.inc(7)
+        try:
+            assert shedder.load() == pytest.approx(0.7)
+            assert shedder.should_shed("low")
+        finally:
+            sse_streams_in_flight.dec(7)
+
+    def test_hysteresis(self):
+        """Test shedding continues until load falls clearly below the threshold"""
+        shedder = LoadShedder(lag_limit=1.0, thresholds={"low": 0.6}, hysteresis=0.1)
+
+        with lagging(0.55):
+            assert not shedder.should_shed("low")
+        with lagging(0.6):
+            assert shedder.should_shed("low")
+        with lagging(0.55):
+            assert shedder.should_shed("low")
+        with lagging(0.45):
+            assert not shedder.should_shed("low")
+
+
+class TestLoadShedMiddleware:
+
+    def test_overload_rejects_low_priority_routes(self):
+        """Test low priority routes get 503 with Retry-After while chat streams are still admitted"""
+        client = TestClient(app)
+
+        with lagging(load_shedder.lag_limit * 0.7):
+            calendar = client.get("/api/v1/calendar/events")
+            stream = client.post("/api/chat/stream", json={})
+            health = client.get("/health")
+
+        assert calendar.status_code == 503
+        assert calendar.headers["Retry-After"] == "1"
+        # Past the shedder; rejected by auth instead
+        assert stream.status_code == 401
+        assert health.status_code == 200
+
+    def test_no_shedding_under_normal_load(self):
+        """Test requests pass through when the worker is not loaded"""
+        client = TestClient(app)
+
+        with lagging(0.0):
+            assert client.get("/api/v1/calendar/events").status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_summaries_skip_llm_under_load():
+    """Test background summaries use the extractive summary while low priority work is shed"""
+    backend = FakeLLMBackend(ttft_ms=0, inter_token_ms=0, response_text="LLM summary")
+    summarizer = ConversationSummarizer(LLMService(backend=backend), max_chars=500)
+
+    with lagging(load_shedder.lag_limit * 0.7), patch.object(backend, "generate") as generate:
+        summary = await summarizer.summarize("", ["09:00 AM - User: Hello there. More text."])
+
+    assert summary == "User: Hello there."
+    generate.assert_not_called()
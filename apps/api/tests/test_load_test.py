@@ -0,0 +1,65 @@
+import pytest
+import httpx
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from app.main import app
+from app.core.auth import auth_service, session_store
+from app.models.user import UserSession, GoogleUserInfo
+from app.services.chat_service import chat_service
+from app.services.fake_llm import FakeLLMBackend
+from bench.load_test import LoadGenerator, LoadTestConfig, percentile, parse_mix, format_report
+
+
+def test_percentile_nearest_rank():
+    """Test nearest-rank percentiles"""
+    values = [float(v) for v in range(1, 101)]
+
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile(values, 100) == 100.0
+    assert percentile([], 50) is None
+
+
+def test_parse_mix_normalises_weights():
+    """Test scenario mix parsing"""
+    assert parse_mix("stream=3,chat=1") == {"stream": 0.75, "chat": 0.25}
+    with pytest.raises(ValueError):
+        parse_mix("unknown=1")
+
+
+@pytest.mark.asyncio
+async def test_load_generator_in_process():
+    """Test a short in-process run against the app with the fake LLM"""
+    user_info = GoogleUserInfo(
+        id="load_user", email="load@example.com", name="Load User",
+        picture="https://example.com/avatar.jpg", verified_email=True
+    )
+    session_store["load_session"] = UserSession(
+        user_id="load_user",
+        session_id="load_session",
+        access_token="token",
+        expires_at=datetime.now(timezone.utc) + timedelta(hours=1),
+        user_info=user_info
+    )
+    backend = FakeLLMBackend(ttft_ms=0, inter_token_ms=0, response_tokens=5)
+    config = LoadTestConfig(
+        concurrency=2,
+        duration_s=0.2,
+        mix={"stream": 1.0},
+        include_calendar_context=False
+    )
+    generator = LoadGenerator(
+        config,
+        client_factory=lambda: httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    )
+
+    try:
+        with patch.object(chat_service.llm_service, "backend", backend):
+            report = await generator.run(sessions=[auth_service.create_session_cookie("load_session")])
+    finally:
+        del session_store["load_session"]
+
+    assert report["total"]["requests"] > 0
+    assert report["total"]["errors"] == 0
+    assert report["scenarios"]["stream"]["ttft_ms"]["p50"] is not None
+    assert "latency_ms" in format_report(report)
@@ -0,0 +1,107 @@
+import asyncio
+import time
+import pytest
+from app.core.loop_monitor import LoopLagMonitor, blocking_io_calls_total
+from app.core.tracing import Tracer
+
+
+def block_the_loop(seconds: float):
+    time.sleep(seconds)
+
+
+class TestStallWatchdog:
+
+    @pytest.mark.asyncio
+    async def test_stall_captures_stack_and_route(self):
+        """Test a stall is reported with the blocking stack and the request's route"""
+        monitor = LoopLagMonitor(interval=0.01, stall_threshold=0.05, track_task_routes=True)
+        monitor.start()
+        await asyncio.sleep(0.03)
+
+        async def handler():
+            block_the_loop(0.3)
+
+        # As in the middleware, the trace starts before the endpoint task is spawned
+        Tracer().start_trace("GET /api/v1/calendar/events")
+        await asyncio.get_running_loop().create_task(handler())
+        await asyncio.sleep(0.03)
+        await monitor.stop()
+
+        assert len(monitor.stalls) == 1
+        stall = monitor.stalls[0]
+        assert stall["route"] == "GET /api/v1/calendar/events"
+        assert "block_the_loop" in stall["stack"]
+        assert stall["blocked_for_s"] >= 0.05
+
+    @pytest.mark.asyncio
+    async def test_task_factory_left_alone_by_default(self):
+        """Test the loop's task factory is only wrapped when route tracking is on, and stalls still name the task"""
+        loop = asyncio.get_running_loop()
+        monitor = LoopLagMonitor(interval=0.01, stall_threshold=0.05)
+        monitor.start()
+        assert loop.get_task_factory() is None
+        await asyncio.sleep(0.03)
+
+        async def handler():
+            block_the_loop(0.3)
+
+        await loop.create_task(handler())
+        await asyncio.sleep(0.03)
+        await monitor.stop()
+
+        assert len(monitor.stalls) == 1
+        assert monitor.stalls[0]["task"].endswith("handler")
+
+    @pytest.mark.asyncio
+    async def test_no_stall_when_loop_is_idle(self):
+        """Test an idle loop produces no stall reports"""
+        monitor = LoopLagMonitor(interval=0.01, stall_threshold=0.1)
+        monitor.start()
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+
+        assert len(monitor.stalls) == 0
+        assert monitor.report()["stalls"] == []
+
+
+class TestBlockingIODebug:
+
+    @pytest.mark.asyncio
+    async def test_flags_sync_file_io_on_loop_thread(self):
+        """Test synchronous file opens on the loop thread are counted once per call site"""
+        monitor = LoopLagMonitor(interval=0.01)
+        monitor.start()
+        monitor.enable_blocking_io_debug()
+        before = blocking_io_calls_total.labels("open").value
+        try:
+            for _ in range(3):
+                with open(__file__):
+                    pass
+        finally:
+            monitor.disable_blocking_io_debug()
+            await monitor.stop()
+
+        assert blocking_io_calls_total.labels("open").value == before + 1
+
+    @pytest.mark.asyncio
+    async def test_ignores_io_in_worker_threads(self):
+        """Test I/O pushed to an executor is not flagged"""
+        def read_file():
+            with open(__file__) as source:
+                return source.read()
+
+        # Warm up the executor so its lazy imports are not counted
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, read_file)
+
+        monitor = LoopLagMonitor(interval=0.01)
+        monitor.start()
+        monitor.enable_blocking_io_debug()
+        before = blocking_io_calls_total.labels("open").value
+        try:
+            await loop.run_in_executor(None, read_file)
+        finally:
+            monitor.disable_blocking_io_debug()
+            await monitor.stop()
+
+        assert blocking_io_calls_total.labels("open").value == before
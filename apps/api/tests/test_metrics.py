@@ -0,0 +1,155 @@
+import asyncio
+import time
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.loop_monitor import LoopLagMonitor
+from app.core.metrics import (
+    MetricFamily, MetricsRegistry, http_requests_total, sse_streams_in_flight,
+    llm_prompt_tokens_total, llm_completion_tokens_total
+)
+from app.services.chat_service import chat_service
+from app.services.fake_llm import FakeLLMBackend
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+class TestRegistry:
+
+    def test_render_counter_and_gauge(self):
+        """Test counters and gauges render in the Prometheus text format"""
+        registry = MetricsRegistry()
+        requests_total = registry.counter("requests_total", "Requests", ("route",))
+        in_flight = registry.gauge("in_flight", "In flight")
+
+        requests_total.labels("/a").inc()
+        requests_total.labels("/a").inc(2)
+        in_flight.inc()
+        in_flight.inc()
+        in_flight.dec()
+
+        text = registry.render()
+
+        assert "# TYPE requests_total counter" in text
+        assert 'requests_total{route="/a"} 3.0' in text
+        assert "in_flight 1.0" in text
+
+    def test_render_histogram(self):
+        """Test histograms render cumulative buckets, sum and count"""
+        registry = MetricsRegistry()
+        latency = registry.histogram("latency_seconds", "Latency", ("stage",), bounds=(0.1, 1.0))
+
+        latency.labels("x").observe(0.05)
+        latency.labels("x").observe(0.5)
+
+        text = registry.render()
+
+        assert 'latency_seconds_bucket{stage="x",le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{stage="x",le="+Inf"} 2' in text
+        assert 'latency_seconds_count{stage="x"} 2' in text
+
+    def test_label_values_are_escaped(self):
+        """Test quotes and backslashes in label values are escaped"""
+        registry = MetricsRegistry()
+        registry.counter("odd_total", "Odd", ("value",)).labels('a"b\\c').inc()
+
+        assert 'odd_total{value="a\\"b\\\\c"} 1.0' in registry.render()
+
+    def test_register_is_idempotent(self):
+        """Test registering an existing name returns the original family"""
+        registry = MetricsRegistry()
+        first = registry.counter("same_total", "Same")
+
+        assert registry.counter("same_total", "Same") is first
+
+    def test_callback_gauge(self):
+        """Test callback gauges are evaluated at render time"""
+        registry = MetricsRegistry()
+        values = [1]
+        registry.gauge_callback("items", "Items", lambda: len(values))
+        values.append(2)
+
+        assert "items 2.0" in registry.render()
+
+    def test_family_must_implement_new_child(self):
+        """Test a metric family that does not say how to create its children cannot be constructed"""
+        class PartialFamily(MetricFamily):
+            metric_type = "gauge"
+
+        with pytest.raises(TypeError):
+            PartialFamily("partial", "Partial")
+
+
+class TestLoopLagMonitor:
+
+    @pytest.mark.asyncio
+    async def test_detects_blocked_loop(self):
+        """Test a blocking call on the loop shows up as lag"""
+        monitor = LoopLagMonitor(interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0.02)
+
+        time.sleep(0.1)
+        await asyncio.sleep(0.02)
+        await monitor.stop()
+
+        assert monitor.max_lag >= 0.05
+
+
+class TestMetricsEndpoint:
+
+    def test_metrics_endpoint_is_public(self, client):
+        """Test /metrics is served without a session"""
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "# TYPE http_requests_total counter" in response.text
+        assert "session_store_size" in response.text
+        assert "event_loop_lag_seconds" in response.text
+
+    def test_requests_counted_by_route_template(self, client):
+        """Test request counts use the route template and status"""
+        before = http_requests_total.labels("GET", "/health", "200").value
+
+        client.get("/health")
+
+        assert http_requests_total.labels("GET", "/health", "200").value == before + 1
+
+    def test_unmatched_routes_share_a_label(self, client):
+        """Test unknown paths do not create one series per URL"""
+        # The auth middleware rejects unknown paths before routing, hence 401
+        before = http_requests_total.labels("GET", "unmatched", "401").value
+
+        client.get("/does-not-exist-1")
+        client.get("/does-not-exist-2")
+
+        assert http_requests_total.labels("GET", "unmatched", "401").value == before + 2
+
+    def test_stream_updates_token_and_stream_metrics(self, client):
+        """Test a streamed reply counts LLM tokens and releases the in-flight gauge"""
+        backend = FakeLLMBackend(ttft_ms=0, inter_token_ms=0, response_tokens=5)
+        prompt_before = llm_prompt_tokens_total.value
+        completion_before = llm_completion_tokens_total.value
+        in_flight_before = sse_streams_in_flight.value
+
+        with patch.object(chat_service.llm_service, "backend", backend):
+            response = client.post(
+                "/api/chat/test-stream-real",
+                json={
+                    "message": "hi",
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "include_calendar_context": False
+                }
+            )
+
+        assert response.status_code == 200
+        assert llm_prompt_tokens_total.value > prompt_before
+        assert llm_completion_tokens_total.value > completion_before
+        assert sse_streams_in_flight.value == in_flight_before
+        assert http_requests_total.labels("POST", "/api/chat/test-stream-real", "200").value >= 1
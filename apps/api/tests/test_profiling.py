@@ -0,0 +1,176 @@
+import asyncio
+import threading
+import time
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.auth import auth_service, session_store
+from app.core.config import settings
+from app.core.profiling import SamplingProfiler, profiling_service
+from app.models.user import UserSession, GoogleUserInfo
+
+
+def spin(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+def make_session(session_id: str, email: str):
+    user_info = GoogleUserInfo(
+        id=session_id, email=email, name="Profiling User",
+        picture="https://example.com/avatar.jpg", verified_email=True
+    )
+    session_store[session_id] = UserSession(
+        user_id=session_id,
+        session_id=session_id,
+        access_token="valid_token",
+        expires_at=datetime.now(timezone.utc) + timedelta(hours=1),
+        user_info=user_info
+    )
+
+
+@pytest.fixture
+def admin_client(client):
+    make_session("admin_session", "admin@example.com")
+    client.cookies.update({"session_id": auth_service.create_session_cookie("admin_session")})
+    with patch.object(settings, "admin_emails", ["Admin@example.com"]):
+        yield client
+    session_store.pop("admin_session", None)
+    profiling_service.stop_cpu()
+    profiling_service.stop_memory()
+
+
+@pytest.fixture
+def user_client(client):
+    make_session("plain_session", "user@example.com")
+    client.cookies.update({"session_id": auth_service.create_session_cookie("plain_session")})
+    with patch.object(settings, "admin_emails", ["admin@example.com"]):
+        yield client
+    session_store.pop("plain_session", None)
+
+
+class TestSamplingProfiler:
+
+    def test_collapsed_stacks_include_hot_function(self):
+        """Test samples of a busy thread are rendered as collapsed stacks"""
+        worker = threading.Thread(target=spin, args=(0.2,), name="busy-worker")
+        worker.start()
+        profiler = SamplingProfiler(interval=0.002, thread_ids=[worker.ident]).start()
+        worker.join()
+        profiler.stop()
+
+        collapsed = profiler.collapsed()
+        line = collapsed.splitlines()[0]
+        stack, count = line.rsplit(" ", 1)
+
+        assert stack.startswith("busy-worker;")
+        assert "test_profiling.py:spin" in stack
+        assert int(count) > 0
+        assert profiler.samples > 0
+
+
+class TestProfilingAccess:
+
+    def test_requires_authentication(self, client):
+        """Test the profiling routes go through the auth middleware"""
+        response = client.get("/api/v1/admin/profiling/cpu")
+
+        assert response.status_code == 401
+
+    def test_requires_admin(self, user_client):
+        """Test non-admin users are rejected"""
+        response = user_client.post("/api/v1/admin/profiling/cpu/start")
+
+        assert response.status_code == 403
+
+    def test_profile_header_ignored_for_non_admins(self, user_client):
+        """Test non-admins cannot trigger per-request profiling"""
+        response = user_client.get("/api/v1/auth/me", headers={"X-Profile-Request": "1"})
+
+        assert "X-Profile-Id" not in response.headers
+
+
+class TestProfilingEndpoints:
+
+    def test_cpu_profile_start_and_stop(self, admin_client):
+        """Test a CPU profile can be started, stopped and read as collapsed stacks"""
+        started = admin_client.post("/api/v1/admin/profiling/cpu/start", params={"seconds": 5, "interval_ms": 1})
+        conflict = admin_client.post("/api/v1/admin/profiling/cpu/start")
+        time.sleep(0.05)
+        stopped = admin_client.post("/api/v1/admin/profiling/cpu/stop")
+
+        assert started.status_code == 200
+        assert started.json()["running"] is True
+        assert conflict.status_code == 409
+        assert stopped.status_code == 200
+        assert stopped.headers["content-type"].startswith("text/plain")
+        assert stopped.text.strip()
+        assert admin_client.get("/api/v1/admin/profiling/cpu").text == stopped.text
+
+    def test_memory_snapshot_diff(self, admin_client):
+        """Test tracemalloc snapshots can be taken and diffed"""
+        first = admin_client.post("/api/v1/admin/profiling/memory/snapshots").json()
+        retained = [bytearray(1024) for _ in range(100)]
+        second = admin_client.post("/api/v1/admin/profiling/memory/snapshots").json()
+
+        diff = admin_client.get(
+            f"/api/v1/admin/profiling/memory/snapshots/{second['id']}/diff",
+            params={"base": first["id"]}
+        )
+        missing = admin_client.get(
+            "/api/v1/admin/profiling/memory/snapshots/999/diff", params={"base": first["id"]}
+        )
+
+        assert second["id"] == first["id"] + 1
+        assert diff.status_code == 200
+        assert any("test_profiling.py" in change for change in diff.json()["changes"])
+        assert missing.status_code == 404
+        assert len(retained) == 100
+
+    def test_memory_snapshot_diff_runs_off_the_loop(self, admin_client):
+        """Test comparing snapshots does not run on the event loop thread"""
+        on_loop = []
+        diff_snapshots = profiling_service.diff_snapshots
+
+        def record_thread(*args):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(True)
+            except RuntimeError:
+                on_loop.append(False)
+            return diff_snapshots(*args)
+
+        first = admin_client.post("/api/v1/admin/profiling/memory/snapshots").json()
+        with patch.object(profiling_service, "diff_snapshots", side_effect=record_thread):
+            diff = admin_client.get(
+                f"/api/v1/admin/profiling/memory/snapshots/{first['id']}/diff", params={"base": first["id"]}
+            )
+
+        assert diff.status_code == 200
+        assert on_loop == [False]
+
+    def test_single_request_profile_by_header(self, admin_client):
+        """Test the profile header returns an id whose stacks can be fetched"""
+        response = admin_client.get("/api/v1/auth/me", headers={"X-Profile-Request": "1"})
+
+        profile_id = response.headers["X-Profile-Id"]
+        profile = admin_client.get(f"/api/v1/admin/profiling/requests/{profile_id}")
+
+        assert response.status_code == 200
+        assert profile.status_code == 200
+        assert profile.headers["content-type"].startswith("text/plain")
+        assert admin_client.get("/api/v1/admin/profiling/requests/unknown").status_code == 404
+
+    def test_loop_report(self, admin_client):
+        """Test the loop report exposes lag and stall history"""
+        report = admin_client.get("/api/v1/admin/profiling/loop").json()
+
+        assert {"last_lag_s", "max_lag_s", "stalls"} <= set(report)
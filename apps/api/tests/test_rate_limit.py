@@ -0,0 +1,135 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.core.auth import auth_service, session_store
+from app.core.rate_limit import RateLimiter, RedisRateLimitSync, rate_limiter
+from app.models.user import GoogleUserInfo, UserSession
+
+
+class TestRateLimiter:
+
+    def test_burst_then_refill(self):
+        """Test a bucket admits its burst, then one request per refill interval"""
+        limiter = RateLimiter({"chat": (1.0, 3)})
+
+        assert [limiter.acquire("chat", "alice", now=0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert limiter.acquire("chat", "alice", now=0.0) == pytest.approx(1.0)
+        assert limiter.acquire("chat", "alice", now=0.5) == pytest.approx(0.5)
+        assert limiter.acquire("chat", "alice", now=1.5) == 0.0
+
+    def test_buckets_are_per_user_and_route_class(self):
+        """Test one user exhausting a route class does not affect others"""
+        limiter = RateLimiter({"chat": (1.0, 1), "calendar": (1.0, 1)})
+
+        assert limiter.acquire("chat", "alice", now=0.0) == 0.0
+        assert limiter.acquire("chat", "alice", now=0.0) > 0
+        assert limiter.acquire("chat", "bob", now=0.0) == 0.0
+        assert limiter.acquire("calendar", "alice", now=0.0) == 0.0
+        assert limiter.acquire("admin", "alice", now=0.0) == 0.0
+
+    def test_least_recently_used_bucket_is_evicted(self):
+        """Test tracked buckets never exceed the cap, evicting the least recently used first"""
+        limiter = RateLimiter({"chat": (1.0, 5)}, max_buckets=3)
+        for number in range(3):
+            limiter.acquire("chat", f"user-{number}", now=0.0)
+        limiter.acquire("chat", "user-0", now=1.0)
+
+        limiter.acquire("chat", "late", now=2.0)
+        assert len(limiter) == 3
+        assert list(limiter._buckets) == [("chat", "user-2"), ("chat", "user-0"), ("chat", "late")]
+
+        limiter.charge(("chat", "remote"), 1, now=3.0)
+        assert len(limiter) == 3
+        assert ("chat", "user-2") not in limiter._buckets
+
+    def test_route_classes(self):
+        """Test paths map to their route class"""
+        assert RateLimiter.route_class("/api/chat/stream") == "chat"
+        assert RateLimiter.route_class("/api/v1/calendar/events") == "calendar"
+        assert RateLimiter.route_class("/api/v1/auth/google") == "auth"
+        assert RateLimiter.route_class("/health") is None
+
+    def test_remote_spending_is_charged(self):
+        """Test tokens spent by other workers reduce the local bucket"""
+        limiter = RateLimiter({"chat": (1.0, 5)})
+        limiter.acquire("chat", "alice", now=0.0)
+
+        limiter.charge(("chat", "alice"), 4, now=0.0)
+        assert limiter.acquire("chat", "alice", now=0.0) > 0
+
+
+class TestRedisRateLimitSync:
+
+    def test_exchange_reports_other_workers(self):
+        """Test the sync returns only what other workers spent since the last exchange"""
+        with patch("app.core.rate_limit.redis") as redis_module:
+            pipeline = redis_module.Redis.from_url.return_value.pipeline.return_value
+            sync = RedisRateLimitSync("redis://localhost")
+
+            pipeline.execute.return_value = [3.0, True]
+            assert sync.exchange({("chat", "alice"): 3.0}) == {}
+
+            # This worker spent 2 more, the counter grew by 5: others spent 3
+            pipeline.execute.return_value = [8.0, True]
+            assert sync.exchange({("chat", "alice"): 2.0}) == {("chat", "alice"): 3.0}
+
+
+class TestRateLimitMiddleware:
+
+    @pytest.fixture
+    def limiter(self):
+        limits = rate_limiter.limits
+        rate_limiter.limits = {"chat": (1.0, 2), "auth": (1.0, 1)}
+        rate_limiter.enabled = True
+        rate_limiter.reset()
+        yield rate_limiter
+        rate_limiter.limits = limits
+        rate_limiter.enabled = False
+        rate_limiter.reset()
+
+    @pytest.fixture
+    def session(self):
+        session_store["rate_session"] = UserSession(
+            user_id="rate_user",
+            session_id="rate_session",
+            access_token="token",
+            expires_at=datetime.now(timezone.utc) + timedelta(hours=1),
+            user_info=GoogleUserInfo(
+                id="rate_user", email="rate@example.com", name="Rate User",
+                picture="https://example.com/avatar.jpg", verified_email=True
+            )
+        )
+        yield "rate_session"
+        session_store.pop("rate_session", None)
+
+    def test_chat_returns_429_with_retry_after(self, limiter, session):
+        """Test a user over their chat budget gets 429 and Retry-After"""
+        client = TestClient(app)
+        client.cookies.set("session_id", auth_service.create_session_cookie(session))
+
+        # The payload is invalid, so admitted requests stop at validation without calling the LLM
+        statuses = [client.post("/api/chat/", json={}).status_code for _ in range(2)]
+        response = client.post("/api/chat/", json={})
+
+        assert statuses == [422, 422]
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+        assert len(limiter) == 1
+
+    def test_unauthenticated_routes_limited_by_address(self, limiter):
+        """Test the login routes are limited per client address"""
+        client = TestClient(app)
+
+        assert client.get("/api/v1/auth/status").status_code == 200
+        assert client.get("/api/v1/auth/status").status_code == 429
+        assert client.get("/health").status_code == 200
+
+    def test_unauthenticated_chat_is_rejected_before_limiting(self, limiter):
+        """Test requests without a session get 401 and spend no tokens"""
+        client = TestClient(app)
+
+        assert client.post("/api/chat/", json={}).status_code == 401
+        assert len(limiter) == 0
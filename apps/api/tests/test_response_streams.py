@@ -0,0 +1,239 @@
+import asyncio
+import json
+import time
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.auth import auth_service, session_store
+from app.core.tracing import tracer
+from app.models.user import UserSession, GoogleUserInfo
+from app.services.chat_service import chat_service
+from app.services.fake_llm import FakeLLMBackend
+from app.services.response_streams import ResponseStream, ResponseStreamStore, parse_last_event_id
+
+
+async def frames_from(items, delay=0.0):
+    for item in items:
+        await asyncio.sleep(delay)
+        yield item
+
+
+async def collect(stream, after_seq=0):
+    return [frame async for frame in stream.subscribe(after_seq)]
+
+
+def sse_events(body: bytes):
+    """Split an SSE body into (id, data) pairs."""
+    events = []
+    for block in body.decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        if "data" in fields:
+            events.append((fields.get("id"), json.loads(fields["data"])))
+    return events
+
+
+class TestResponseStream:
+
+    @pytest.mark.asyncio
+    async def test_frames_get_sequential_ids(self):
+        """Test buffered frames are tagged with response id and sequence number"""
+        stream = ResponseStream("resp", "user", max_bytes=1024, ttl=60)
+        stream.start(frames_from([b"data: a\n\n", b"data: b\n\n"]))
+
+        frames = await collect(stream)
+
+        assert frames == [b"id: resp:1\ndata: a\n\n", b"id: resp:2\ndata: b\n\n"]
+
+    @pytest.mark.asyncio
+    async def test_resume_while_generation_is_running(self):
+        """Test a reader joining mid-generation replays missed frames and follows live ones"""
+        stream = ResponseStream("resp", "user", max_bytes=1024, ttl=60)
+        stream.start(frames_from([f"data: {i}\n\n".encode() for i in range(1, 6)], delay=0.01))
+
+        await asyncio.sleep(0.025)
+        assert not stream.done
+        frames = await collect(stream, after_seq=1)
+
+        assert [frame.split(b"\n")[0] for frame in frames] == [f"id: resp:{i}".encode() for i in range(2, 6)]
+
+    @pytest.mark.asyncio
+    async def test_buffer_is_bounded(self):
+        """Test the oldest frames are evicted once the byte budget is exceeded"""
+        stream = ResponseStream("resp", "user", max_bytes=60, ttl=60)
+        stream.start(frames_from([b"data: 0123456789\n\n"] * 10))
+        await collect(stream, after_seq=10)
+
+        assert stream.first_seq > 1
+        assert stream.buffered_bytes <= 60
+        assert not stream.can_resume_after(0)
+        assert stream.can_resume_after(stream.first_seq - 1)
+
+    @pytest.mark.asyncio
+    async def test_slow_reader_is_dropped(self):
+        """Test a reader that falls too far behind the live stream is disconnected"""
+        stream = ResponseStream("resp", "user", max_bytes=4096, ttl=60, write_buffer_max_bytes=100)
+        stream.start(frames_from([b"data: 0123456789\n\n"] * 50))
+
+        reader = stream.subscribe()
+        await reader.__anext__()
+        await asyncio.sleep(0.01)  # Generation races ahead while this reader is stalled
+        remaining = [frame async for frame in reader]
+
+        assert stream.done
+        assert remaining == []
+        assert len(await collect(stream, after_seq=1)) == 49
+
+    @pytest.mark.asyncio
+    async def test_replay_backlog_is_not_slowness(self):
+        """Test a reconnect may start further behind than the write buffer limit"""
+        stream = ResponseStream("resp", "user", max_bytes=4096, ttl=60, write_buffer_max_bytes=100)
+        stream.start(frames_from([b"data: 0123456789\n\n"] * 50))
+        await asyncio.sleep(0.01)
+
+        assert len(await collect(stream)) == 50
+
+
+    @pytest.mark.asyncio
+    async def test_client_write_timed_per_reader(self):
+        """Test client_write is recorded by each reader, not by the generation task"""
+        client_write = tracer.stage_durations.labels("client_write")
+        before = client_write.count
+        stream = ResponseStream("resp", "user", max_bytes=4096, ttl=60)
+        stream.start(frames_from([b"data: a\n\n"] * 3))
+        await asyncio.sleep(0.01)
+        assert client_write.count == before
+
+        await collect(stream)
+        await collect(stream)
+
+        assert client_write.count == before + 2
+
+
+class TestResponseStreamStore:
+
+    @pytest.mark.asyncio
+    async def test_finished_streams_expire(self):
+        """Test finished streams are swept after the TTL and scoped to their owner"""
+        store = ResponseStreamStore(ttl=0.01, max_bytes=1024)
+        stream = store.create("resp", "user", frames_from([b"data: a\n\n"]))
+        await collect(stream)
+
+        assert store.get("resp", "other-user") is None
+        assert store.get("resp", "user") is stream
+        time.sleep(0.02)
+        assert store.get("resp", "user") is None
+
+    @pytest.mark.asyncio
+    async def test_oldest_stream_evicted_per_user_and_in_total(self):
+        """Test the per-user and total caps evict the oldest stream and cancel it if still generating"""
+        store = ResponseStreamStore(max_bytes=1024, max_streams=3, max_per_user=2)
+        first = store.create("a1", "alice", frames_from([b"data: a\n\n"], delay=10))
+        store.create("a2", "alice", frames_from([b"data: a\n\n"]))
+        store.create("a3", "alice", frames_from([b"data: a\n\n"]))
+        await asyncio.sleep(0.01)
+
+        assert list(store.streams) == ["a2", "a3"]
+        assert first.done
+        assert b"cancelled by the server" in first.frames[-1]
+
+        store.create("b1", "bob", frames_from([b"data: b\n\n"]))
+        store.create("b2", "bob", frames_from([b"data: b\n\n"]))
+        assert list(store.streams) == ["a3", "b1", "b2"]
+        assert store.get("a2", "alice") is None
+
+    @pytest.mark.asyncio
+    async def test_generation_cancelled_after_max_lifetime(self):
+        """Test a stream still generating past max_lifetime is cancelled and dropped"""
+        store = ResponseStreamStore(max_bytes=1024, max_lifetime=0.01)
+        stream = store.create("resp", "user", frames_from([b"data: a\n\n"], delay=10))
+        await asyncio.sleep(0.02)
+
+        assert store.get("resp", "user") is None
+        await asyncio.sleep(0.01)
+        assert stream.done
+
+    @pytest.mark.asyncio
+    async def test_sweep_only_visits_expired_streams(self):
+        """Test sweeping pops due heap entries instead of scanning every stream"""
+        store = ResponseStreamStore(ttl=60, max_bytes=1024, max_lifetime=0)
+        for index in range(100):
+            await collect(store.create(f"resp{index}", "user" + str(index), frames_from([b"data: a\n\n"])))
+
+        assert store.sweep() == 0
+        assert len(store._expiry) == 100
+        assert store.sweep(now=time.monotonic() + 61) == 100
+        assert not store.streams
+
+
+class TestParseLastEventId:
+
+    def test_accepts_both_forms(self):
+        """Test full and bare Last-Event-ID values"""
+        assert parse_last_event_id(None, "resp") == 0
+        assert parse_last_event_id("resp:7", "resp") == 7
+        assert parse_last_event_id("7", "resp") == 7
+
+    @pytest.mark.parametrize("value", ["other:3", "resp:x", "resp:-1"])
+    def test_rejects_invalid_values(self, value):
+        """Test mismatched or malformed ids are rejected"""
+        with pytest.raises(ValueError):
+            parse_last_event_id(value, "resp")
+
+
+class TestResumeEndpoint:
+
+    @pytest.fixture
+    def client(self):
+        user_info = GoogleUserInfo(
+            id="stream_user", email="stream@example.com", name="Stream User",
+            picture="https://example.com/avatar.jpg", verified_email=True
+        )
+        session_store["stream_session"] = UserSession(
+            user_id="stream_user",
+            session_id="stream_session",
+            access_token="valid_token",
+            expires_at=datetime.now(timezone.utc) + timedelta(hours=1),
+            user_info=user_info
+        )
+        client = TestClient(app)
+        client.cookies.update({"session_id": auth_service.create_session_cookie("stream_session")})
+        yield client
+        session_store.pop("stream_session", None)
+
+    def start_stream(self, client):
+        backend = FakeLLMBackend(ttft_ms=0, inter_token_ms=0, response_tokens=20)
+        with patch.object(chat_service.llm_service, "backend", backend):
+            return client.post("/api/chat/stream", json={
+                "message": "What is on today?",
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "include_calendar_context": False,
+                "stream_coalesce_ms": 0
+            })
+
+    def test_resume_replays_after_last_event_id(self, client):
+        """Test a reconnect with Last-Event-ID receives only the later events"""
+        response = self.start_stream(client)
+        response_id = response.headers["X-Response-Id"]
+        events = sse_events(response.content)
+
+        resumed = client.get(f"/api/chat/stream/{response_id}", headers={"Last-Event-ID": events[4][0]})
+
+        assert response.status_code == 200
+        assert [event_id for event_id, _ in events] == [f"{response_id}:{i}" for i in range(1, len(events) + 1)]
+        assert resumed.status_code == 200
+        assert sse_events(resumed.content) == events[5:]
+        assert sse_events(resumed.content)[-1][1]["isComplete"] is True
+
+    def test_resume_errors(self, client):
+        """Test unknown streams, foreign ids and malformed headers are rejected"""
+        response_id = self.start_stream(client).headers["X-Response-Id"]
+
+        assert client.get("/api/chat/stream/unknown").status_code == 404
+        assert client.get(
+            f"/api/chat/stream/{response_id}", headers={"Last-Event-ID": "other:1"}
+        ).status_code == 400
+        assert client.get(
+            f"/api/chat/stream/{response_id}", headers={"Last-Event-ID": "999"}
+        ).status_code == 410
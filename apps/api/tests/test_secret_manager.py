@@ -0,0 +1,340 @@
+import asyncio
+import threading
+import time
+import pytest
+from unittest.mock import Mock, patch
+from fastapi.testclient import TestClient
+
+from app.core.session_tokens import RevocationList
+from app.fakes.google_api import create_app, FakeGoogleConfig
+from app.services.secret_manager import (
+    AsyncSecretManager,
+    CloudSecretManagerBackend,
+    EncryptedFileSecretBackend,
+    MemorySecretBackend,
+    SecretManagerService,
+    create_secret_manager,
+)
+
+
+class TestEncryptedFileSecretBackend:
+
+    @pytest.fixture
+    def path(self, tmp_path):
+        return str(tmp_path / "secrets.log")
+
+    def test_round_trip_survives_restart(self, path):
+        """Test tokens written by one instance are read back by a fresh one"""
+        backend = EncryptedFileSecretBackend(path, "key")
+        backend.put("google-refresh-token-1", "refresh-1")
+        backend.put("google-refresh-token-2", "refresh-2")
+        backend.delete("google-refresh-token-2")
+
+        restarted = EncryptedFileSecretBackend(path, "key")
+        assert restarted.get("google-refresh-token-1") == "refresh-1"
+        assert restarted.get("google-refresh-token-2") is None
+
+    def test_file_is_encrypted(self, path):
+        """Test neither token values nor user ids appear in the log, and another key cannot read it"""
+        EncryptedFileSecretBackend(path, "key").put("google-refresh-token-123", "very-secret")
+
+        with open(path, "rb") as log:
+            contents = log.read()
+        assert b"very-secret" not in contents
+        assert b"123" not in contents
+        assert EncryptedFileSecretBackend(path, "other-key").get("google-refresh-token-123") is None
+
+    def test_sees_writes_from_another_worker(self, path):
+        """Test two instances sharing the file observe each other's writes"""
+        first = EncryptedFileSecretBackend(path, "key")
+        second = EncryptedFileSecretBackend(path, "key")
+
+        first.put("token", "v1")
+        assert second.get("token") == "v1"
+        second.put("token", "v2")
+        assert first.get("token") == "v2"
+
+    def test_compaction_bounds_the_log(self, path):
+        """Test rewriting the same secrets compacts the log without losing values"""
+        backend = EncryptedFileSecretBackend(path, "key", compact_min_records=10)
+        other = EncryptedFileSecretBackend(path, "key")
+        for number in range(200):
+            backend.put(f"token-{number % 3}", f"value-{number}")
+
+        with open(path, "rb") as log:
+            assert len(log.readlines()) <= 2 * 3 + 10 + 1
+        assert other.get("token-2") == "value-197"
+        assert EncryptedFileSecretBackend(path, "key").get("token-0") == "value-198"
+
+    def test_write_many_appends_once(self, path):
+        """Test a batch of writes lands in a single append"""
+        backend = EncryptedFileSecretBackend(path, "key")
+        backend.put("gone", "value")
+
+        with patch("app.services.secret_manager.os.fsync") as fsync:
+            backend.write_many({"a": "1", "b": "2", "gone": None})
+
+        fsync.assert_called_once()
+        restarted = EncryptedFileSecretBackend(path, "key")
+        assert (restarted.get("a"), restarted.get("b"), restarted.get("gone")) == ("1", "2", None)
+
+
+@pytest.mark.filterwarnings("ignore:You should not use the 'timeout' argument")
+class TestCloudSecretManagerBackend:
+
+    @pytest.fixture
+    def google(self):
+        return TestClient(create_app(FakeGoogleConfig(events_per_calendar=0)))
+
+    @pytest.fixture
+    def backend(self, google):
+        return CloudSecretManagerBackend("project", "http://testserver/secretmanager/v1", "token", http=google)
+
+    def test_put_get_delete(self, backend, google):
+        """Test secrets are created on first write, versioned on later ones and deleted"""
+        assert backend.get("google-refresh-token-1") is None
+
+        backend.put("google-refresh-token-1", "refresh-1")
+        backend.put("google-refresh-token-1", "refresh-2")
+        assert backend.get("google-refresh-token-1") == "refresh-2"
+        assert google.app.state.server.stats["secrets.create"] == 1
+
+        backend.delete("google-refresh-token-1")
+        backend.delete("google-refresh-token-1")
+        assert backend.get("google-refresh-token-1") is None
+
+    def test_put_destroys_previous_version(self, backend, google):
+        """Test a new refresh token destroys the version holding the old one"""
+        backend.put("google-refresh-token-1", "refresh-1")
+        backend.put("google-refresh-token-1", "refresh-2")
+        backend.put("google-refresh-token-1", "refresh-3")
+
+        versions = google.app.state.server.secrets["projects/project/secrets/google-refresh-token-1"]
+        assert versions[:2] == [None, None]
+        assert backend.get("google-refresh-token-1") == "refresh-3"
+        assert google.app.state.server.stats["secrets.destroy"] == 2
+
+    def test_failed_destroy_keeps_the_write(self, backend, google):
+        """Test a version that cannot be destroyed does not fail the write that replaced it"""
+        backend.put("google-refresh-token-1", "refresh-1")
+        google.app.state.server.secrets["projects/project/secrets/google-refresh-token-1"][0] = None
+
+        backend.put("google-refresh-token-1", "refresh-2")
+
+        assert backend.get("google-refresh-token-1") == "refresh-2"
+
+    def test_sessions_are_per_thread(self):
+        """Test each executor thread gets its own HTTP session"""
+        backend = CloudSecretManagerBackend("project", "http://testserver/secretmanager/v1", "token")
+        other = []
+        thread = threading.Thread(target=lambda: other.append(backend.http))
+        thread.start()
+        thread.join()
+
+        assert backend.http is backend.http
+        assert other[0] is not backend.http
+
+    def test_uses_metadata_server_token(self):
+        """Test the service account token is fetched once from the metadata server and reused"""
+        http = Mock()
+        http.get.return_value.json.return_value = {"access_token": "sa", "expires_in": 3600}
+        backend = CloudSecretManagerBackend("project", "http://testserver/secretmanager/v1", http=http)
+
+        assert backend._headers() == {"Authorization": "Bearer sa"}
+        assert backend._headers() == {"Authorization": "Bearer sa"}
+        http.get.assert_called_once()
+        assert http.get.call_args.args[0] == backend.METADATA_TOKEN_URL
+
+
+class TestSecretManagerService:
+
+    def test_reads_are_cached(self):
+        """Test repeated reads are served from memory until the TTL lapses"""
+        backend = MemorySecretBackend()
+        service = SecretManagerService(backend, cache_ttl=60)
+        service.store_refresh_token("user", "refresh")
+
+        with patch.object(backend, "get") as get:
+            assert service.get_refresh_token("user") == "refresh"
+            get.assert_not_called()
+
+        service.cache_ttl = 0
+        service.store_refresh_token("user", "refresh")
+        with patch.object(backend, "get", return_value="from-backend") as get:
+            assert service.get_refresh_token("user") == "from-backend"
+            get.assert_called_once()
+
+    def test_delete_evicts_cache(self):
+        """Test a deleted token is not served from the cache"""
+        service = SecretManagerService(MemorySecretBackend(), cache_ttl=60)
+        service.store_refresh_token("user", "refresh")
+
+        assert service.delete_refresh_token("user") is True
+        assert service.get_refresh_token("user") is None
+
+    @pytest.mark.asyncio
+    async def test_delete_on_another_worker_invalidates_cache(self):
+        """Test a worker stops serving its cached copy once another worker's delete is synced"""
+        class SharedSync:
+            def __init__(self):
+                self.log = []
+
+            def exchange(self, revoked):
+                self.log.extend(revoked)
+                return list(self.log)
+
+        sync = SharedSync()
+        backend = MemorySecretBackend()
+        worker_a = SecretManagerService(backend, cache_ttl=60, deletions=RevocationList(sync, sync_interval=0.01))
+        worker_b = SecretManagerService(backend, cache_ttl=60, deletions=RevocationList(sync, sync_interval=0.01))
+        worker_a.store_refresh_token("user", "refresh")
+        assert worker_b.get_refresh_token("user") == "refresh"
+
+        worker_a.deletions.start()
+        worker_b.deletions.start()
+        assert worker_a.delete_refresh_token("user") is True
+        await asyncio.sleep(0.05)
+        await worker_a.deletions.stop()
+        await worker_b.deletions.stop()
+
+        with patch.object(backend, "get", wraps=backend.get) as get:
+            assert worker_b.get_refresh_token("user") is None
+            get.assert_called_once()
+
+        # Logging in again after the delete is cached as usual
+        worker_b.store_refresh_token("user", "refresh-2")
+        assert worker_b.cached("google-refresh-token-user") == "refresh-2"
+
+    def test_read_racing_a_delete_is_not_cached(self):
+        """Test a value read before a delete landed is not served from the cache afterwards"""
+        backend = MemorySecretBackend()
+        service = SecretManagerService(backend, cache_ttl=60)
+        backend.put("google-refresh-token-user", "refresh")
+
+        def get_then_deleted(secret_id):
+            value = MemorySecretBackend.get(backend, secret_id)
+            # Another request deletes the token while this read is on its way back
+            time.sleep(0.001)
+            service.delete_refresh_token("user")
+            return value
+
+        with patch.object(backend, "get", side_effect=get_then_deleted):
+            assert service.get_refresh_token("user") == "refresh"
+        assert service.cached("google-refresh-token-user") is None
+
+    def test_file_backend_requires_its_own_key(self, tmp_path):
+        """Test the file backend refuses to start without a strong SECRET_ENCRYPTION_KEY"""
+        with patch("app.services.secret_manager.settings") as settings:
+            settings.secret_backend = "file"
+            settings.secret_file_path = str(tmp_path / "secrets.log")
+            settings.session_backend_url = None
+            settings.secret_cache_ttl_s = 60
+            settings.revocation_sync_interval_s = 1.0
+            settings.secret_encryption_key = None
+            with pytest.raises(ValueError, match="SECRET_ENCRYPTION_KEY"):
+                create_secret_manager()
+
+            settings.secret_encryption_key = "k" * 16
+            with pytest.raises(ValueError, match="SECRET_ENCRYPTION_KEY"):
+                create_secret_manager()
+
+            settings.secret_encryption_key = "0123456789abcdef" * 4
+            assert isinstance(create_secret_manager().backend, EncryptedFileSecretBackend)
+
+    def test_backend_errors_are_reported(self):
+        """Test backend failures turn into False/None instead of propagating"""
+        backend = MemorySecretBackend()
+        service = SecretManagerService(backend)
+
+        with patch.object(backend, "put", side_effect=OSError("disk full")):
+            assert service.store_refresh_token("user", "refresh") is False
+        with patch.object(backend, "get", side_effect=OSError("disk gone")):
+            assert service.get_refresh_token("user") is None
+
+
+class TestAsyncSecretManager:
+
+    @pytest.mark.asyncio
+    async def test_concurrent_writes_are_batched(self):
+        """Test writes issued together reach the backend in one call, newest value per user"""
+        backend = MemorySecretBackend()
+        manager = AsyncSecretManager(SecretManagerService(backend))
+
+        with patch.object(backend, "write_many", wraps=backend.write_many) as write_many:
+            results = await asyncio.gather(
+                manager.store_refresh_token("a", "a-1"),
+                manager.store_refresh_token("b", "b-1"),
+                manager.store_refresh_token("a", "a-2"),
+                manager.delete_refresh_token("c"),
+            )
+
+        assert results == [True, True, True, True]
+        write_many.assert_called_once_with({
+            "google-refresh-token-a": "a-2",
+            "google-refresh-token-b": "b-1",
+            "google-refresh-token-c": None,
+        })
+        assert backend.get("google-refresh-token-a") == "a-2"
+        assert manager.service.deletions.is_revoked("google-refresh-token-c")
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_reports_false(self):
+        """Test every writer in a failed batch is told so"""
+        backend = MemorySecretBackend()
+        manager = AsyncSecretManager(SecretManagerService(backend))
+
+        with patch.object(backend, "write_many", side_effect=OSError("disk full")):
+            results = await asyncio.gather(
+                manager.store_refresh_token("a", "a-1"),
+                manager.store_refresh_token("b", "b-1"),
+            )
+
+        assert results == [False, False]
+        assert await manager.get_refresh_token("a") is None
+
+    @pytest.mark.asyncio
+    async def test_concurrent_reads_share_one_fetch(self):
+        """Test simultaneous reads of an uncached token make a single backend call"""
+        backend = MemorySecretBackend()
+        backend.put("google-refresh-token-a", "refresh")
+        manager = AsyncSecretManager(SecretManagerService(backend))
+
+        with patch.object(backend, "get", wraps=backend.get) as get:
+            results = await asyncio.gather(*[manager.get_refresh_token("a") for _ in range(10)])
+
+        assert results == ["refresh"] * 10
+        get.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_deletions_checked_on_the_loop_thread(self):
+        """Test only the backend read runs in the executor; the cache and deletion list are never read from it"""
+        backend = MemorySecretBackend()
+        backend.put("google-refresh-token-a", "refresh")
+        manager = AsyncSecretManager(SecretManagerService(backend))
+        cached = manager.service.cached
+        threads = []
+
+        def record_thread(secret_id):
+            threads.append(threading.current_thread())
+            return cached(secret_id)
+
+        with patch.object(manager.service, "cached", side_effect=record_thread), \
+             patch.object(backend, "get", wraps=backend.get) as get:
+            assert await manager.get_refresh_token("a") == "refresh"
+            assert await manager.get_refresh_token("a") == "refresh"
+
+        get.assert_called_once()
+        assert threads and all(thread is threading.current_thread() for thread in threads)
+
+    @pytest.mark.asyncio
+    async def test_reads_see_queued_writes(self):
+        """Test a read issued while a delete is queued does not return the old token"""
+        backend = MemorySecretBackend()
+        backend.put("google-refresh-token-a", "refresh")
+        manager = AsyncSecretManager(SecretManagerService(backend), batch_window=0.05)
+
+        delete = asyncio.ensure_future(manager.delete_refresh_token("a"))
+        await asyncio.sleep(0)
+
+        assert await manager.get_refresh_token("a") is None
+        assert await delete is True
@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from app.core.session_store import SessionStore, approximate_size
+from app.models.user import GoogleUserInfo, UserSession
+
+
+def make_session(session_id, expires_in=timedelta(hours=1)):
+    return UserSession(
+        user_id=f"user-{session_id}",
+        session_id=session_id,
+        access_token="access",
+        expires_at=datetime.now(timezone.utc) + expires_in,
+        user_info=GoogleUserInfo(
+            id=f"user-{session_id}",
+            email=f"{session_id}@example.com",
+            name="Test User",
+            picture="https://example.com/avatar.jpg",
+            verified_email=True
+        )
+    )
+
+
+class TestSessionStore:
+
+    def test_behaves_like_a_dict(self):
+        """Test the mapping operations callers rely on"""
+        store = SessionStore()
+        store["a"] = make_session("a")
+
+        assert "a" in store
+        assert store.get("a").session_id == "a"
+        assert store.get("missing") is None
+        assert [session_id for session_id, _ in store.items()] == ["a"]
+        assert store.pop("a").session_id == "a"
+        assert len(store) == 0
+
+    def test_sweep_removes_only_expired_sessions(self):
+        """Test the sweeper drops expired sessions and keeps live ones"""
+        store = SessionStore()
+        store["old"] = make_session("old", timedelta(hours=-1))
+        store["live"] = make_session("live")
+
+        assert store.sweep() == 1
+        assert "old" not in store
+        assert "live" in store
+
+    def test_sweep_respects_expiry_extended_in_place(self):
+        """Test a session whose expiry was pushed back after insertion survives the sweep"""
+        store = SessionStore()
+        session = make_session("a", timedelta(seconds=1))
+        store["a"] = session
+        session.expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+
+        assert store.sweep(datetime.now(timezone.utc) + timedelta(minutes=1)) == 0
+        assert "a" in store
+
+    def test_evicts_least_recently_used(self):
+        """Test the store stays at its maximum size by evicting the least recently used session"""
+        store = SessionStore(max_sessions=2)
+        store["a"] = make_session("a")
+        store["b"] = make_session("b")
+        store.get("a")
+        store["c"] = make_session("c")
+
+        assert set(store) == {"a", "c"}
+
+    def test_memory_per_session(self):
+        """Test the memory estimate covers the nested user info"""
+        store = SessionStore()
+        assert store.memory_per_session() == 0.0
+
+        session = make_session("a")
+        store["a"] = session
+        assert store.memory_per_session() == approximate_size(session)
+        assert approximate_size(session) > approximate_size(session.user_info)
+
+    @pytest.mark.asyncio
+    async def test_background_sweeper(self):
+        """Test expired sessions are removed without being looked up"""
+        store = SessionStore(sweep_interval=0.01)
+        store["old"] = make_session("old", timedelta(hours=-1))
+
+        store.start()
+        await asyncio.sleep(0.05)
+        await store.stop()
+
+        assert len(store) == 0
@@ -1,7 +1,9 @@
 import pytest
 from unittest.mock import Mock, patch, AsyncMock
 from fastapi import HTTPException
-from app.utils.streaming import StreamingUtils, TimeoutHelper, RetryHelper
+from app.utils.streaming import (
+    StreamingUtils, TimeoutHelper, RetryHelper, SSEFrameEncoder, SSE_HEARTBEAT, coalesce_chunks
+)
 import json
 import asyncio
 
@@ -38,7 +40,7 @@ class TestStreamingUtils:
         # Check content chunks
         for i in range(0, 3):
             chunk = chunks[i]
-            assert chunk.startswith("data: ")
+            assert chunk.startswith(b"data: ")
             data = json.loads(chunk[6:])
             assert data["id"] == response_id
             assert data["isComplete"] is False
@@ -46,7 +48,7 @@ class TestStreamingUtils:
         
         # Check completion chunk
         completion_chunk = chunks[3]
-        assert completion_chunk.startswith("data: ")
+        assert completion_chunk.startswith(b"data: ")
         completion_data = json.loads(completion_chunk[6:])
         assert completion_data["id"] == response_id
         assert completion_data["isComplete"] is True
@@ -77,7 +79,7 @@ class TestStreamingUtils:
         
         # Check content chunk
         content_chunk = chunks[0]
-        assert content_chunk.startswith("data: ")
+        assert content_chunk.startswith(b"data: ")
         content_data = json.loads(content_chunk[6:])
         assert content_data["id"] == response_id
         assert content_data["content"] == "Hello"
@@ -85,7 +87,7 @@ class TestStreamingUtils:
         
         # Check error chunk
         error_chunk = chunks[1]
-        assert error_chunk.startswith("data: ")
+        assert error_chunk.startswith(b"data: ")
         error_data = json.loads(error_chunk[6:])
         assert error_data["id"] == response_id
         assert error_data["isComplete"] is True
@@ -133,6 +135,183 @@ class TestStreamingUtils:
         assert parsed_data[2]["type"] == "complete"
 
 
+class TestSSEFrameEncoder:
+    """Test cases for SSEFrameEncoder."""
+    
+    @pytest.mark.parametrize("content", [
+        "Hello",
+        'quotes " and \\ backslashes',
+        "line\nbreaks\tand tabs",
+        "unicode caf\u00e9 \U0001F4C5",
+        "\u2028 separators \u0000",
+    ])
+    def test_chunk_round_trip(self, content):
+        """Test chunk frames decode to the same payload json.dumps would produce."""
+        frame = SSEFrameEncoder("resp-1").chunk(content)
+        
+        assert isinstance(frame, bytes)
+        assert frame.startswith(b"data: ")
+        assert frame.endswith(b"\n\n")
+        assert json.loads(frame[6:]) == {"id": "resp-1", "content": content, "isComplete": False}
+    
+    def test_complete_and_error_frames(self):
+        """Test completion and error frames."""
+        encoder = SSEFrameEncoder('id "quoted"')
+        
+        assert json.loads(encoder.complete()[6:]) == {"id": 'id "quoted"', "content": "", "isComplete": True}
+        assert json.loads(encoder.error("boom")[6:]) == {
+            "id": 'id "quoted"', "content": "", "isComplete": True, "error": "boom"
+        }
+    
+    def test_content_frame_with_own_id(self):
+        """Test numbered content frames."""
+        frame = SSEFrameEncoder.content_frame("chunk-3", "hi")
+        
+        assert json.loads(frame[6:]) == {"id": "chunk-3", "content": "hi", "isComplete": False}
+
+
+async def timed_source(chunks, delay=0.0):
+    for chunk in chunks:
+        yield chunk
+        await asyncio.sleep(delay)
+
+
+class TestCoalesceChunks:
+    """Test cases for coalesce_chunks."""
+    
+    @pytest.mark.asyncio
+    async def test_first_chunk_flushed_then_batched_by_size(self):
+        """Test the first chunk passes straight through and later ones batch by size."""
+        batches = [batch async for batch in coalesce_chunks(timed_source("abcdefghijk"), window_ms=1000, max_bytes=4)]
+        
+        assert batches == ["a", "bcde", "fghi", "jk"]
+    
+    @pytest.mark.asyncio
+    async def test_batches_by_time_window(self):
+        """Test slow chunks are flushed when the window elapses."""
+        chunks = [f"t{i} " for i in range(20)]
+        batches = [batch async for batch in coalesce_chunks(timed_source(chunks, 0.005), window_ms=30, max_bytes=0)]
+        
+        assert batches[0] == "t0 "
+        assert "".join(batches) == "".join(chunks)
+        assert 2 < len(batches) < len(chunks)
+    
+    @pytest.mark.asyncio
+    async def test_zero_window_disables_coalescing(self):
+        """Test a zero window passes chunks through unchanged, minus empties."""
+        batches = [batch async for batch in coalesce_chunks(timed_source(["a", "", "b"]), window_ms=0)]
+        
+        assert batches == ["a", "b"]
+    
+    @pytest.mark.asyncio
+    async def test_source_error_flushes_buffer_first(self):
+        """Test buffered content is delivered before a source error propagates."""
+        async def failing_source():
+            yield "first"
+            yield "buffered"
+            raise ValueError("boom")
+        
+        batches = []
+        with pytest.raises(ValueError):
+            async for batch in coalesce_chunks(failing_source(), window_ms=1000, max_bytes=0):
+                batches.append(batch)
+        
+        assert batches == ["first", "buffered"]
+    
+    @pytest.mark.asyncio
+    async def test_closing_early_closes_source(self):
+        """Test closing the coalescer cancels the pending read and closes the source."""
+        closed = asyncio.Event()
+        
+        async def endless_source():
+            try:
+                while True:
+                    yield "x"
+                    await asyncio.sleep(0.01)
+            finally:
+                closed.set()
+        
+        batches = coalesce_chunks(endless_source(), window_ms=1000, max_bytes=0)
+        assert await batches.__anext__() == "x"
+        await batches.aclose()
+        
+        assert closed.is_set()
+
+
+class TestHeartbeatsAndIdleTimeout:
+    """Test cases for SSE keep-alives and the idle timeout."""
+    
+    @pytest.mark.asyncio
+    async def test_heartbeats_sent_while_waiting(self):
+        """Test keep-alive comments fill the wait for the first frame."""
+        async def slow_frames():
+            await asyncio.sleep(0.05)
+            yield b"data: first\n\n"
+            yield b"data: second\n\n"
+        
+        frames = [frame async for frame in StreamingUtils.with_heartbeats(slow_frames(), interval=0.01)]
+        
+        assert frames[0] == SSE_HEARTBEAT
+        assert frames.count(SSE_HEARTBEAT) >= 2
+        assert frames[-2:] == [b"data: first\n\n", b"data: second\n\n"]
+    
+    @pytest.mark.asyncio
+    async def test_no_heartbeats_when_frames_keep_coming(self):
+        """Test a busy stream passes through untouched."""
+        frames = [f"data: {i}\n\n".encode() for i in range(5)]
+        
+        assert [frame async for frame in StreamingUtils.with_heartbeats(timed_source(frames), interval=1)] == frames
+    
+    @pytest.mark.asyncio
+    async def test_idle_timeout_closes_stalled_source(self):
+        """Test a source that stops sending is closed and the stream ends with an error frame."""
+        closed = asyncio.Event()
+        
+        async def stalled_source():
+            try:
+                yield "Hello"
+                await asyncio.sleep(10)
+                yield "never"
+            finally:
+                closed.set()
+        
+        frames = [
+            frame async for frame in StreamingUtils.create_stream_generator(stalled_source(), "resp", idle_timeout=0.02)
+        ]
+        
+        assert closed.is_set()
+        assert len(frames) == 2
+        final = json.loads(frames[-1][6:])
+        assert final["isComplete"] is True
+        assert "Timed out" in final["error"]
+
+    
+    @pytest.mark.asyncio
+    async def test_pipeline_tasks_do_not_scale_with_chunks(self):
+        """Test coalescing, the idle timeout and heartbeats use one task per stream, not per chunk."""
+        async def token_source():
+            for i in range(200):
+                await asyncio.sleep(0)
+                yield f"t{i} "
+        
+        loop = asyncio.get_running_loop()
+        created = []
+        
+        def counting_factory(loop, coro, **kwargs):
+            created.append(coro)
+            return asyncio.Task(coro, loop=loop, **kwargs)
+        
+        chunks = coalesce_chunks(token_source(), window_ms=1000, max_bytes=16)
+        frames = StreamingUtils.create_stream_generator(chunks, "resp", idle_timeout=10)
+        loop.set_task_factory(counting_factory)
+        try:
+            received = [frame async for frame in StreamingUtils.with_heartbeats(frames, interval=10)]
+        finally:
+            loop.set_task_factory(None)
+        
+        assert len(received) > 20
+        assert len(created) <= 2
+
 class TestTimeoutHelper:
     """Test cases for TimeoutHelper."""
     
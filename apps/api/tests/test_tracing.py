@@ -0,0 +1,124 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock, patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.auth import auth_service, session_store
+from app.core.metrics import Histogram
+from app.core.tracing import Tracer
+from app.models.user import UserSession, GoogleUserInfo
+from app.services.chat_service import chat_service
+from app.services.fake_llm import FakeLLMBackend
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def session_cookie():
+    user_info = GoogleUserInfo(
+        id="trace_user", email="trace@example.com", name="Trace User",
+        picture="https://example.com/avatar.jpg", verified_email=True
+    )
+    session_store["trace_session"] = UserSession(
+        user_id="trace_user",
+        session_id="trace_session",
+        access_token="valid_token",
+        expires_at=datetime.now(timezone.utc) + timedelta(hours=1),
+        user_info=user_info
+    )
+    yield {"session_id": auth_service.create_session_cookie("trace_session")}
+    session_store.pop("trace_session", None)
+
+
+class TestHistogram:
+
+    def test_observe_fills_buckets(self):
+        """Test values land in the first bucket whose bound is >= value"""
+        histogram = Histogram(bounds=(0.1, 1.0))
+
+        for value in (0.05, 0.1, 0.5, 5.0):
+            histogram.observe(value)
+
+        assert histogram.counts == [2, 1, 1]
+        assert histogram.count == 4
+        assert list(histogram.cumulative_counts()) == [(0.1, 2), (1.0, 3), (float("inf"), 4)]
+
+    def test_quantile_estimate(self):
+        """Test quantiles interpolate inside buckets"""
+        histogram = Histogram(bounds=(1.0, 2.0))
+        for _ in range(10):
+            histogram.observe(1.5)
+
+        assert 1.0 < histogram.quantile(0.5) <= 2.0
+        assert Histogram().quantile(0.5) is None
+
+
+class TestTracer:
+
+    def test_span_records_histogram_and_trace(self):
+        """Test spans feed the stage histogram and the active trace"""
+        tracer = Tracer()
+        trace = tracer.start_trace("GET /test")
+
+        with tracer.span("prompt_build") as span:
+            span["events"] = 3
+        tracer.record("llm_ttft", 0.25)
+        tracer.end_trace(trace)
+
+        assert [s.name for s in trace.spans] == ["prompt_build", "llm_ttft"]
+        assert trace.spans[0].attributes == {"events": 3}
+        assert tracer.stage_durations.labels("llm_ttft").count == 1
+        assert "llm_ttft;dur=250.00" in trace.server_timing()
+        assert "total;dur=" in trace.server_timing()
+
+    def test_otlp_export_shape(self):
+        """Test OTLP/JSON rendering links child spans to the root span"""
+        tracer = Tracer()
+        trace = tracer.start_trace("POST /api/chat/")
+        tracer.record("prompt_build", 0.01)
+        tracer.end_trace(trace)
+
+        spans = trace.to_otlp()["resourceSpans"][0]["scopeSpans"][0]["spans"]
+
+        assert spans[0]["name"] == "POST /api/chat/"
+        assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+        assert int(spans[1]["endTimeUnixNano"]) >= int(spans[1]["startTimeUnixNano"])
+
+
+class TestServerTimingHeader:
+
+    def test_server_timing_on_calendar_route(self, client, session_cookie):
+        """Test non-streaming responses carry per-stage Server-Timing"""
+        google_response = Mock()
+        google_response.json.return_value = {"items": []}
+        google_response.raise_for_status.return_value = None
+
+        with patch('app.services.calendar_service.requests.get', return_value=google_response):
+            client.cookies.update(session_cookie)
+            response = client.get("/api/v1/calendar/events")
+
+        assert response.status_code == 200
+        server_timing = response.headers["Server-Timing"]
+        assert "auth;dur=" in server_timing
+        assert "google_fetch;dur=" in server_timing
+        assert "total;dur=" in server_timing
+
+    def test_no_server_timing_on_streams(self, client):
+        """Test SSE responses do not get a Server-Timing header"""
+        backend = FakeLLMBackend(ttft_ms=0, inter_token_ms=0, response_tokens=3)
+
+        with patch.object(chat_service.llm_service, "backend", backend):
+            response = client.post(
+                "/api/chat/test-stream-real",
+                json={
+                    "message": "hi",
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "include_calendar_context": False
+                }
+            )
+
+        assert response.status_code == 200
+        assert "Server-Timing" not in response.headers